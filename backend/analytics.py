@@ -0,0 +1,433 @@
+"""
+Columnar analytics store behind the ``/reports/`` endpoints.
+
+``export`` copies the orders, order items, shipments and stock rows changed
+since its previous run into Parquet files under ``ANALYTICS_DIR``. Each
+table has its own ``updated_at`` watermark in ``AnalyticsWatermark``. The
+layout is::
+
+    orders/month=2026-10/part.parquet
+    order_items/month=2026-10/part.parquet
+    shipments/month=2026-10/part.parquet
+    inventory/part.parquet
+
+Orders and their items are partitioned by order month and shipments by
+creation month. Those dates never change, so a changed row always lands in
+the partition that holds its previous version. Every touched partition is
+rewritten with the new versions replacing the old ones (by key), sorted by
+date, and swapped in with ``os.replace``, so readers never see a
+half-written file. Order items travel with their order and are replaced as
+a set, which also drops deleted items. Deleted orders and shipments come
+from the sync tombstones; deleted stock rows are found by comparing keys.
+Each run re-reads ``ANALYTICS_EXPORT_OVERLAP`` seconds before the
+watermark, so rows committed late by slow transactions are not missed.
+
+Reports read the files memory-mapped with pyarrow and let the query's
+filters prune partitions and row groups before aggregating with pandas. They
+never touch the transactional database and lag it by the export interval.
+"""
+import os
+import shutil
+from datetime import timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.apps import apps
+from django.conf import settings
+from django.utils import timezone
+
+from . import sharding
+from .customer_metrics import EXCLUDED_STATUSES
+from .lazy import lazy_import
+from .models import AnalyticsWatermark, Inventory, SyncTombstone
+
+pa = lazy_import('pyarrow')
+pc = lazy_import('pyarrow.compute')
+pq = lazy_import('pyarrow.parquet')
+pd = lazy_import('pandas')
+
+PART_NAME = 'part.parquet'
+ROW_GROUP_SIZE = 64 * 1024
+
+# Exported tables: model, key column (rows with a key present in the delta are
+# replaced), date column the month partitions come from, the column compared
+# with the watermark, sync tombstone model for deletions, and
+# (column, ORM lookup, type) per column.
+TABLES = {
+    'orders': {
+        'model': 'backend.Order',
+        'key': 'id',
+        'partition': 'order_date',
+        'watermark': 'updated_at',
+        'tombstones': 'order',
+        'columns': (
+            ('id', 'id', 'string'),
+            ('order_number', 'order_number', 'string'),
+            ('customer_id', 'customer_id', 'string'),
+            ('status', 'status', 'string'),
+            ('shipping_country', 'shipping_country', 'string'),
+            ('order_date', 'order_date', 'timestamp'),
+            ('total_cents', 'total_amount', 'cents'),
+            ('updated_at', 'updated_at', 'timestamp'),
+        ),
+    },
+    'order_items': {
+        'model': 'backend.OrderItem',
+        'key': 'order_id',
+        'partition': 'order_date',
+        'watermark': 'order__updated_at',
+        'tombstones': 'order',
+        'columns': (
+            ('id', 'id', 'int'),
+            ('order_id', 'order_id', 'string'),
+            ('product_id', 'product_id', 'string'),
+            ('quantity', 'quantity', 'int'),
+            ('unit_cents', 'unit_price', 'cents'),
+            ('order_date', 'order__order_date', 'timestamp'),
+            ('updated_at', 'order__updated_at', 'timestamp'),
+        ),
+    },
+    'shipments': {
+        'model': 'backend.Shipment',
+        'key': 'id',
+        'partition': 'created_at',
+        'watermark': 'updated_at',
+        'tombstones': 'shipment',
+        'columns': (
+            ('id', 'id', 'string'),
+            ('shipment_number', 'shipment_number', 'string'),
+            ('order_id', 'order_id', 'string'),
+            ('warehouse_id', 'warehouse_id', 'string'),
+            ('status', 'status', 'string'),
+            ('is_likely_late', 'is_likely_late', 'bool'),
+            ('created_at', 'created_at', 'timestamp'),
+            ('departure_time', 'departure_time', 'timestamp'),
+            ('estimated_arrival', 'estimated_arrival', 'timestamp'),
+            ('actual_arrival', 'actual_arrival', 'timestamp'),
+            ('updated_at', 'updated_at', 'timestamp'),
+        ),
+    },
+    'inventory': {
+        'model': 'backend.Inventory',
+        'key': 'id',
+        'partition': None,
+        'watermark': 'updated_at',
+        'tombstones': None,
+        'columns': (
+            ('id', 'id', 'int'),
+            ('product_id', 'product_id', 'string'),
+            ('warehouse_id', 'warehouse_id', 'string'),
+            ('quantity', 'quantity', 'int'),
+            ('updated_at', 'updated_at', 'timestamp'),
+        ),
+    },
+}
+
+
+def get_setting(name, default):
+    return getattr(settings, name, default)
+
+
+def store_dir():
+    return get_setting('ANALYTICS_DIR', None) or os.path.join(settings.BASE_DIR, 'analytics')
+
+
+def table_dir(name):
+    return os.path.join(store_dir(), name)
+
+
+def arrow_type(kind):
+    return {
+        'string': pa.string(),
+        'int': pa.int64(),
+        'cents': pa.int64(),
+        'bool': pa.bool_(),
+        'timestamp': pa.timestamp('us', tz='UTC'),
+    }[kind]
+
+
+def schema(name):
+    return pa.schema([(column, arrow_type(kind)) for column, _, kind in TABLES[name]['columns']])
+
+
+def to_arrow_column(values, kind):
+    if kind == 'string':
+        values = [None if v is None else str(v) for v in values]
+    elif kind == 'cents':
+        values = [None if v is None else int(v * 100) for v in values]
+    return pa.array(values, type=arrow_type(kind))
+
+
+def to_arrow(name, rows):
+    columns = TABLES[name]['columns']
+    values = list(zip(*rows)) if rows else [()] * len(columns)
+    return pa.Table.from_arrays(
+        [to_arrow_column(column_values, kind) for column_values, (_, _, kind) in zip(values, columns)],
+        schema=schema(name),
+    )
+
+
+def write_atomically(table, path, sort_by):
+    if table.num_rows == 0:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Hidden name, so a reader scanning the directory never picks up a partial file.
+    tmp_path = os.path.join(os.path.dirname(path), '.' + os.path.basename(path) + '.tmp')
+    pq.write_table(table.sort_by([(sort_by, 'ascending')]), tmp_path, row_group_size=ROW_GROUP_SIZE)
+    os.replace(tmp_path, path)
+
+
+def merge_file(path, delta, key, drop, sort_by):
+    """
+    Rewrite ``path`` with the rows whose ``key`` is in ``drop`` removed and
+    ``delta`` appended. Returns False when nothing had to change.
+    """
+    parts = []
+    if os.path.exists(path):
+        existing = pq.read_table(path, memory_map=True)
+        keep = pc.invert(pc.is_in(existing[key], value_set=drop))
+        if delta is None and pc.all(keep).as_py():
+            return False
+        parts.append(existing.filter(keep))
+    elif delta is None:
+        return False
+    if delta is not None:
+        parts.append(delta)
+    write_atomically(pa.concat_tables(parts), path, sort_by)
+    return True
+
+
+def partition_paths(name):
+    directory = table_dir(name)
+    if not os.path.isdir(directory):
+        return []
+    return [os.path.join(directory, entry, PART_NAME) for entry in sorted(os.listdir(directory))
+            if entry.startswith('month=')]
+
+
+def write_partitioned(name, delta, deleted):
+    """Merge ``delta`` into its month partitions and drop ``deleted`` keys everywhere. Returns files rewritten."""
+    spec = TABLES[name]
+    key, column = spec['key'], spec['partition']
+    key_type = schema(name).field(key).type
+    drop = pa.concat_arrays([delta[key].combine_chunks(), pa.array(deleted, type=key_type)])
+
+    rewritten, touched = 0, set()
+    months = pc.strftime(delta[column], format='%Y-%m')
+    for month in pc.unique(months).to_pylist():
+        path = os.path.join(table_dir(name), f'month={month}', PART_NAME)
+        touched.add(path)
+        rewritten += merge_file(path, delta.filter(pc.equal(months, month)), key, drop, column)
+    if deleted:
+        for path in partition_paths(name):
+            if path not in touched:
+                rewritten += merge_file(path, None, key, drop, column)
+    return rewritten
+
+
+def write_inventory(delta):
+    path = os.path.join(table_dir('inventory'), PART_NAME)
+    current = pa.array(list(Inventory.objects.values_list('pk', flat=True)), type=pa.int64())
+    if os.path.exists(path):
+        existing = pq.read_table(path, memory_map=True)
+        keep = pc.and_(pc.is_in(existing['id'], value_set=current),
+                       pc.invert(pc.is_in(existing['id'], value_set=delta['id'].combine_chunks())))
+        if delta.num_rows == 0 and pc.all(keep).as_py():
+            return 0
+        delta = pa.concat_tables([existing.filter(keep), delta])
+    elif delta.num_rows == 0:
+        return 0
+    write_atomically(delta, path, 'id')
+    return 1
+
+
+def fetch(model, queryset, lookups):
+    queryset = queryset.values_list(*lookups)
+    if not sharding.is_sharded(model):
+        return list(queryset)
+    return [row for rows in sharding.scatter(queryset).values() for row in rows]
+
+
+def deleted_keys(model_name, since):
+    """
+    Ids of orders or shipments deleted since ``since``. Tombstones also mark
+    shipments reassigned to another driver, so ids that still exist are left out.
+    """
+    model = apps.get_model('backend', model_name)
+    ids = set(SyncTombstone.objects.filter(model=model_name, deleted_at__gt=since).values_list('object_id', flat=True))
+    if ids:
+        ids -= set(pk for (pk,) in fetch(model, model._default_manager.filter(pk__in=ids), ['pk']))
+    return [str(pk) for pk in ids]
+
+
+def export_table(name, now=None):
+    """Export the rows of one table changed since its watermark. Returns rows exported."""
+    spec = TABLES[name]
+    now = now or timezone.now()
+    model = apps.get_model(spec['model'])
+    mark, _ = AnalyticsWatermark.objects.get_or_create(table=name)
+
+    queryset = model._default_manager.all()
+    since = None
+    if mark.exported_through is None:
+        shutil.rmtree(table_dir(name), ignore_errors=True)
+    else:
+        since = mark.exported_through - timedelta(seconds=get_setting('ANALYTICS_EXPORT_OVERLAP', 60))
+        queryset = queryset.filter(**{f"{spec['watermark']}__gt": since})
+    rows = fetch(model, queryset, [lookup for _, lookup, _ in spec['columns']])
+
+    deleted = []
+    if spec['tombstones'] and since is not None:
+        deleted = deleted_keys(spec['tombstones'], since)
+
+    delta = to_arrow(name, rows)
+    if spec['partition'] is None:
+        write_inventory(delta)
+    elif rows or deleted:
+        write_partitioned(name, delta, deleted)
+
+    if rows:
+        latest = pc.max(delta['updated_at']).as_py()
+        mark.exported_through = max(latest, mark.exported_through) if mark.exported_through else latest
+    elif mark.exported_through is None:
+        mark.exported_through = now
+    mark.exported_at = now
+    mark.rows = len(rows)
+    mark.save()
+    return len(rows)
+
+
+def export(tables=None, full=False):
+    """Export every table (or ``tables``); ``full`` discards the store and starts over. Returns rows per table."""
+    tables = tables or list(TABLES)
+    if full:
+        AnalyticsWatermark.objects.filter(table__in=tables).delete()
+    return {name: export_table(name) for name in tables}
+
+
+def exported_through(tables):
+    """Oldest watermark of ``tables``: reports built from them include every change up to here."""
+    marks = dict(AnalyticsWatermark.objects.filter(table__in=tables).values_list('table', 'exported_through'))
+    if any(marks.get(name) is None for name in tables):
+        return None
+    return min(marks[name] for name in tables)
+
+
+def read(name, columns=None, filters=None):
+    """
+    Memory-mapped read of an exported table into a DataFrame. ``filters``
+    (a pyarrow expression, which may use the ``month`` partition column)
+    skips whole partitions and row groups whose statistics rule them out.
+    """
+    directory = table_dir(name)
+    if not os.path.isdir(directory) or not os.listdir(directory):
+        table = schema(name).empty_table()
+        if columns is not None:
+            table = table.select(columns)
+        return table.to_pandas()
+    return pq.read_table(directory, columns=columns, filters=filters, memory_map=True).to_pandas()
+
+
+def window_filter(column, since, until):
+    """Rows with ``since <= column < until``, with the matching month partitions."""
+    timestamp = arrow_type('timestamp')
+    return (
+        (pc.field('month') >= since.astimezone(dt_timezone.utc).strftime('%Y-%m'))
+        & (pc.field('month') <= until.astimezone(dt_timezone.utc).strftime('%Y-%m'))
+        & (pc.field(column) >= pa.scalar(since, type=timestamp))
+        & (pc.field(column) < pa.scalar(until, type=timestamp))
+    )
+
+
+def money(cents):
+    return str((Decimal(int(cents)) / 100).quantize(Decimal('0.01')))
+
+
+def sales_report(since, until, period='day', top=10):
+    """Order count, revenue and top products of orders placed in ``[since, until)``."""
+    window = window_filter('order_date', since, until)
+    orders = read('orders', ['id', 'status', 'order_date', 'total_cents'], window)
+    counted = orders[~orders['status'].isin(EXCLUDED_STATUSES)]
+    revenue = int(counted['total_cents'].sum())
+
+    buckets = counted['order_date'].dt.tz_convert(None).dt.to_period('M' if period == 'month' else 'D')
+    by_period = counted.groupby(buckets)['total_cents'].agg(['size', 'sum'])
+
+    items = read('order_items', ['order_id', 'product_id', 'quantity', 'unit_cents'], window)
+    items = items[items['order_id'].isin(counted['id'])]
+    items = items.assign(revenue_cents=items['quantity'] * items['unit_cents'])
+    products = (
+        items.groupby('product_id')[['quantity', 'revenue_cents']].sum()
+        .sort_values('revenue_cents', ascending=False).head(top)
+    )
+    return {
+        'since': since,
+        'until': until,
+        'exported_through': exported_through(['orders', 'order_items']),
+        'orders': len(counted),
+        'revenue': money(revenue),
+        'average_order_value': money(round(revenue / len(counted))) if len(counted) else money(0),
+        'by_status': {status: int(count) for status, count in orders['status'].value_counts().items()},
+        'by_period': [
+            {'period': str(bucket), 'orders': int(row['size']), 'revenue': money(row['sum'])}
+            for bucket, row in by_period.iterrows()
+        ],
+        'top_products': [
+            {'product_id': product_id, 'quantity': int(row['quantity']), 'revenue': money(row['revenue_cents'])}
+            for product_id, row in products.iterrows()
+        ],
+    }
+
+
+def inventory_report(warehouse_id=None):
+    """Stock per warehouse from the latest export."""
+    filters = pc.field('warehouse_id') == str(warehouse_id) if warehouse_id else None
+    stock = read('inventory', ['product_id', 'warehouse_id', 'quantity'], filters)
+    by_warehouse = stock.groupby('warehouse_id').agg(
+        products=('product_id', 'size'), units=('quantity', 'sum'),
+        out_of_stock=('quantity', lambda quantity: int((quantity == 0).sum())),
+    )
+    return {
+        'exported_through': exported_through(['inventory']),
+        'products': int(stock['product_id'].nunique()),
+        'units': int(stock['quantity'].sum()),
+        'out_of_stock': int((stock['quantity'] == 0).sum()),
+        'by_warehouse': [
+            {'warehouse_id': warehouse, 'products': int(row['products']), 'units': int(row['units']),
+             'out_of_stock': int(row['out_of_stock'])}
+            for warehouse, row in by_warehouse.iterrows()
+        ],
+    }
+
+
+def shipments_report(since, until, warehouse_id=None):
+    """Status counts, on-time rate and transit times of shipments created in ``[since, until)``."""
+    filters = window_filter('created_at', since, until)
+    if warehouse_id:
+        filters &= pc.field('warehouse_id') == str(warehouse_id)
+    shipments = read('shipments', [
+        'warehouse_id', 'status', 'is_likely_late', 'departure_time', 'estimated_arrival', 'actual_arrival',
+    ], filters)
+
+    delivered = shipments[(shipments['status'] == 'delivered') & shipments['actual_arrival'].notna()]
+    promised = delivered[delivered['estimated_arrival'].notna()]
+    on_time = int((promised['actual_arrival'] <= promised['estimated_arrival']).sum())
+    transit = (delivered['actual_arrival'] - delivered['departure_time']).dropna().dt.total_seconds()
+    by_warehouse = shipments.groupby(shipments['warehouse_id'].fillna('')).agg(
+        shipments=('status', 'size'), delivered=('status', lambda status: int((status == 'delivered').sum())),
+    )
+    return {
+        'since': since,
+        'until': until,
+        'exported_through': exported_through(['shipments']),
+        'shipments': len(shipments),
+        'by_status': {status: int(count) for status, count in shipments['status'].value_counts().items()},
+        'on_time_rate': on_time / len(promised) if len(promised) else None,
+        'average_transit_hours': float(transit.mean() / 3600) if len(transit) else None,
+        'likely_late_in_transit': int((shipments['is_likely_late'] & (shipments['status'] == 'in_transit')).sum()),
+        'by_warehouse': [
+            {'warehouse_id': warehouse or None, 'shipments': int(row['shipments']), 'delivered': int(row['delivered'])}
+            for warehouse, row in by_warehouse.iterrows()
+        ],
+    }
@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class BackendConfig(AppConfig):
+    name = 'backend'
+    default_auto_field = 'django.db.models.BigAutoField'
+
+    def ready(self):
+        from . import celery, signals  # noqa: F401
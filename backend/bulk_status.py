@@ -0,0 +1,230 @@
+"""
+Set-based status changes for end-of-day processing.
+
+``update_shipments`` and ``update_orders`` apply a list of ``{'id',
+'status', ...}`` items in one transaction. Each item is checked against the
+workflow on its own and reported as ``updated``, ``unchanged``,
+``not_found`` or ``rejected``; a bad item doesn't stop the rest of the
+batch. Accepted changes are written with one UPDATE per distinct set of new
+values and bulk INSERTs for ``StatusTransition``, ``ShipmentTracking`` and
+the outbox, instead of a save per row.
+
+The per-row signals don't run, so their work is done here: ``updated_at``
+and ``status_changed_at`` are set explicitly (delta sync and conditional
+GETs key on them), and customer metrics are refreshed once the orders
+moving in or out of the counted statuses are committed.
+
+Shipment changes cascade to their orders: a ``processing`` order whose
+shipments have all left becomes ``shipped``, and a ``shipped`` order whose
+shipments are all delivered becomes ``delivered``.
+"""
+from collections import defaultdict
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils import timezone
+
+from . import customer_metrics, outbox, sharding, workflow
+from .models import Order, Shipment, ShipmentTracking, StatusTransition
+
+# (order status, next order status, statuses every shipment of the order must be in)
+ORDER_CASCADE = (
+    ('processing', 'shipped', ('in_transit', 'delivered')),
+    ('shipped', 'delivered', ('delivered',)),
+)
+# Timestamp filled in with the current time when a shipment enters the status without one.
+SHIPMENT_TIMESTAMPS = {'in_transit': 'departure_time', 'delivered': 'actual_arrival'}
+# Primary keys per ``pk__in`` UPDATE, well below every backend's parameter limit.
+UPDATE_BATCH_SIZE = 500
+
+
+class Change:
+    __slots__ = ('instance', 'previous_status', 'values', 'item')
+
+    def __init__(self, instance, values, item=None):
+        self.instance = instance
+        self.previous_status = instance.status
+        self.values = values
+        self.item = item
+
+    @property
+    def status_changed(self):
+        return 'status' in self.values
+
+
+def shipment_changes(instance, item, now):
+    changes = {name: item[name] for name in ('departure_time', 'actual_arrival') if name in item}
+    stamp = SHIPMENT_TIMESTAMPS.get(item['status'])
+    if stamp and item['status'] != instance.status and stamp not in changes and getattr(instance, stamp) is None:
+        changes[stamp] = now
+    return changes
+
+
+def order_changes(instance, item, now):
+    return {'tracking_number': item['tracking_number']} if 'tracking_number' in item else {}
+
+
+def load(model, ids):
+    """``{pk: instance}`` of the requested rows on every shard, locked until the transaction ends."""
+    # Sequential: the rows must be read on the connections holding the transaction.
+    found = sharding.scatter(model.objects.select_for_update().filter(pk__in=ids), parallel=False)
+    return {instance.pk: instance for rows in found.values() for instance in rows}
+
+
+def review(entity, items, rows, changes_for, now):
+    """
+    Check every item against its row. Returns the per-item outcomes and a
+    ``Change`` for each accepted item that alters something.
+    """
+    outcomes, accepted, seen = [], [], set()
+    for item in items:
+        pk, status = item['id'], item['status']
+        instance = rows.get(pk)
+        if pk in seen:
+            outcomes.append({'id': str(pk), 'result': 'rejected', 'detail': 'Duplicate item in batch.'})
+            continue
+        seen.add(pk)
+        if instance is None:
+            outcomes.append({'id': str(pk), 'result': 'not_found'})
+            continue
+        try:
+            workflow.check_transition(entity, instance.status, status)
+        except workflow.InvalidTransition as exc:
+            outcomes.append({'id': str(pk), 'result': 'rejected', 'detail': str(exc)})
+            continue
+
+        values = {
+            name: value for name, value in changes_for(instance, item, now).items()
+            if value != getattr(instance, name)
+        }
+        if status != instance.status:
+            values.update(status=status, status_changed_at=now)
+        if not values:
+            outcomes.append({'id': str(pk), 'result': 'unchanged', 'status': status})
+            continue
+        values['updated_at'] = now
+        accepted.append(Change(instance, values, item))
+        outcomes.append({'id': str(pk), 'result': 'updated', 'status': status})
+    return outcomes, accepted
+
+
+def by_alias(changes):
+    grouped = defaultdict(list)
+    for change in changes:
+        grouped[change.instance._state.db].append(change)
+    return grouped
+
+
+def write(model, changes, using):
+    """Store the changes with one UPDATE per distinct set of values, and apply them to the instances."""
+    groups = defaultdict(list)
+    for change in changes:
+        groups[tuple(sorted(change.values.items()))].append(change.instance.pk)
+        for name, value in change.values.items():
+            setattr(change.instance, name, value)
+    for values, pks in groups.items():
+        for start in range(0, len(pks), UPDATE_BATCH_SIZE):
+            model.objects.using(using).filter(pk__in=pks[start:start + UPDATE_BATCH_SIZE]).update(**dict(values))
+
+
+def record(entity, changes, using):
+    """
+    Write the history rows and outbox events of the status changes among
+    ``changes``. ``StatusTransition`` isn't sharded: it stays on ``default``,
+    where the status signal writes it and ``workflow.sla`` reads it, while the
+    events go to ``using`` with the changed rows. Both writes share one
+    ``sharding.atomic`` block, but without two-phase commit a failure between
+    the two commits can keep history for a change the shard rolled back.
+    """
+    changes = [change for change in changes if change.status_changed]
+    with sharding.atomic(using, savepoint=False):
+        StatusTransition.objects.using(DEFAULT_DB_ALIAS).bulk_create([
+            StatusTransition(entity=entity, object_id=change.instance.pk, from_status=change.previous_status,
+                             to_status=change.instance.status, changed_at=change.instance.status_changed_at)
+            for change in changes
+        ])
+        outbox.publish_many(f'{entity}.status_changed', entity, [
+            (change.instance.pk, outbox.PAYLOADS[entity](change.instance, change.previous_status))
+            for change in changes
+        ], using)
+
+
+def cascade(order_ids, now):
+    """
+    Advance the orders whose shipments have all moved on. ``order_ids``
+    maps a database alias to the orders to look at; returns one
+    ``{'id', 'from_status', 'status'}`` per order step taken.
+    """
+    statuses = [status for status, _ in Shipment.STATUS_CHOICES]
+    steps = []
+    for alias, ids in order_ids.items():
+        for from_status, to_status, shipment_statuses in ORDER_CASCADE:
+            orders = list(
+                Order.objects.using(alias).select_for_update()
+                .filter(pk__in=ids, status=from_status)
+                .exclude(shipments__status__in=[s for s in statuses if s not in shipment_statuses])
+            )
+            changes = [
+                Change(order, {'status': to_status, 'status_changed_at': now, 'updated_at': now})
+                for order in orders
+            ]
+            write(Order, changes, alias)
+            record('order', changes, alias)
+            steps.extend(
+                {'id': str(change.instance.pk), 'from_status': from_status, 'status': to_status}
+                for change in changes
+            )
+    return steps
+
+
+def refresh_customers(customer_ids):
+    for customer_id in customer_ids:
+        customer_metrics.refresh_customer(customer_id)
+
+
+def update_shipments(items, now=None):
+    """
+    Apply validated shipment items (``id``, ``status`` and optionally
+    ``departure_time``, ``actual_arrival``, ``location``, ``notes``). Every
+    status change gets a tracking update. Returns ``{'results': [...],
+    'orders': [...]}`` with the per-item outcomes and the cascaded order
+    changes.
+    """
+    now = now or timezone.now()
+    with sharding.atomic():
+        rows = load(Shipment, [item['id'] for item in items])
+        outcomes, accepted = review('shipment', items, rows, shipment_changes, now)
+        order_ids = {}
+        for alias, changes in by_alias(accepted).items():
+            write(Shipment, changes, alias)
+            record('shipment', changes, alias)
+            updates = [
+                ShipmentTracking(shipment=change.instance, status=change.instance.status,
+                                 location=change.item.get('location', ''), notes=change.item.get('notes', ''))
+                for change in changes if change.status_changed
+            ]
+            ShipmentTracking.objects.using(alias).bulk_create(updates)
+            outbox.publish_tracking(updates, alias)
+            order_ids[alias] = {change.instance.order_id for change in changes if change.status_changed}
+        orders = cascade(order_ids, now)
+    return {'results': outcomes, 'orders': orders}
+
+
+def update_orders(items, now=None):
+    """
+    Apply validated order items (``id``, ``status`` and optionally
+    ``tracking_number``). Returns ``{'results': [...]}``.
+    """
+    now = now or timezone.now()
+    with sharding.atomic():
+        rows = load(Order, [item['id'] for item in items])
+        outcomes, accepted = review('order', items, rows, order_changes, now)
+        for alias, changes in by_alias(accepted).items():
+            write(Order, changes, alias)
+            record('order', changes, alias)
+        customer_ids = {
+            change.instance.customer_id for change in accepted
+            if customer_metrics.counts(change.previous_status) != customer_metrics.counts(change.instance.status)
+        }
+        if customer_ids:
+            transaction.on_commit(lambda: refresh_customers(customer_ids))
+    return {'results': outcomes}
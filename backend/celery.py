@@ -0,0 +1,14 @@
+"""
+Celery application for background work (``celery -A backend worker``).
+
+Configuration is read from the Django settings prefixed with ``CELERY_``.
+"""
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+
+app = Celery('backend')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
@@ -0,0 +1,103 @@
+"""
+Conditional GET support (ETag / Last-Modified) for the API viewsets.
+
+Validators are derived from the models' ``updated_at`` columns so that a
+304 can be returned after one aggregate query, before any rows are loaded
+or serialized.
+"""
+import hashlib
+
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+
+def _latest(values):
+    values = [value for value in values if value is not None]
+    return max(values) if values else None
+
+
+def make_etag(*parts):
+    return hashlib.md5(':'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def list_validators(queryset, fields=('updated_at',)):
+    """
+    Return ``(etag, last_modified)`` for a (filtered) list queryset.
+
+    The row count is part of the ETag so that deletions, which don't move
+    ``max(updated_at)``, still invalidate it.
+    """
+    aggregates = {f'latest_{i}': Max(field) for i, field in enumerate(fields)}
+    result = queryset.order_by().aggregate(count=Count('pk'), **aggregates)
+    last_modified = _latest(result[f'latest_{i}'] for i in range(len(fields)))
+    etag = make_etag(queryset.model._meta.label, result['count'],
+                     last_modified.isoformat() if last_modified else '')
+    return etag, last_modified
+
+
+def detail_validators(queryset, pk, fields=('updated_at',)):
+    """Return ``(etag, last_modified)`` for a single row, or ``(None, None)`` if missing."""
+    row = queryset.order_by().prefetch_related(None).filter(pk=pk).values_list(*fields).first()
+    if row is None:
+        return None, None
+    last_modified = _latest(row)
+    etag = make_etag(queryset.model._meta.label, pk,
+                     last_modified.isoformat() if last_modified else '')
+    return etag, last_modified
+
+
+class ConditionalGetMixin:
+    """
+    Viewset mixin answering ``If-None-Match`` / ``If-Modified-Since`` on
+    list and retrieve with a 304 before serialization.
+
+    ``conditional_fields`` lists the timestamp columns that determine the
+    representation, including those of nested relations (for example
+    ``customer__updated_at`` when the customer name is embedded).
+    """
+
+    conditional_fields = ('updated_at',)
+
+    def variant_key(self, request):
+        # Different query strings or media types are different representations.
+        return request.get_full_path(), request.META.get('HTTP_ACCEPT', '')
+
+    def finalize_conditional(self, request, etag, last_modified):
+        etag = quote_etag(make_etag(etag, *self.variant_key(request)))
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        return etag, timestamp
+
+    def conditional_response(self, request, etag, timestamp, render):
+        not_modified = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if not_modified is not None:
+            response = not_modified
+        else:
+            response = render()
+        response['ETag'] = etag
+        if timestamp is not None:
+            response['Last-Modified'] = http_date(timestamp)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        etag, timestamp = self.finalize_conditional(
+            request, *list_validators(queryset, self.conditional_fields))
+        return self.conditional_response(
+            request, etag, timestamp, lambda: super(ConditionalGetMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup = kwargs.get(self.lookup_url_kwarg or self.lookup_field)
+        try:
+            etag, last_modified = detail_validators(
+                self.filter_queryset(self.get_queryset()), lookup, self.conditional_fields)
+        except (TypeError, ValueError, ValidationError):
+            etag = None
+        if etag is None:
+            # Let the regular code path produce the 404 / validation error.
+            return super().retrieve(request, *args, **kwargs)
+        etag, timestamp = self.finalize_conditional(request, etag, last_modified)
+        return self.conditional_response(
+            request, etag, timestamp, lambda: super(ConditionalGetMixin, self).retrieve(request, *args, **kwargs))
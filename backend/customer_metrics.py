@@ -0,0 +1,180 @@
+"""
+Per-customer recency, frequency and monetary (RFM) figures.
+
+``CustomerMetrics`` keeps one row per customer with the order count,
+lifetime value, average order value, spend over the last
+``CUSTOMER_MONETARY_DAYS`` and the first/last order dates, so customer
+lists can sort and filter on them through indexes instead of grouping the
+order table. Orders count from placement until they are cancelled or
+returned.
+
+The rows are kept current by the ``Order`` signals: placing an order adds
+it to its customer's row under a row lock, and any other change that
+affects the figures (cancellation, a new total, deletion) recomputes that
+one customer from their orders. ``rebuild`` recomputes every customer in
+one pass over the orders and also assigns the 1-5 RFM scores, which rank
+customers against each other and therefore only change on a rebuild (run
+nightly by Celery beat); the rolling ``monetary_value`` window is also only
+moved forward there.
+"""
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Min, Q, Sum
+from django.utils import timezone
+
+from . import sharding
+from .lazy import lazy_import
+from .models import Customer, CustomerMetrics, Order
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+EXCLUDED_STATUSES = ('cancelled', 'returned')
+SCORE_BUCKETS = 5
+CENTS = Decimal('0.01')
+METRIC_FIELDS = (
+    'order_count', 'lifetime_value', 'monetary_value', 'average_order_value',
+    'first_order_at', 'last_order_at',
+)
+SCORE_FIELDS = ('recency_score', 'frequency_score', 'monetary_score')
+
+
+def counts(status):
+    return status not in EXCLUDED_STATUSES
+
+
+def counted_orders():
+    return Order.objects.exclude(status__in=EXCLUDED_STATUSES)
+
+
+def window_start(now=None):
+    return (now or timezone.now()) - timedelta(days=getattr(settings, 'CUSTOMER_MONETARY_DAYS', 365))
+
+
+def average(total, count):
+    return (total / count).quantize(CENTS) if count else Decimal('0.00')
+
+
+def record_order(order):
+    """Add a newly placed order to its customer's metrics."""
+    amount = Decimal(order.total_amount)
+    with transaction.atomic():
+        metrics, _ = CustomerMetrics.objects.select_for_update().get_or_create(customer_id=order.customer_id)
+        metrics.order_count += 1
+        metrics.lifetime_value += amount
+        if order.order_date >= window_start():
+            metrics.monetary_value += amount
+        metrics.average_order_value = average(metrics.lifetime_value, metrics.order_count)
+        if metrics.first_order_at is None or order.order_date < metrics.first_order_at:
+            metrics.first_order_at = order.order_date
+        if metrics.last_order_at is None or order.order_date > metrics.last_order_at:
+            metrics.last_order_at = order.order_date
+        metrics.save()
+
+
+def summarize(customer_id, now=None):
+    """Metric values of one customer computed from their orders on every shard."""
+    since = window_start(now)
+    queryset = counted_orders().filter(customer_id=customer_id)
+    parts = sharding.scatter(queryset, lambda qs: qs.aggregate(
+        order_count=Count('pk'), lifetime_value=Sum('total_amount'),
+        monetary_value=Sum('total_amount', filter=Q(order_date__gte=since)),
+        first_order_at=Min('order_date'), last_order_at=Max('order_date'),
+    )).values()
+
+    values = {'order_count': 0, 'lifetime_value': Decimal('0'), 'monetary_value': Decimal('0'),
+              'first_order_at': None, 'last_order_at': None}
+    for part in parts:
+        values['order_count'] += part['order_count']
+        values['lifetime_value'] += part['lifetime_value'] or 0
+        values['monetary_value'] += part['monetary_value'] or 0
+        for name, pick in (('first_order_at', min), ('last_order_at', max)):
+            dates = [d for d in (values[name], part[name]) if d is not None]
+            values[name] = pick(dates) if dates else None
+    values['average_order_value'] = average(values['lifetime_value'], values['order_count'])
+    return values
+
+
+def refresh_customer(customer_id, now=None):
+    """
+    Recompute one customer's metrics from their orders. A row is only
+    created when the customer has orders, so this is safe to call while the
+    customer itself is being deleted.
+    """
+    values = summarize(customer_id, now)
+    values['updated_at'] = timezone.now()
+    with transaction.atomic():
+        updated = CustomerMetrics.objects.filter(customer_id=customer_id).update(**values)
+        if not updated and values['order_count']:
+            CustomerMetrics.objects.create(customer_id=customer_id, **values)
+
+
+def quintiles(values):
+    """1-5 score per value by percentile rank (higher value, higher score)."""
+    ranks = pd.Series(values).rank(method='average', pct=True).to_numpy()
+    return np.ceil(ranks * SCORE_BUCKETS).astype(int).clip(1, SCORE_BUCKETS)
+
+
+def compute(rows, customer_ids, now):
+    """
+    Vectorised metrics for every customer from ``(customer_id, total_amount,
+    order_date)`` rows. Amounts are summed as integer cents so totals stay
+    exact. Returns a DataFrame indexed by customer id.
+    """
+    since = window_start(now)
+    orders = pd.DataFrame(rows, columns=['customer_id', 'amount', 'order_date'])
+    orders['cents'] = np.array([int(amount * 100) for amount in orders['amount']], dtype='int64')
+    orders['recent_cents'] = orders['cents'].where(orders['order_date'] >= since, 0)
+
+    grouped = orders.groupby('customer_id').agg(
+        order_count=('cents', 'size'), lifetime_cents=('cents', 'sum'),
+        monetary_cents=('recent_cents', 'sum'),
+        first_order_at=('order_date', 'min'), last_order_at=('order_date', 'max'),
+    )
+    frame = grouped.reindex(pd.Index(customer_ids, name='customer_id'))
+    frame[['order_count', 'lifetime_cents', 'monetary_cents']] = (
+        frame[['order_count', 'lifetime_cents', 'monetary_cents']].fillna(0).astype('int64'))
+
+    for name in SCORE_FIELDS:
+        frame[name] = 0
+    active = frame['order_count'] > 0
+    if active.any():
+        recency = frame.loc[active, 'last_order_at'].map(lambda d: d.timestamp())
+        frame.loc[active, 'recency_score'] = quintiles(recency)
+        frame.loc[active, 'frequency_score'] = quintiles(frame.loc[active, 'order_count'])
+        frame.loc[active, 'monetary_score'] = quintiles(frame.loc[active, 'monetary_cents'])
+    return frame
+
+
+def rebuild(now=None, batch_size=1000):
+    """Recompute and upsert the metrics of every customer. Returns ``(customers, seconds)``."""
+    started = time.perf_counter()
+    now = now or timezone.now()
+    queryset = counted_orders().values_list('customer_id', 'total_amount', 'order_date')
+    rows = [row for shard_rows in sharding.scatter(queryset).values() for row in shard_rows]
+    customer_ids = list(Customer.objects.values_list('pk', flat=True))
+    frame = compute(rows, customer_ids, now)
+
+    objs = []
+    for customer_id, row in zip(frame.index, frame.itertuples(index=False)):
+        count = int(row.order_count)
+        lifetime = Decimal(int(row.lifetime_cents)) / 100
+        objs.append(CustomerMetrics(
+            customer_id=customer_id, order_count=count, lifetime_value=lifetime,
+            monetary_value=Decimal(int(row.monetary_cents)) / 100,
+            average_order_value=average(lifetime, count),
+            first_order_at=row.first_order_at if count else None,
+            last_order_at=row.last_order_at if count else None,
+            recency_score=int(row.recency_score), frequency_score=int(row.frequency_score),
+            monetary_score=int(row.monetary_score), updated_at=now,
+        ))
+    with transaction.atomic():
+        CustomerMetrics.objects.bulk_create(
+            objs, batch_size=batch_size, update_conflicts=True, unique_fields=['customer'],
+            update_fields=list(METRIC_FIELDS + SCORE_FIELDS) + ['updated_at'],
+        )
+    return len(objs), time.perf_counter() - started
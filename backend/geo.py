@@ -0,0 +1,222 @@
+"""
+Geocoding and proximity queries.
+
+Coordinates come from the offline ``GeoLocation`` table (postal code or city
+centroids), so no external service is involved. Warehouses and order
+destinations store a geohash next to their coordinates; a radius search
+covers the circle with the geohash cell containing the centre plus its eight
+neighbours at a precision where a cell is at least as large as the radius.
+Each cell is one index range scan (``geohash >= prefix AND geohash < prefix
++ '{'``), and only the candidates it returns are checked with the exact
+haversine distance.
+"""
+import math
+import time
+from functools import lru_cache
+from itertools import chain
+
+from django.conf import settings
+from django.db.models import Q
+
+from . import sharding
+from .models import GeoLocation, Inventory, Shipment, Warehouse
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+EARTH_RADIUS_KM = 6371.0088
+MAX_PRECISION = 12
+# Radii tried in turn when looking for the nearest warehouses.
+SEARCH_RADII_KM = (25, 100, 400, 1600)
+# Addresses without a location, with the monotonic time until which that is trusted.
+misses = {}
+MAX_MISSES = 10000
+
+
+def encode_geohash(latitude, longitude, precision=MAX_PRECISION):
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        target, rng = (longitude, lon_range) if even else (latitude, lat_range)
+        mid = (rng[0] + rng[1]) / 2
+        value <<= 1
+        if target >= mid:
+            value |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits, value = 0, 0
+    return ''.join(chars)
+
+
+def cell_size_degrees(precision):
+    """Return ``(height, width)`` in degrees of a geohash cell."""
+    lon_bits = math.ceil(precision * 5 / 2)
+    lat_bits = precision * 5 // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def covering_prefixes(latitude, longitude, radius_km):
+    """Return the geohash prefixes whose cells together cover the search circle."""
+    km_per_degree = math.pi * EARTH_RADIUS_KM / 180
+    cos_lat = max(math.cos(math.radians(latitude)), 1e-6)
+    precision = 0
+    for candidate in range(1, MAX_PRECISION + 1):
+        height, width = cell_size_degrees(candidate)
+        if height * km_per_degree < radius_km or width * km_per_degree * cos_lat < radius_km:
+            break
+        precision = candidate
+    if precision == 0:
+        return ['']
+
+    height, width = cell_size_degrees(precision)
+    prefixes = set()
+    for dlat in (-height, 0, height):
+        for dlon in (-width, 0, width):
+            lat = min(max(latitude + dlat, -90.0), 90.0)
+            lon = (longitude + dlon + 180.0) % 360.0 - 180.0
+            prefixes.add(encode_geohash(lat, lon, precision))
+    return sorted(prefixes)
+
+
+def geohash_q(field, prefixes):
+    """Q object selecting rows whose ``field`` starts with any of ``prefixes`` via range scans."""
+    if prefixes == ['']:
+        return ~Q(**{field: ''})
+    q = Q()
+    for prefix in prefixes:
+        q |= Q(**{f'{field}__gte': prefix, f'{field}__lt': prefix + '{'})
+    return q
+
+
+@lru_cache(maxsize=10000)
+def cached_location(country, zip_code, city):
+    """Coordinates found for an address; misses raise so that lru_cache doesn't keep them."""
+    locations = GeoLocation.objects.filter(country__iexact=country)
+    match = None
+    if zip_code:
+        match = locations.filter(zip_code=zip_code).values_list('latitude', 'longitude').first()
+    if match is None and city:
+        match = locations.filter(city__iexact=city).values_list('latitude', 'longitude').first()
+    if match is None:
+        raise GeoLocation.DoesNotExist
+    return match
+
+
+def geocode(country, zip_code='', city=''):
+    """
+    Return ``(latitude, longitude)`` for an address from the offline table, or
+    ``None``. Misses are only remembered for ``GEOCODE_MISS_TTL`` seconds, so
+    locations loaded by another process are found without a restart.
+    """
+    key = (country, zip_code, city)
+    now = time.monotonic()
+    if misses.get(key, 0) > now:
+        return None
+    try:
+        return cached_location(*key)
+    except GeoLocation.DoesNotExist:
+        if len(misses) >= MAX_MISSES:
+            misses.clear()
+        misses[key] = now + getattr(settings, 'GEOCODE_MISS_TTL', 300)
+        return None
+
+
+def clear_cache():
+    cached_location.cache_clear()
+    misses.clear()
+
+
+def address_key(instance, prefix=''):
+    return tuple(
+        instance.__dict__.get(f'{prefix}{name}')
+        for name in ('country', 'state', 'city', 'zip_code', 'address')
+    )
+
+
+def locate(instance, prefix=''):
+    """
+    Fill in the coordinates and geohash of a Warehouse or Order (``prefix='shipping_'``)
+    from its address. Explicitly set coordinates are kept unless the address
+    changed since the instance was loaded.
+    """
+    lat_attr, lon_attr = f'{prefix}latitude', f'{prefix}longitude'
+    loaded = getattr(instance, '_loaded_address', None)
+    if loaded is not None and loaded != address_key(instance, prefix):
+        setattr(instance, lat_attr, None)
+        setattr(instance, lon_attr, None)
+    if getattr(instance, lat_attr) is None or getattr(instance, lon_attr) is None:
+        coords = geocode(
+            getattr(instance, f'{prefix}country'),
+            getattr(instance, f'{prefix}zip_code'),
+            getattr(instance, f'{prefix}city'),
+        )
+        if coords is not None:
+            setattr(instance, lat_attr, coords[0])
+            setattr(instance, lon_attr, coords[1])
+
+    latitude, longitude = getattr(instance, lat_attr), getattr(instance, lon_attr)
+    geohash = encode_geohash(latitude, longitude) if latitude is not None and longitude is not None else ''
+    setattr(instance, f'{prefix}geohash', geohash)
+    instance._loaded_address = address_key(instance, prefix)
+
+
+def nearest_warehouses(latitude, longitude, product=None, quantity=1, limit=5):
+    """
+    Return up to ``limit`` warehouses nearest to a point as ``(warehouse, distance_km)``,
+    restricted to those holding at least ``quantity`` of ``product`` when given.
+    """
+    warehouses = Warehouse.objects.exclude(geohash='')
+    if product is not None:
+        stocked = Inventory.objects.filter(product=product, quantity__gte=quantity)
+        warehouses = warehouses.filter(pk__in=stocked.values('warehouse_id'))
+
+    for radius in SEARCH_RADII_KM + (None,):
+        candidates = warehouses
+        if radius is not None:
+            candidates = candidates.filter(geohash_q('geohash', covering_prefixes(latitude, longitude, radius)))
+        ranked = sorted(
+            ((warehouse, haversine_km(latitude, longitude, warehouse.latitude, warehouse.longitude))
+             for warehouse in candidates),
+            key=lambda pair: pair[1],
+        )
+        if radius is not None:
+            ranked = [pair for pair in ranked if pair[1] <= radius]
+        if len(ranked) >= limit or radius is None:
+            return ranked[:limit]
+
+
+def shipments_within(latitude, longitude, radius_km, queryset=None, aliases=None):
+    """
+    Return ``(shipment, distance_km)`` for shipments whose destination lies
+    within the radius, searching the ``aliases`` databases (default: every
+    shard).
+    """
+    queryset = Shipment.objects.all() if queryset is None else queryset
+    candidates = (
+        queryset
+        .filter(geohash_q('order__shipping_geohash', covering_prefixes(latitude, longitude, radius_km)))
+        .select_related('order')
+    )
+    if aliases is None:
+        found = sharding.scatter(candidates)
+    else:
+        found = {alias: list(candidates.using(alias)) for alias in aliases}
+    results = []
+    for shipment in chain.from_iterable(found.values()):
+        distance = haversine_km(latitude, longitude,
+                                shipment.order.shipping_latitude, shipment.order.shipping_longitude)
+        if distance <= radius_km:
+            results.append((shipment, distance))
+    results.sort(key=lambda pair: pair[1])
+    return results
@@ -0,0 +1,112 @@
+"""
+Resized variants of uploaded images.
+
+Uploads are stored as-is; a Celery task (``tasks.process_image_variants``)
+then renders the ``VARIANTS`` off the request path and records their
+storage names in the model's variants JSON field. Names are derived from a
+hash of the source bytes, so a given name always has the same content: they
+can be served with a one-year ``immutable`` cache lifetime, and re-uploading
+an identical image reuses the files already rendered.
+"""
+import hashlib
+import io
+import mimetypes
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+VARIANTS = {
+    'thumb': {'size': (200, 200), 'format': 'JPEG', 'quality': 80},
+    'medium': {'size': (800, 800), 'format': 'JPEG', 'quality': 85},
+    'webp': {'size': (800, 800), 'format': 'WEBP', 'quality': 80},
+}
+EXTENSIONS = {'JPEG': 'jpg', 'WEBP': 'webp'}
+VARIANT_ROOT = 'variants'
+
+# model label -> (image field, variants field)
+IMAGE_FIELDS = {
+    'backend.Product': ('image', 'image_variants'),
+    'backend.User': ('profile_picture', 'profile_picture_variants'),
+}
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()[:20]
+
+
+def variant_name(digest, variant):
+    spec = VARIANTS[variant]
+    return f'{VARIANT_ROOT}/{digest[:2]}/{digest}-{variant}.{EXTENSIONS[spec["format"]]}'
+
+
+def render_variant(source, variant):
+    spec = VARIANTS[variant]
+    image = source.copy()
+    keep_alpha = image.mode == 'RGBA' and spec['format'] == 'WEBP'
+    if image.mode != 'RGB' and not keep_alpha:
+        image = image.convert('RGB')
+    image.thumbnail(spec['size'], Image.LANCZOS)
+    buffer = io.BytesIO()
+    image.save(buffer, spec['format'], quality=spec['quality'], optimize=True)
+    return buffer.getvalue()
+
+
+def generate_variants(field_file, storage=default_storage):
+    """Render every variant of ``field_file`` and return ``{variant: storage name}``."""
+    with field_file.open('rb') as f:
+        data = f.read()
+    digest = content_hash(data)
+    names = {variant: variant_name(digest, variant) for variant in VARIANTS}
+    missing = [variant for variant, name in names.items() if not storage.exists(name)]
+    if missing:
+        with Image.open(io.BytesIO(data)) as original:
+            source = ImageOps.exif_transpose(original)
+            for variant in missing:
+                storage.save(names[variant], ContentFile(render_variant(source, variant)))
+    return names
+
+
+def process(model_label, pk):
+    """
+    Generate the variants for one object and store their names.
+
+    The write is conditional on the image not having changed meanwhile, so a
+    slow task can't overwrite the variants of a newer upload.
+    """
+    model = apps.get_model(model_label)
+    image_field, variants_field = IMAGE_FIELDS[model_label]
+    instance = model.objects.filter(pk=pk).only('pk', image_field).first()
+    if instance is None:
+        return None
+    field_file = getattr(instance, image_field)
+    if not field_file:
+        return {}
+
+    variants = generate_variants(field_file)
+    changes = {variants_field: variants}
+    if any(field.name == 'updated_at' for field in model._meta.concrete_fields):
+        changes['updated_at'] = timezone.now()
+    model.objects.filter(pk=pk, **{image_field: field_file.name}).update(**changes)
+    return variants
+
+
+def variant_urls(variants, request=None):
+    """Map variant names to absolute (when ``request`` is given) serving URLs."""
+    urls = {}
+    for variant, name in (variants or {}).items():
+        url = reverse('image-variant', args=[name])
+        urls[variant] = request.build_absolute_uri(url) if request is not None else url
+    return urls
+
+
+def content_type(name):
+    return mimetypes.guess_type(name)[0] or 'application/octet-stream'
+
+
+def cache_seconds():
+    return getattr(settings, 'IMAGE_VARIANT_MAX_AGE', 365 * 24 * 3600)
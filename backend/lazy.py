@@ -0,0 +1,59 @@
+"""
+Deferred imports for heavy optional libraries.
+
+pandas, numpy, pyarrow and matplotlib add seconds to interpreter start-up
+and tens of MB to every worker. Analytics code binds them at module level
+with ``lazy_import`` so they are only loaded when a report actually runs:
+
+    pd = lazy_import('pandas')
+
+    def build_report(rows):
+        return pd.DataFrame(rows)  # pandas is imported here, on first use
+
+``HEAVY_MODULES`` lists the libraries that must not be imported while
+Django and the URLconf load; ``bench_startup`` and the tests check it.
+"""
+import importlib
+import sys
+import threading
+
+HEAVY_MODULES = ('pandas', 'numpy', 'pyarrow', 'matplotlib', 'drf_yasg')
+
+
+class LazyModule:
+    """Module proxy that performs the real import on first attribute access."""
+
+    def __init__(self, name):
+        self.__dict__['_name'] = name
+        self.__dict__['_module'] = None
+        self.__dict__['_lock'] = threading.Lock()
+
+    def _load(self):
+        module = self.__dict__['_module']
+        if module is None:
+            with self.__dict__['_lock']:
+                module = self.__dict__['_module']
+                if module is None:
+                    module = importlib.import_module(self.__dict__['_name'])
+                    self.__dict__['_module'] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __repr__(self):
+        state = 'loaded' if self.__dict__['_module'] is not None else 'not loaded'
+        return f"<lazy module '{self.__dict__['_name']}' ({state})>"
+
+
+def lazy_import(name):
+    """Return ``name`` if it is already imported, otherwise a proxy that imports it on first use."""
+    return sys.modules.get(name) or LazyModule(name)
+
+
+def loaded_heavy_modules():
+    """The ``HEAVY_MODULES`` currently imported in this process."""
+    return [name for name in HEAVY_MODULES if name in sys.modules]
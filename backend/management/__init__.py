@@ -0,0 +1 @@
+# Initialize management package
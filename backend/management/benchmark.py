@@ -0,0 +1,49 @@
+"""Shared fixtures for the ``bench_*`` management commands."""
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.db import transaction
+
+from backend.models import Customer, Order, Shipment
+
+NOTES = 'Leave at the loading dock, call ahead. ' * 20
+
+
+class Rollback(Exception):
+    pass
+
+
+@contextmanager
+def rolled_back():
+    """Run the benchmark body in a transaction that is always rolled back."""
+    try:
+        with transaction.atomic():
+            yield
+            raise Rollback
+    except Rollback:
+        pass
+
+
+def seed_orders(rows):
+    """Create ``rows`` orders, one shipment each, spread over rows/10 customers."""
+    customers = Customer.objects.bulk_create([
+        Customer(
+            name=f'Bench Customer {i}', email=f'bench{i}@example.com', phone='5550000',
+            address=NOTES, city='Bench City', state='BC', zip_code='00000', country='Benchland',
+        )
+        for i in range(max(rows // 10, 1))
+    ])
+    orders = Order.objects.bulk_create([
+        Order(
+            order_number=f'BENCH-{i:08d}', customer=customers[i % len(customers)],
+            status='processing', shipping_address=NOTES, shipping_city='Bench City',
+            shipping_state='BC', shipping_zip_code='00000', shipping_country='Benchland',
+            total_amount=Decimal('123.45'), notes=NOTES,
+        )
+        for i in range(rows)
+    ])
+    Shipment.objects.bulk_create([
+        Shipment(shipment_number=f'BSHP-{i:08d}', order=order, status='in_transit', notes=NOTES)
+        for i, order in enumerate(orders)
+    ])
+    return orders
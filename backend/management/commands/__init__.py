@@ -0,0 +1 @@
+# Initialize commands package
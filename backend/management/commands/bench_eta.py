@@ -0,0 +1,80 @@
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from backend import eta, geo
+from backend.management.benchmark import rolled_back
+from backend.models import Customer, Order, Shipment, Vehicle, Warehouse
+
+
+class Command(BaseCommand):
+    help = 'Time ETA training and scoring of an in-transit fleet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--history', type=int, default=100000)
+        parser.add_argument('--fleet', type=int, default=10000)
+        parser.add_argument('--warehouses', type=int, default=50)
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        with rolled_back():
+            self.seed(rng, options)
+            start = time.perf_counter()
+            groups = eta.train()
+            self.stdout.write(f'train: {groups} groups from {options["history"]} trips '
+                              f'in {(time.perf_counter() - start) * 1000:.0f} ms')
+            scored, updated, seconds = eta.score()
+            self.stdout.write(f'score: {scored} shipments, {updated} updated in {seconds * 1000:.0f} ms')
+            scored, updated, seconds = eta.score()
+            self.stdout.write(f'rescore: {scored} shipments, {updated} updated in {seconds * 1000:.0f} ms')
+
+    def seed(self, rng, options):
+        now = timezone.now()
+        customer = Customer.objects.create(
+            name='ETA Bench', email='eta-bench@example.com', phone='0', address='-',
+            city='-', state='-', zip_code='-', country='-',
+        )
+        vehicles = Vehicle.objects.bulk_create([
+            Vehicle(vehicle_number=f'ETA-{kind}', vehicle_type=kind, make='-', model='-', year=2020,
+                    license_plate='-', capacity=Decimal('1000'))
+            for kind in ('truck', 'van', 'car')
+        ])
+        warehouses = []
+        for i in range(options['warehouses']):
+            lat, lon = rng.uniform(36.0, 60.0), rng.uniform(-9.0, 30.0)
+            warehouses.append(Warehouse(
+                name=f'WH {i}', address='-', city='-', state='-', zip_code='-', country='-',
+                contact_person='-', phone='0', email='wh@example.com',
+                latitude=lat, longitude=lon, geohash=geo.encode_geohash(lat, lon),
+            ))
+        Warehouse.objects.bulk_create(warehouses)
+
+        total = options['history'] + options['fleet']
+        for start in range(0, total, 10000):
+            orders, shipments = [], []
+            for i in range(start, min(start + 10000, total)):
+                warehouse = rng.choice(warehouses)
+                lat = warehouse.latitude + rng.uniform(-1, 1)
+                lon = warehouse.longitude + rng.uniform(-1, 1)
+                order = Order(
+                    order_number=f'ETA-{i:09d}', customer=customer, shipping_address='-',
+                    shipping_city='-', shipping_state='-', shipping_zip_code='-', shipping_country='-',
+                    shipping_latitude=lat, shipping_longitude=lon,
+                    shipping_geohash=geo.encode_geohash(lat, lon), total_amount=Decimal('1.00'),
+                )
+                orders.append(order)
+                distance = geo.haversine_km(warehouse.latitude, warehouse.longitude, lat, lon)
+                departed = now - timedelta(days=rng.uniform(0, 90) if i < options['history'] else rng.uniform(0, 0.5))
+                delivered = i < options['history']
+                shipments.append(Shipment(
+                    shipment_number=f'ETS-{i:09d}', order=order, warehouse=warehouse,
+                    vehicle=rng.choice(vehicles), departure_time=departed,
+                    status='delivered' if delivered else 'in_transit',
+                    actual_arrival=departed + timedelta(minutes=30 + distance * rng.uniform(1, 2)) if delivered else None,
+                ))
+            Order.objects.bulk_create(orders)
+            Shipment.objects.bulk_create(shipments)
@@ -0,0 +1,79 @@
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from backend import geo
+from backend.management.benchmark import rolled_back
+from backend.models import Customer, Order, Shipment, Warehouse
+
+
+class Command(BaseCommand):
+    help = 'Time radius and nearest-warehouse queries over randomly placed orders'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000)
+        parser.add_argument('--warehouses', type=int, default=200)
+        parser.add_argument('--queries', type=int, default=50)
+        parser.add_argument('--radius', type=float, default=10.0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        with rolled_back():
+            self.seed(rng, options['rows'], options['warehouses'])
+            self.report(rng, options['queries'], options['radius'])
+
+    @staticmethod
+    def point(rng):
+        # Roughly continental Europe
+        return rng.uniform(36.0, 60.0), rng.uniform(-9.0, 30.0)
+
+    def seed(self, rng, rows, warehouses):
+        customer = Customer.objects.create(
+            name='Geo Bench', email='geo-bench@example.com', phone='0', address='-',
+            city='-', state='-', zip_code='-', country='-',
+        )
+        warehouse_rows = []
+        for i in range(warehouses):
+            lat, lon = self.point(rng)
+            warehouse_rows.append(Warehouse(
+                name=f'WH {i}', address='-', city='-', state='-', zip_code='-', country='-',
+                contact_person='-', phone='0', email='wh@example.com',
+                latitude=lat, longitude=lon, geohash=geo.encode_geohash(lat, lon),
+            ))
+        Warehouse.objects.bulk_create(warehouse_rows)
+
+        batch_size = 10000
+        for start in range(0, rows, batch_size):
+            orders = []
+            for i in range(start, min(start + batch_size, rows)):
+                lat, lon = self.point(rng)
+                orders.append(Order(
+                    order_number=f'GEO-{i:09d}', customer=customer, shipping_address='-',
+                    shipping_city='-', shipping_state='-', shipping_zip_code='-', shipping_country='-',
+                    shipping_latitude=lat, shipping_longitude=lon,
+                    shipping_geohash=geo.encode_geohash(lat, lon), total_amount=Decimal('1.00'),
+                ))
+            Order.objects.bulk_create(orders)
+            Shipment.objects.bulk_create([
+                Shipment(shipment_number=f'GSHP-{start + i:09d}', order=order)
+                for i, order in enumerate(orders)
+            ])
+        self.stdout.write(f'Seeded {rows} orders/shipments and {warehouses} warehouses')
+
+    def report(self, rng, queries, radius):
+        for label, func in (
+            (f'shipments within {radius:g} km', lambda lat, lon: geo.shipments_within(lat, lon, radius)),
+            ('nearest 5 warehouses', lambda lat, lon: geo.nearest_warehouses(lat, lon, limit=5)),
+        ):
+            timings, found = [], 0
+            for _ in range(queries):
+                lat, lon = self.point(rng)
+                start = time.perf_counter()
+                found += len(func(lat, lon))
+                timings.append(time.perf_counter() - start)
+            timings.sort()
+            self.stdout.write(
+                f'{label:<28} median {timings[len(timings) // 2] * 1000:7.2f} ms   '
+                f'p95 {timings[int(len(timings) * 0.95)] * 1000:7.2f} ms   avg hits {found / queries:.1f}')
@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from backend.models import Customer, Order, Shipment
+from backend.serializers import (
+    CustomerSerializer, CustomerListSerializer,
+    OrderSerializer, OrderListSerializer,
+    ShipmentSerializer, ShipmentListSerializer,
+)
+from backend.management.benchmark import rolled_back, seed_orders
+from backend.views import optimize_queryset
+
+
+class Command(BaseCommand):
+    help = 'Compare list payload size and serialization time for full, compact and sparse representations'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            seed_orders(options['rows'])
+            self.report(options['repeat'])
+
+    def report(self, repeat):
+        cases = [
+            ('customers', Customer.objects.order_by('name'), CustomerSerializer, CustomerListSerializer, ['name', 'city']),
+            ('orders', Order.objects.order_by('-order_date'), OrderSerializer, OrderListSerializer, ['order_number', 'status', 'total_amount']),
+            ('shipments', Shipment.objects.order_by('-created_at'), ShipmentSerializer, ShipmentListSerializer, ['shipment_number', 'status']),
+        ]
+        renderer = JSONRenderer()
+        self.stdout.write(f"{'resource':<10} {'variant':<8} {'bytes':>10} {'ms':>9}")
+        for name, queryset, full_class, list_class, fields in cases:
+            variants = [
+                ('full', lambda: full_class(queryset.all(), many=True)),
+                ('compact', lambda: list_class(optimize_queryset(queryset.all(), list_class()), many=True)),
+                ('fields', lambda: full_class(
+                    optimize_queryset(queryset.all(), full_class(fields=fields)), many=True, fields=fields)),
+            ]
+            for variant, build in variants:
+                best = None
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    payload = renderer.render(build().data)
+                    elapsed = time.perf_counter() - start
+                    best = elapsed if best is None else min(best, elapsed)
+                self.stdout.write(f'{name:<10} {variant:<8} {len(payload):>10} {best * 1000:>9.1f}')
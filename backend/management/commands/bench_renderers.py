@@ -0,0 +1,70 @@
+import gzip
+import io
+import time
+
+from django.core.management.base import BaseCommand
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from backend.management.benchmark import rolled_back, seed_orders
+from backend.models import Order
+from backend.renderers import FastJSONRenderer, FastJSONParser, orjson
+from backend.serializers import OrderSerializer
+from backend.views import optimize_queryset
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def best_of(repeat, func):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+class Command(BaseCommand):
+    help = 'Benchmark JSON rendering, parsing and compression on a page of /orders/'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=10)
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            seed_orders(options['rows'])
+            queryset = optimize_queryset(Order.objects.order_by('-order_date'), OrderSerializer())
+            # Raw model values keep Decimal/UUID/datetime objects for the
+            # renderer to convert, as a values()-based endpoint would.
+            pages = {
+                'serialized': OrderSerializer(queryset, many=True).data,
+                'values': list(Order.objects.values()),
+            }
+            self.report(pages, options['repeat'])
+
+    def report(self, pages, repeat):
+        self.stdout.write(f'orjson available: {orjson is not None}, brotli available: {brotli is not None}')
+        for name, data in pages.items():
+            std_time, body = best_of(repeat, lambda: JSONRenderer().render(data))
+            fast_time, _ = best_of(repeat, lambda: FastJSONRenderer().render(data))
+            self.stdout.write(
+                f'render {name:<11} stdlib {std_time * 1000:8.2f} ms   fast {fast_time * 1000:8.2f} ms'
+                f'   x{std_time / fast_time:.1f}')
+
+        std_time, _ = best_of(repeat, lambda: JSONParser().parse(io.BytesIO(body)))
+        fast_time, _ = best_of(repeat, lambda: FastJSONParser().parse(io.BytesIO(body)))
+        self.stdout.write(
+            f'parse  {len(body)} bytes    stdlib {std_time * 1000:8.2f} ms   fast {fast_time * 1000:8.2f} ms')
+
+        body = FastJSONRenderer().render(pages['serialized'])
+        gz_time, gz = best_of(repeat, lambda: gzip.compress(body, compresslevel=6))
+        self.stdout.write(f'identity {len(body):>9} bytes')
+        self.stdout.write(f'gzip     {len(gz):>9} bytes   {gz_time * 1000:8.2f} ms')
+        if brotli is not None:
+            br_time, br = best_of(repeat, lambda: brotli.compress(body, quality=4))
+            self.stdout.write(f'br       {len(br):>9} bytes   {br_time * 1000:8.2f} ms')
@@ -0,0 +1,62 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter so every measurement is a real cold start.
+PROBE = r'''
+import json, sys, time
+start = time.perf_counter()
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+ready = time.perf_counter() - start
+
+from backend.lazy import loaded_heavy_modules
+heavy = loaded_heavy_modules()
+
+from django.test import Client
+client = Client()
+timings = []
+for _ in range(2):
+    t = time.perf_counter()
+    status = client.get(sys.argv[1], HTTP_HOST='localhost').status_code
+    timings.append(time.perf_counter() - t)
+print(json.dumps({'ready': ready, 'first': timings[0], 'second': timings[1],
+                  'status': status, 'heavy': heavy}))
+'''
+
+
+class Command(BaseCommand):
+    help = 'Measure worker cold start (Django setup + URLconf) and first-request latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument('--path', default='/schema/', help='URL requested after start-up')
+
+    def probe(self, path):
+        result = subprocess.run([sys.executable, '-c', PROBE, path], env=os.environ.copy(),
+                                capture_output=True, text=True)
+        if result.returncode:
+            raise CommandError(result.stderr.strip().splitlines()[-1])
+        return json.loads(result.stdout.strip().splitlines()[-1])
+
+    def handle(self, *args, **options):
+        runs = [self.probe(options['path']) for _ in range(options['runs'])]
+
+        def median_ms(key):
+            return statistics.median(run[key] for run in runs) * 1000
+
+        self.stdout.write(f'{options["runs"]} cold starts, GET {options["path"]} -> {runs[-1]["status"]}')
+        self.stdout.write(f'  setup + urlconf   {median_ms("ready"):8.1f} ms (median)')
+        self.stdout.write(f'  first request     {median_ms("first"):8.1f} ms')
+        self.stdout.write(f'  second request    {median_ms("second"):8.1f} ms')
+        heavy = runs[-1]['heavy']
+        if heavy:
+            self.stdout.write(self.style.WARNING(f'  heavy modules imported at start-up: {", ".join(heavy)}'))
+        else:
+            self.stdout.write('  no heavy modules imported at start-up')
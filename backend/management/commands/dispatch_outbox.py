@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from backend import outbox
+
+
+class Command(BaseCommand):
+    help = 'Deliver pending outbox events to their webhook destinations'
+
+    def add_arguments(self, parser):
+        parser.add_argument('destinations', nargs='*', help='Destinations to serve (default: all)')
+        parser.add_argument('--loop', action='store_true', help='Keep dispatching instead of running one pass')
+        parser.add_argument('--idle-sleep', type=float, default=0.5, help='Seconds to wait when nothing was sent')
+
+    def handle(self, *args, **options):
+        unknown = set(options['destinations']) - set(outbox.destinations())
+        if unknown:
+            raise CommandError(f"Unknown destinations: {', '.join(sorted(unknown))}")
+        names = options['destinations'] or None
+        while True:
+            sent = outbox.dispatch(names)
+            for name, count in sent.items():
+                if count:
+                    self.stdout.write(f'{name}: delivered {count} events')
+            if not options['loop']:
+                return
+            if not any(sent.values()):
+                time.sleep(options['idle_sleep'])
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from backend import analytics
+
+
+class Command(BaseCommand):
+    help = 'Export changed orders, order items, shipments and stock to the columnar analytics store'
+
+    def add_arguments(self, parser):
+        parser.add_argument('tables', nargs='*', help=f"Tables to export (default: {', '.join(analytics.TABLES)})")
+        parser.add_argument('--full', action='store_true', help='Discard the stored files and export everything')
+
+    def handle(self, *args, **options):
+        unknown = set(options['tables']) - set(analytics.TABLES)
+        if unknown:
+            raise CommandError(f"Unknown tables: {', '.join(sorted(unknown))}")
+        for table, rows in analytics.export(options['tables'], full=options['full']).items():
+            self.stdout.write(f'{table}: exported {rows} rows')
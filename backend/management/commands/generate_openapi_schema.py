@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from backend import schema
+
+
+class Command(BaseCommand):
+    help = 'Generate the OpenAPI schema at build time and write it as a versioned static file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--api-version', default=getattr(settings, 'API_VERSION', '1.0.0'))
+        parser.add_argument('--output', default=None, help='Directory to write to (default: OPENAPI_SCHEMA_DIR)')
+        parser.add_argument('--urlconf', default='backend.urls')
+        parser.add_argument('--check', action='store_true',
+                            help='Fail if the committed schema is out of date instead of writing it')
+
+    def handle(self, *args, **options):
+        content = schema.build_schema(options['api_version'], urlconf=options['urlconf'])
+
+        if options['check']:
+            try:
+                manifest = schema.read_manifest(options['output'])
+            except schema.SchemaNotBuilt as exc:
+                raise CommandError(str(exc))
+            path = schema.schema_path(manifest['file'], options['output'])
+            with open(path, 'rb') as f:
+                if f.read() != content:
+                    raise CommandError('OpenAPI schema is out of date; run generate_openapi_schema.')
+            self.stdout.write(f'OpenAPI schema {manifest["file"]} is up to date')
+            return
+
+        manifest = schema.write_schema(content, options['api_version'], options['output'])
+        self.stdout.write(f'Wrote {manifest["file"]} ({len(content)} bytes)')
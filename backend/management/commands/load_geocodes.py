@@ -0,0 +1,63 @@
+import csv
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from backend import geo
+from backend.models import GeoLocation, Order, Warehouse
+
+
+class Command(BaseCommand):
+    help = (
+        'Load the offline geocoding table from a CSV with columns '
+        'country,zip_code,city,state,latitude,longitude and optionally backfill '
+        'coordinates for warehouses and orders'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_path', nargs='?')
+        parser.add_argument('--backfill', action='store_true',
+                            help='Geocode warehouses and orders that have no coordinates yet')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if options['csv_path']:
+            self.load(options['csv_path'], batch_size)
+        geo.clear_cache()
+        if options['backfill']:
+            self.backfill(Warehouse, '', batch_size)
+            self.backfill(Order, 'shipping_', batch_size)
+
+    def load(self, path, batch_size):
+        created = 0
+        with open(path, newline='', encoding='utf-8') as handle:
+            batch = []
+            for row in csv.DictReader(handle):
+                batch.append(GeoLocation(
+                    country=row['country'], zip_code=row.get('zip_code', ''), city=row['city'],
+                    state=row.get('state', ''), latitude=float(row['latitude']),
+                    longitude=float(row['longitude']),
+                ))
+                if len(batch) >= batch_size:
+                    created += len(GeoLocation.objects.bulk_create(batch, ignore_conflicts=True))
+                    batch = []
+            created += len(GeoLocation.objects.bulk_create(batch, ignore_conflicts=True))
+        self.stdout.write(f'Loaded {created} locations')
+
+    def backfill(self, model, prefix, batch_size):
+        fields = [f'{prefix}latitude', f'{prefix}longitude', f'{prefix}geohash']
+        pending = model.objects.filter(**{f'{prefix}geohash': ''}).order_by('pk')
+        updated, last_pk = 0, None
+        while True:
+            page = pending if last_pk is None else pending.filter(pk__gt=last_pk)
+            rows = list(page[:batch_size])
+            if not rows:
+                break
+            for row in rows:
+                geo.locate(row, prefix)
+            with transaction.atomic():
+                model.objects.bulk_update(rows, fields)
+            updated += sum(1 for row in rows if getattr(row, f'{prefix}geohash'))
+            last_pk = rows[-1].pk
+        self.stdout.write(f'Geocoded {updated} {model._meta.verbose_name_plural}')
@@ -0,0 +1,47 @@
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from backend import sharding
+from backend.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Move orders (with their items, shipments and tracking) to the shard of their current region'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would move')
+        parser.add_argument('--limit', type=int, default=None, help='Move at most this many orders')
+        parser.add_argument('--sync-reference', action='store_true',
+                            help='Copy customers, products, warehouses, vehicles, drivers and users to every shard first')
+
+    def handle(self, *args, **options):
+        if not sharding.enabled():
+            raise CommandError('Sharding is not configured (SHARD_REGIONS is empty).')
+
+        if options['sync_reference'] and not options['dry_run']:
+            for alias in sharding.shard_aliases():
+                if alias != DEFAULT_DB_ALIAS:
+                    copied = sharding.sync_reference_data(alias)
+                    self.stdout.write(f'Synced {copied} reference rows to {alias}')
+
+        moves = []
+        for source in sharding.shard_aliases():
+            rows = Order.objects.using(source).values_list('pk', 'shipping_country', 'shipping_state')
+            for pk, country, state in rows.iterator(chunk_size=5000):
+                target = sharding.alias_for_region(sharding.region_for_address(country, state))
+                if target != source:
+                    moves.append((pk, source, target))
+        if options['limit'] is not None:
+            moves = moves[:options['limit']]
+
+        for (source, target), count in sorted(Counter((s, t) for _, s, t in moves).items()):
+            self.stdout.write(f'{source} -> {target}: {count} orders')
+        if options['dry_run']:
+            self.stdout.write(f'{len(moves)} orders would move')
+            return
+
+        for pk, source, target in moves:
+            sharding.move_order(pk, source, target)
+        self.stdout.write(f'Moved {len(moves)} orders')
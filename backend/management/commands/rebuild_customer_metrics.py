@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from backend import customer_metrics
+
+
+class Command(BaseCommand):
+    help = 'Recompute recency, frequency and monetary metrics and RFM scores for every customer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows per upsert statement')
+
+    def handle(self, *args, **options):
+        customers, seconds = customer_metrics.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(f'Rebuilt metrics for {customers} customers in {seconds * 1000:.0f} ms')
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from backend import stock_history
+
+
+class Command(BaseCommand):
+    help = 'Record the current stock levels in the inventory history and thin out old snapshots'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='Date to record the levels under (default: today)')
+        parser.add_argument('--no-thin', action='store_true', help='Keep every old snapshot')
+
+    def handle(self, *args, **options):
+        date = None
+        if options['date']:
+            try:
+                date = parse_date(options['date'])
+            except ValueError:
+                date = None
+            if date is None:
+                raise CommandError('--date must be YYYY-MM-DD')
+        written, seconds = stock_history.take_snapshot(date)
+        self.stdout.write(f'Recorded {written} changed stock levels in {seconds * 1000:.0f} ms')
+        if not options['no_thin']:
+            self.stdout.write(f'Thinned {stock_history.thin()} old snapshots')
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from backend import eta
+
+
+class Command(BaseCommand):
+    help = 'Re-estimate arrival times of in-transit shipments (optionally retraining the ETA model first)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--train', action='store_true', help='Relearn quantiles from delivery history first')
+
+    def handle(self, *args, **options):
+        if options['train']:
+            groups = eta.train()
+            self.stdout.write(f'Trained {groups} ETA groups')
+        scored, updated, seconds = eta.score()
+        self.stdout.write(f'Scored {scored} shipments, updated {updated} in {seconds * 1000:.0f} ms')
@@ -0,0 +1,64 @@
+import gzip
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def accepted_encodings(header):
+    """Return the content codings in an Accept-Encoding header, minus q=0 ones."""
+    accepted = set()
+    for item in header.split(','):
+        coding, _, params = item.strip().partition(';')
+        params = params.replace(' ', '')
+        if coding and params not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            accepted.add(coding.lower())
+    return accepted
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Compress responses with brotli (when installed) or gzip.
+
+    Responses smaller than ``COMPRESSION_MIN_SIZE`` bytes are sent as-is,
+    since the framing overhead outweighs the savings. Place it above any
+    middleware that reads or modifies the response body.
+    """
+
+    def process_response(self, request, response):
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+        if len(response.content) < getattr(settings, 'COMPRESSION_MIN_SIZE', 1024):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        accepted = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+
+        if brotli is not None and 'br' in accepted:
+            encoding = 'br'
+            content = brotli.compress(
+                response.content, quality=getattr(settings, 'COMPRESSION_BROTLI_QUALITY', 4))
+        elif 'gzip' in accepted:
+            encoding = 'gzip'
+            content = gzip.compress(
+                response.content, compresslevel=getattr(settings, 'COMPRESSION_GZIP_LEVEL', 6))
+        else:
+            return response
+
+        if len(content) >= len(response.content):
+            return response
+
+        response.content = content
+        response['Content-Length'] = str(len(content))
+        response['Content-Encoding'] = encoding
+
+        # The body is no longer byte-identical, so a strong ETag must be weakened.
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
@@ -1,9 +1,13 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import MinValueValidator
 import uuid
 
+from .sharding import ShardedQuerySet
+
 class User(AbstractUser):
     USER_TYPE_CHOICES = (
         ('admin', 'Admin'),
@@ -17,6 +21,7 @@ class User(AbstractUser):
     phone = models.CharField(max_length=15, blank=True)
     address = models.TextField(blank=True)
     profile_picture = models.ImageField(upload_to='profile_pics/', blank=True, null=True)
+    profile_picture_variants = models.JSONField(default=dict, blank=True, editable=False)  # Filled by backend.images
     
     def __str__(self):
         return self.username
@@ -37,6 +42,34 @@ class Customer(models.Model):
     def __str__(self):
         return self.name
 
+# Recency / frequency / monetary figures per customer, maintained by backend.customer_metrics
+class CustomerMetrics(models.Model):
+    customer = models.OneToOneField(Customer, on_delete=models.CASCADE, primary_key=True, related_name='metrics')
+    order_count = models.PositiveIntegerField(default=0)
+    lifetime_value = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    monetary_value = models.DecimalField(max_digits=14, decimal_places=2, default=0)  # Spend in the last CUSTOMER_MONETARY_DAYS
+    average_order_value = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    first_order_at = models.DateTimeField(null=True, blank=True)
+    last_order_at = models.DateTimeField(null=True, blank=True)
+    recency_score = models.PositiveSmallIntegerField(default=0)  # 1-5 quintiles, 0 = no orders
+    frequency_score = models.PositiveSmallIntegerField(default=0)
+    monetary_score = models.PositiveSmallIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name_plural = 'customer metrics'
+        indexes = [
+            models.Index(fields=['order_count']),
+            models.Index(fields=['lifetime_value']),
+            models.Index(fields=['monetary_value']),
+            models.Index(fields=['average_order_value']),
+            models.Index(fields=['last_order_at']),
+            models.Index(fields=['recency_score', 'frequency_score', 'monetary_score']),
+        ]
+    
+    def __str__(self):
+        return f"{self.customer_id} - {self.order_count} orders, {self.lifetime_value}"
+
 class Supplier(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     name = models.CharField(max_length=100)
@@ -57,6 +90,7 @@ class Supplier(models.Model):
 class Category(models.Model):
     name = models.CharField(max_length=100, unique=True)
     description = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         verbose_name_plural = "Categories"
@@ -75,6 +109,7 @@ class Product(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
     reorder_level = models.PositiveIntegerField(default=10)
     image = models.ImageField(upload_to='products/', blank=True, null=True)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)  # Filled by backend.images
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -92,6 +127,9 @@ class Warehouse(models.Model):
     contact_person = models.CharField(max_length=100)
     phone = models.CharField(max_length=15)
     email = models.EmailField()
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    geohash = models.CharField(max_length=12, blank=True, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -103,14 +141,31 @@ class Inventory(models.Model):
     warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE, related_name='inventory')
     quantity = models.PositiveIntegerField(default=0)
     last_restock_date = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         verbose_name_plural = "Inventories"
         unique_together = ('product', 'warehouse')
+        indexes = [models.Index(fields=['updated_at'])]
     
     def __str__(self):
         return f"{self.product.name} - {self.warehouse.name} - {self.quantity}"
 
+# End-of-day stock levels kept by backend.stock_history; a row only where the quantity changed since the previous one
+class InventorySnapshot(models.Model):
+    # Both foreign keys are covered by the composite indexes below.
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+', db_index=False)
+    warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE, related_name='+', db_index=False)
+    date = models.DateField()
+    quantity = models.PositiveIntegerField()
+    
+    class Meta:
+        unique_together = ('product', 'warehouse', 'date')
+        indexes = [models.Index(fields=['warehouse', 'date']), models.Index(fields=['date'])]
+    
+    def __str__(self):
+        return f"{self.product_id} @ {self.warehouse_id} on {self.date}: {self.quantity}"
+
 class Order(models.Model):
     STATUS_CHOICES = (
         ('pending', 'Pending'),
@@ -122,7 +177,7 @@ class Order(models.Model):
     )
     
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    order_number = models.CharField(max_length=20, unique=True)
+    order_number = models.CharField(max_length=20, unique=True, blank=True)  # Assigned by backend.numbering when left blank
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='orders')
     order_date = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
@@ -131,11 +186,20 @@ class Order(models.Model):
     shipping_state = models.CharField(max_length=50)
     shipping_zip_code = models.CharField(max_length=10)
     shipping_country = models.CharField(max_length=50)
+    shipping_latitude = models.FloatField(null=True, blank=True)
+    shipping_longitude = models.FloatField(null=True, blank=True)
+    shipping_geohash = models.CharField(max_length=12, blank=True, db_index=True)
     total_amount = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
     tracking_number = models.CharField(max_length=50, blank=True, null=True)
     notes = models.TextField(blank=True)
+    status_changed_at = models.DateTimeField(default=timezone.now, editable=False)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = ShardedQuerySet.as_manager()
+    
+    class Meta:
+        indexes = [models.Index(fields=['status', 'status_changed_at']), models.Index(fields=['updated_at'])]
+    
     def __str__(self):
         return self.order_number
 
@@ -145,6 +209,8 @@ class OrderItem(models.Model):
     quantity = models.PositiveIntegerField(default=1)
     unit_price = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
     
+    objects = ShardedQuerySet.as_manager()
+    
     @property
     def total_price(self):
         return self.quantity * self.unit_price
@@ -192,27 +258,172 @@ class Shipment(models.Model):
     )
     
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    shipment_number = models.CharField(max_length=20, unique=True)
+    shipment_number = models.CharField(max_length=20, unique=True, blank=True)  # Assigned by backend.numbering when left blank
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='shipments')
     driver = models.ForeignKey(Driver, on_delete=models.SET_NULL, null=True, blank=True, related_name='shipments')
     vehicle = models.ForeignKey(Vehicle, on_delete=models.SET_NULL, null=True, blank=True, related_name='shipments')
+    warehouse = models.ForeignKey(Warehouse, on_delete=models.SET_NULL, null=True, blank=True, related_name='shipments')
     departure_time = models.DateTimeField(null=True, blank=True)
     estimated_arrival = models.DateTimeField(null=True, blank=True)
     actual_arrival = models.DateTimeField(null=True, blank=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    is_likely_late = models.BooleanField(default=False)  # Set by backend.eta
     notes = models.TextField(blank=True)
+    status_changed_at = models.DateTimeField(default=timezone.now, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = ShardedQuerySet.as_manager()
+    
+    class Meta:
+        indexes = [models.Index(fields=['status', 'status_changed_at']), models.Index(fields=['updated_at'])]
+    
     def __str__(self):
         return self.shipment_number
 
+class ShipmentItem(models.Model):
+    shipment = models.ForeignKey(Shipment, on_delete=models.CASCADE, related_name='items')
+    order_item = models.ForeignKey(OrderItem, on_delete=models.CASCADE, related_name='shipment_items')
+    quantity = models.PositiveIntegerField()
+    
+    objects = ShardedQuerySet.as_manager()
+    
+    def __str__(self):
+        return f"{self.shipment.shipment_number} - {self.order_item.product.name} - {self.quantity}"
+
 class ShipmentTracking(models.Model):
     shipment = models.ForeignKey(Shipment, on_delete=models.CASCADE, related_name='tracking_updates')
     location = models.CharField(max_length=100)
     status = models.CharField(max_length=100)
     timestamp = models.DateTimeField(auto_now_add=True)
     notes = models.TextField(blank=True)
+    client_id = models.UUIDField(unique=True, null=True, blank=True)  # Idempotency key for offline clients
+    
+    objects = ShardedQuerySet.as_manager()
+    
+    def __str__(self):
+        return f"{self.shipment.shipment_number} - {self.timestamp}"
+
+# Offline geocoding table (postal code / city centroids)
+class GeoLocation(models.Model):
+    country = models.CharField(max_length=50)
+    zip_code = models.CharField(max_length=10, blank=True)
+    city = models.CharField(max_length=50)
+    state = models.CharField(max_length=50, blank=True)
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    
+    class Meta:
+        unique_together = ('country', 'zip_code', 'city')
+        indexes = [models.Index(fields=['country', 'city'])]
+    
+    def __str__(self):
+        return f"{self.zip_code} {self.city}, {self.country}"
+
+# Deletions (and reassignments away from a driver) for the driver delta sync
+class SyncTombstone(models.Model):
+    MODEL_CHOICES = (
+        ('shipment', 'Shipment'),
+        ('order', 'Order'),
+    )
+    
+    model = models.CharField(max_length=20, choices=MODEL_CHOICES)
+    object_id = models.UUIDField()
+    owner = models.ForeignKey(Driver, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    deleted_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [models.Index(fields=['model', 'deleted_at'])]
+    
+    def __str__(self):
+        return f"{self.model} {self.object_id} - {self.deleted_at}"
+
+# Order/shipment status history, one row per transition (from_status is blank on creation)
+class StatusTransition(models.Model):
+    ENTITY_CHOICES = (
+        ('order', 'Order'),
+        ('shipment', 'Shipment'),
+    )
+    
+    entity = models.CharField(max_length=10, choices=ENTITY_CHOICES)
+    object_id = models.UUIDField()
+    from_status = models.CharField(max_length=20, blank=True)
+    to_status = models.CharField(max_length=20)
+    changed_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['entity', 'to_status', 'changed_at']),
+            models.Index(fields=['entity', 'object_id', 'changed_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.entity} {self.object_id}: {self.from_status or '-'} -> {self.to_status}"
+
+
+# Trip duration quantiles learned from delivery history (backend.eta); blank key parts mean "any"
+class EtaQuantile(models.Model):
+    warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    destination = models.CharField(max_length=12, blank=True)  # Geohash cell, '*' for the vehicle and global groups
+    vehicle_type = models.CharField(max_length=20, blank=True)
+    samples = models.PositiveIntegerField()
+    p50_minutes = models.FloatField()
+    p90_minutes = models.FloatField()
+    p50_pace = models.FloatField(null=True, blank=True)  # Minutes per km
+    p90_pace = models.FloatField(null=True, blank=True)
+    trained_at = models.DateTimeField()
+    
+    class Meta:
+        unique_together = ('warehouse', 'destination', 'vehicle_type')
+    
+    def __str__(self):
+        return f"{self.warehouse_id or '*'}/{self.destination or '*'}/{self.vehicle_type or '*'} - p50 {self.p50_minutes:.0f} min"
+
+# Export progress of the columnar analytics store (backend.analytics)
+class AnalyticsWatermark(models.Model):
+    table = models.CharField(max_length=50, primary_key=True)
+    exported_through = models.DateTimeField(null=True, blank=True)  # Highest updated_at written so far
+    exported_at = models.DateTimeField(null=True, blank=True)
+    rows = models.PositiveIntegerField(default=0)  # Rows written by the last export
+    
+    def __str__(self):
+        return f"{self.table} - {self.exported_through}"
+
+# Integration events written with the change that caused them, one row per destination;
+# backend.outbox delivers them in id order and deletes them once acknowledged
+class OutboxEvent(models.Model):
+    destination = models.CharField(max_length=50)
+    event_id = models.UUIDField(default=uuid.uuid4)  # Idempotency key, shared by every destination's copy
+    event_type = models.CharField(max_length=50)
+    aggregate_type = models.CharField(max_length=20)
+    aggregate_id = models.UUIDField()
+    payload = models.JSONField(encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        unique_together = ('destination', 'event_id')
+        indexes = [models.Index(fields=['destination', 'id'])]
+    
+    def __str__(self):
+        return f"{self.event_type} {self.aggregate_id} -> {self.destination}"
+
+# Delivery state of one outbox destination (backend.outbox)
+class OutboxDestination(models.Model):
+    name = models.CharField(max_length=50, primary_key=True)
+    leased_until = models.DateTimeField(null=True, blank=True)  # A dispatcher is working on it until then
+    attempts = models.PositiveIntegerField(default=0)  # Consecutive failed deliveries
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    delivered = models.PositiveBigIntegerField(default=0)
+    last_delivered_at = models.DateTimeField(null=True, blank=True)
+    
+    def __str__(self):
+        return self.name
+
+# Block counter per number prefix on databases without sequences (backend.numbering)
+class NumberSequence(models.Model):
+    prefix = models.CharField(max_length=8, primary_key=True)
+    next_value = models.BigIntegerField(default=1)
     
     def __str__(self):
-        return f"{self.shipment.shipment_number} - {self.timestamp}"
\ No newline at end of file
+        return f"{self.prefix} - {self.next_value}"
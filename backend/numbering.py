@@ -0,0 +1,244 @@
+"""
+Human-readable order and shipment numbers (``ORD-00001234``).
+
+Each worker process reserves numbers in blocks of ``NUMBER_BLOCK_SIZE`` and
+hands them out from memory, so creating an order costs no query for its
+number. Blocks are disjoint, so numbers never collide; they increase within
+a process and roughly with time across processes.
+
+Blocks come from a PostgreSQL sequence per prefix where available
+(``nextval`` takes no row lock and is not rolled back). The sequence's
+increment is the block size it was created with, so changing
+``NUMBER_BLOCK_SIZE`` only affects new prefixes.
+
+Other databases use the ``NumberSequence`` counter row, touched once per
+block. When the caller is inside a transaction, the block is reserved on a
+separate autocommit connection, so the counter's row lock is released at
+once and a rollback of the caller can't undo a block that was handed out.
+On SQLite that connection retries for up to ``NUMBER_RESERVE_TIMEOUT``
+seconds while another connection writes.
+
+SQLite has one write lock for the whole database, so a caller whose
+transaction has already written holds it until commit and the separate
+connection could never get in. Only then is a single number reserved in the
+caller's transaction, and nothing is cached. This is a deliberate
+adaptation: the caller already blocks every other writer, so the counter
+update adds no contention.
+"""
+import copy
+import os
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, OperationalError, connections, transaction
+from django.db.models import F
+from django.db.utils import load_backend
+
+from .models import NumberSequence
+
+PREFIX_RE = re.compile(r'^[A-Z][A-Z0-9]{0,7}$')
+# Seconds between attempts to reserve a block while another SQLite connection writes.
+RETRY_DELAY = 0.01
+
+_blocks = {}
+_locks = {}
+_locks_lock = threading.Lock()
+_outside = threading.local()
+
+
+class Block:
+    __slots__ = ('next', 'end', 'pid')
+
+    def __init__(self, start, size):
+        self.next = start
+        self.end = start + size
+        self.pid = os.getpid()
+
+    def usable(self):
+        # A forked worker must not hand out its parent's numbers.
+        return self.pid == os.getpid() and self.next < self.end
+
+
+def get_setting(name, default):
+    return getattr(settings, name, default)
+
+
+def sequence_name(prefix):
+    return f'number_{prefix.lower()}_seq'
+
+
+def reserve_from_sequence(connection, prefix, size):
+    """Start of a block from the prefix's PostgreSQL sequence, and how many numbers may be used."""
+    name = sequence_name(prefix)
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT seqincrement FROM pg_sequence WHERE seqrelid = to_regclass(%s)', [name])
+        row = cursor.fetchone()
+        if row is None:
+            cursor.execute(f'CREATE SEQUENCE IF NOT EXISTS {connection.ops.quote_name(name)} INCREMENT BY {int(size)}')
+        else:
+            # Blocks must match the sequence's step or they would overlap.
+            size = row[0]
+        cursor.execute('SELECT nextval(%s)', [name])
+        start = cursor.fetchone()[0]
+    # A sequence created in a transaction that later rolls back would start over.
+    return start, size if row is not None or not connection.in_atomic_block else 1
+
+
+def outside_connection(alias):
+    """
+    This thread's autocommit connection to ``alias``, used to reserve blocks
+    outside the caller's transaction. On SQLite it doesn't wait for the write
+    lock; ``reserve_outside`` retries instead.
+    """
+    connection = getattr(_outside, alias, None)
+    if connection is None:
+        settings_dict = copy.deepcopy(connections[alias].settings_dict)
+        if settings_dict['ENGINE'] == 'django.db.backends.sqlite3':
+            settings_dict['OPTIONS'] = {**settings_dict.get('OPTIONS', {}), 'timeout': 0}
+        connection = load_backend(settings_dict['ENGINE']).DatabaseWrapper(settings_dict, alias)
+        setattr(_outside, alias, connection)
+    connection.close_if_unusable_or_obsolete()
+    return connection
+
+
+def counter_sql(connection):
+    quote = connection.ops.quote_name
+    meta = NumberSequence._meta
+    table = quote(meta.db_table)
+    prefix, value = (quote(meta.get_field(name).column) for name in ('prefix', 'next_value'))
+    return (
+        f'UPDATE {table} SET {value} = {value} + %s WHERE {prefix} = %s',
+        f'INSERT INTO {table} ({prefix}, {value}) VALUES (%s, %s)',
+        f'SELECT {value} FROM {table} WHERE {prefix} = %s',
+    )
+
+
+def reserve_outside(alias, prefix, size):
+    """Reserve a block from the ``NumberSequence`` row in a transaction of its own."""
+    connection = outside_connection(alias)
+    update, insert, select = counter_sql(connection)
+    connection.set_autocommit(False)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(update, [size, prefix])
+            if cursor.rowcount == 0:
+                cursor.execute(insert, [prefix, 1 + size])
+            cursor.execute(select, [prefix])
+            end = cursor.fetchone()[0]
+        connection.commit()
+    except IntegrityError:
+        # Another worker created the row first; it exists now.
+        connection.rollback()
+        return reserve_outside(alias, prefix, size)
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.set_autocommit(True)
+    return end - size, size
+
+
+def holds_write_lock(connection):
+    """
+    Whether the caller's SQLite transaction holds the database write lock:
+    a write that changes nothing succeeds at once only if it does.
+    """
+    update = counter_sql(connection)[0]
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA busy_timeout')
+        timeout = cursor.fetchone()[0]
+        cursor.execute('PRAGMA busy_timeout = 0')
+        try:
+            with transaction.atomic(using=connection.alias):
+                cursor.execute(update, [0, ''])
+        except OperationalError:
+            return False
+        finally:
+            cursor.execute(f'PRAGMA busy_timeout = {int(timeout)}')
+    return True
+
+
+def reserve_sqlite_outside(connection, prefix, size):
+    """
+    ``reserve_outside`` for a caller inside an SQLite transaction. Returns
+    ``None`` when the caller's own transaction holds the write lock; waits
+    for any other writer up to ``NUMBER_RESERVE_TIMEOUT`` seconds.
+    """
+    deadline = time.monotonic() + get_setting('NUMBER_RESERVE_TIMEOUT', 5)
+    while True:
+        try:
+            return reserve_outside(connection.alias, prefix, size)
+        except OperationalError:
+            if holds_write_lock(connection):
+                return None
+            if time.monotonic() >= deadline:
+                raise
+        time.sleep(RETRY_DELAY)
+
+
+def reserve_from_counter(connection, prefix, size):
+    """Start of a block from the ``NumberSequence`` row, and how many numbers may be used."""
+    if connection.in_atomic_block:
+        if connection.vendor != 'sqlite':
+            return reserve_outside(connection.alias, prefix, size)
+        reserved = reserve_sqlite_outside(connection, prefix, size)
+        if reserved is not None:
+            return reserved
+        size = 1
+    with transaction.atomic(using=connection.alias):
+        NumberSequence.objects.using(connection.alias).get_or_create(prefix=prefix)
+        NumberSequence.objects.using(connection.alias).filter(prefix=prefix).update(next_value=F('next_value') + size)
+        end = NumberSequence.objects.using(connection.alias).values_list('next_value', flat=True).get(prefix=prefix)
+    return end - size, size
+
+
+def reserve(prefix, size):
+    """Reserve up to ``size`` numbers; returns ``(first, count)``."""
+    connection = connections[DEFAULT_DB_ALIAS]
+    if connection.vendor == 'postgresql':
+        return reserve_from_sequence(connection, prefix, size)
+    return reserve_from_counter(connection, prefix, size)
+
+
+def prefix_lock(prefix):
+    lock = _locks.get(prefix)
+    if lock is None:
+        with _locks_lock:
+            lock = _locks.setdefault(prefix, threading.Lock())
+    return lock
+
+
+def next_value(prefix):
+    if not PREFIX_RE.match(prefix):
+        raise ValueError(f"Invalid number prefix '{prefix}'.")
+    with prefix_lock(prefix):
+        block = _blocks.get(prefix)
+        if block is None or not block.usable():
+            start, count = reserve(prefix, get_setting('NUMBER_BLOCK_SIZE', 100))
+            if count == 1:
+                return start
+            block = _blocks[prefix] = Block(start, count)
+        value = block.next
+        block.next += 1
+        return value
+
+
+def next_number(prefix):
+    """Next formatted number for ``prefix``, e.g. ``ORD-00001234``."""
+    return f'{prefix}-{next_value(prefix):0{get_setting("NUMBER_WIDTH", 8)}d}'
+
+
+def order_number():
+    return next_number(get_setting('ORDER_NUMBER_PREFIX', 'ORD'))
+
+
+def shipment_number():
+    return next_number(get_setting('SHIPMENT_NUMBER_PREFIX', 'SHP'))
+
+
+def discard_blocks():
+    """Forget the cached blocks (their unused numbers are skipped)."""
+    with _locks_lock:
+        _blocks.clear()
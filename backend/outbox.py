@@ -0,0 +1,238 @@
+"""
+Transactional outbox for integration events.
+
+Order and shipment changes call ``publish``, which writes one
+``OutboxEvent`` per interested destination on the database holding the
+changed row. When the change runs inside a transaction (API writes use
+``sharding.atomic``), the events commit or roll back with it. Nothing
+remote happens in the request.
+
+``dispatch`` delivers the events to the ``OUTBOX_DESTINATIONS`` webhooks::
+
+    OUTBOX_DESTINATIONS = {
+        'erp': {'url': 'https://erp.example.com/hooks/logistics', 'events': ['order.*']},
+        'notifications': {'url': 'http://notify:8080/events', 'events': ['*'], 'secret': '...'},
+    }
+
+For each destination it leases the ``OutboxDestination`` row, so only one
+dispatcher works on a destination at a time. It then POSTs pending events
+in id order, in batches of up to ``OUTBOX_BATCH_SIZE``, and deletes each
+batch once the endpoint answers 2xx. A failed batch stops the destination
+until ``next_attempt_at``, with exponential backoff. Later events never
+overtake it, so each aggregate's events arrive in order. Delivery is
+at-least-once: a batch may be re-sent after a timeout or a crash, and
+receivers de-duplicate on the event ``id``, which is identical for every
+destination.
+"""
+import fnmatch
+import hashlib
+import hmac
+import json
+import time
+import urllib.error
+import urllib.request
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import sharding
+from .models import OutboxDestination, OutboxEvent
+
+
+class DeliveryError(Exception):
+    pass
+
+
+def get_setting(name, default):
+    return getattr(settings, name, default)
+
+
+def destinations():
+    return get_setting('OUTBOX_DESTINATIONS', None) or {}
+
+
+def destinations_for(event_type):
+    return [
+        name for name, config in destinations().items()
+        if any(fnmatch.fnmatchcase(event_type, pattern) for pattern in config.get('events', ('*',)))
+    ]
+
+
+def publish(event_type, aggregate_type, aggregate_id, payload, using=DEFAULT_DB_ALIAS):
+    """Queue an event for every destination subscribed to ``event_type``."""
+    publish_many(event_type, aggregate_type, [(aggregate_id, payload)], using)
+
+
+def publish_many(event_type, aggregate_type, events, using=DEFAULT_DB_ALIAS):
+    """Queue ``(aggregate_id, payload)`` events of one type with a single INSERT."""
+    names = destinations_for(event_type)
+    if not names or not events:
+        return
+    now = timezone.now()
+    rows = []
+    for aggregate_id, payload in events:
+        event_id = uuid.uuid4()
+        rows.extend(
+            OutboxEvent(destination=name, event_id=event_id, event_type=event_type, aggregate_type=aggregate_type,
+                        aggregate_id=aggregate_id, payload=payload, created_at=now)
+            for name in names
+        )
+    OutboxEvent.objects.using(using).bulk_create(rows)
+
+
+def order_payload(order, previous_status):
+    return {
+        'order_number': order.order_number,
+        'customer_id': order.customer_id,
+        'status': order.status,
+        'previous_status': previous_status or None,
+        'total_amount': order.total_amount,
+        'changed_at': order.status_changed_at,
+    }
+
+
+def shipment_payload(shipment, previous_status):
+    return {
+        'shipment_number': shipment.shipment_number,
+        'order_id': shipment.order_id,
+        'warehouse_id': shipment.warehouse_id,
+        'status': shipment.status,
+        'previous_status': previous_status or None,
+        'estimated_arrival': shipment.estimated_arrival,
+        'changed_at': shipment.status_changed_at,
+    }
+
+
+def tracking_payload(update):
+    return {
+        'location': update.location,
+        'status': update.status,
+        'notes': update.notes,
+        'timestamp': update.timestamp,
+    }
+
+
+PAYLOADS = {'order': order_payload, 'shipment': shipment_payload}
+
+
+def publish_status_change(instance, previous_status):
+    """``<entity>.created`` for a new order/shipment, ``<entity>.status_changed`` afterwards."""
+    entity = instance._meta.model_name
+    event_type = f'{entity}.created' if not previous_status else f'{entity}.status_changed'
+    publish(event_type, entity, instance.pk, PAYLOADS[entity](instance, previous_status),
+            using=instance._state.db or DEFAULT_DB_ALIAS)
+
+
+def publish_tracking(updates, using=DEFAULT_DB_ALIAS):
+    publish_many('shipment.tracking_added', 'shipment',
+                 [(update.shipment_id, tracking_payload(update)) for update in updates], using)
+
+
+def backoff(attempts):
+    """Seconds to wait after the ``attempts``-th consecutive failure."""
+    delay = get_setting('OUTBOX_RETRY_BASE', 2) * 2 ** (attempts - 1)
+    return min(delay, get_setting('OUTBOX_RETRY_MAX', 600))
+
+
+def encode(destination, events):
+    body = json.dumps({
+        'destination': destination,
+        'events': [
+            {
+                'id': str(event.event_id),
+                'type': event.event_type,
+                'aggregate_type': event.aggregate_type,
+                'aggregate_id': str(event.aggregate_id),
+                'occurred_at': event.created_at,
+                'data': event.payload,
+            }
+            for event in events
+        ],
+    }, cls=DjangoJSONEncoder).encode()
+    batch_key = hashlib.sha256(''.join(str(event.event_id) for event in events).encode()).hexdigest()[:32]
+    return body, batch_key
+
+
+def post(config, body, batch_key):
+    headers = {'Content-Type': 'application/json', 'Idempotency-Key': batch_key, **config.get('headers', {})}
+    if config.get('secret'):
+        digest = hmac.new(config['secret'].encode(), body, hashlib.sha256).hexdigest()
+        headers['X-Signature'] = f'sha256={digest}'
+    request = urllib.request.Request(config['url'], data=body, headers=headers, method='POST')
+    try:
+        with urllib.request.urlopen(request, timeout=config.get('timeout', get_setting('OUTBOX_TIMEOUT', 10))) as response:
+            response.read()
+    except urllib.error.HTTPError as exc:
+        raise DeliveryError(f'HTTP {exc.code} from {config["url"]}')
+    except (urllib.error.URLError, OSError) as exc:
+        raise DeliveryError(f'{config["url"]}: {getattr(exc, "reason", exc)}')
+
+
+def claim(name, now, lease):
+    """Take the destination's lease if it is free and not backing off."""
+    OutboxDestination.objects.get_or_create(name=name)
+    return OutboxDestination.objects.filter(
+        Q(leased_until__isnull=True) | Q(leased_until__lt=now),
+        Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=now),
+        name=name,
+    ).update(leased_until=now + lease) == 1
+
+
+def deliver(name, config, deadline):
+    """
+    Send pending batches of one destination until it is drained or
+    ``deadline`` passes. Returns ``(events delivered, DeliveryError or None)``.
+    """
+    batch_size = config.get('batch_size', get_setting('OUTBOX_BATCH_SIZE', 500))
+    lease = timedelta(seconds=get_setting('OUTBOX_LEASE_SECONDS', 60))
+    sent = 0
+    for alias in dict.fromkeys([DEFAULT_DB_ALIAS] + sharding.shard_aliases()):
+        while time.monotonic() < deadline:
+            batch = list(OutboxEvent.objects.using(alias).filter(destination=name).order_by('pk')[:batch_size])
+            if not batch:
+                break
+            try:
+                post(config, *encode(name, batch))
+            except DeliveryError as exc:
+                return sent, exc
+            OutboxEvent.objects.using(alias).filter(pk__in=[event.pk for event in batch]).delete()
+            sent += len(batch)
+            OutboxDestination.objects.filter(name=name).update(leased_until=timezone.now() + lease)
+            if len(batch) < batch_size:
+                break
+    return sent, None
+
+
+def dispatch_destination(name, seconds=None):
+    """Deliver what one destination has pending. Returns events delivered (0 if busy or backing off)."""
+    config = destinations()[name]
+    lease = timedelta(seconds=get_setting('OUTBOX_LEASE_SECONDS', 60))
+    if not claim(name, timezone.now(), lease):
+        return 0
+    deadline = time.monotonic() + (seconds or get_setting('OUTBOX_DISPATCH_SECONDS', 10))
+    sent, error = 0, None
+    try:
+        sent, error = deliver(name, config, deadline)
+    finally:
+        now = timezone.now()
+        updates = {'leased_until': None}
+        if sent:
+            updates.update(delivered=F('delivered') + sent, last_delivered_at=now)
+        if error is None:
+            updates.update(attempts=0, next_attempt_at=None, last_error='')
+        else:
+            attempts = OutboxDestination.objects.values_list('attempts', flat=True).get(name=name) + 1
+            updates.update(attempts=attempts, last_error=str(error)[:2000],
+                           next_attempt_at=now + timedelta(seconds=backoff(attempts)))
+        OutboxDestination.objects.filter(name=name).update(**updates)
+    return sent
+
+
+def dispatch(names=None, seconds=None):
+    """Run one dispatch pass over every (or the named) destination. Returns events delivered per destination."""
+    return {name: dispatch_destination(name, seconds) for name in (names or destinations())}
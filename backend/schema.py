@@ -0,0 +1,73 @@
+"""
+Prebuilt OpenAPI schema.
+
+``manage.py generate_openapi_schema`` renders the schema with drf-yasg at
+build time and writes it to ``OPENAPI_SCHEMA_DIR`` as
+``openapi-<version>-<hash>.json`` next to a ``manifest.json`` naming the
+current file. At runtime the schema is only read from disk, so neither
+drf-yasg nor schema introspection run inside web workers. The directory is
+an app static directory, so ``collectstatic`` publishes the files too.
+"""
+import hashlib
+import json
+import os
+
+from django.conf import settings
+
+MANIFEST_NAME = 'manifest.json'
+VERSIONED_MAX_AGE = 365 * 24 * 3600
+
+
+class SchemaNotBuilt(Exception):
+    pass
+
+
+def schema_dir():
+    return getattr(settings, 'OPENAPI_SCHEMA_DIR', os.path.join(os.path.dirname(__file__), 'static', 'openapi'))
+
+
+def build_schema(version, urlconf=None):
+    """Render the OpenAPI document as bytes (imports drf-yasg)."""
+    from drf_yasg import openapi
+    from drf_yasg.codecs import OpenAPICodecJson
+    from drf_yasg.generators import OpenAPISchemaGenerator
+
+    info = openapi.Info(title='Logistics API', default_version=version)
+    generator = OpenAPISchemaGenerator(info, urlconf=urlconf)
+    schema = generator.get_schema(request=None, public=True)
+    return OpenAPICodecJson(validators=[]).encode(schema)
+
+
+def write_schema(content, version, directory=None):
+    """Store ``content`` under a content-hashed name and point the manifest at it."""
+    directory = directory or schema_dir()
+    os.makedirs(directory, exist_ok=True)
+    digest = hashlib.sha256(content).hexdigest()[:12]
+    filename = f'openapi-{version}-{digest}.json'
+    with open(os.path.join(directory, filename), 'wb') as f:
+        f.write(content)
+
+    manifest = {'version': version, 'hash': digest, 'file': filename}
+    tmp_path = os.path.join(directory, MANIFEST_NAME + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, os.path.join(directory, MANIFEST_NAME))
+    return manifest
+
+
+def read_manifest(directory=None):
+    path = os.path.join(directory or schema_dir(), MANIFEST_NAME)
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        raise SchemaNotBuilt('OpenAPI schema has not been generated; run generate_openapi_schema.')
+
+
+def schema_path(filename, directory=None):
+    """Absolute path of a generated schema file, or ``None`` for names outside the schema directory."""
+    directory = directory or schema_dir()
+    if os.path.basename(filename) != filename or not filename.startswith('openapi-'):
+        return None
+    path = os.path.join(directory, filename)
+    return path if os.path.exists(path) else None
@@ -0,0 +1,381 @@
+from django.core.exceptions import ObjectDoesNotExist, ValidationError as DjangoValidationError
+from django.utils import timezone
+from rest_framework import serializers
+
+from . import images, sharding, workflow
+from .models import (
+    User, Customer, CustomerMetrics, Supplier, Category, Product, Warehouse, Inventory,
+    Order, OrderItem, Vehicle, Driver, Shipment, ShipmentItem, ShipmentTracking,
+)
+
+
+def validate_status_change(instance, status):
+    if instance is not None:
+        try:
+            workflow.check_transition(workflow.entity_for(instance), instance.status, status)
+        except workflow.InvalidTransition as exc:
+            raise serializers.ValidationError(str(exc))
+    return status
+
+
+class ImageVariantsField(serializers.ReadOnlyField):
+    """Resized image variants as ``{variant: url}``; empty until the worker has rendered them."""
+
+    def to_representation(self, value):
+        return images.variant_urls(value, self.context.get('request'))
+
+
+def parse_field_list(value):
+    """Split a ``?fields=a,b,c`` style query value into a list of names."""
+    if not value:
+        return None
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+
+class SparseFieldsetMixin:
+    """
+    Serializer mixin implementing sparse fieldsets.
+
+    ``fields`` keeps only the named fields, ``expand`` swaps the fields listed
+    in ``expandable_fields`` for their nested representation. Both are passed
+    as keyword arguments by the viewset (see ``views.SparseFieldsetMixin``).
+    """
+
+    expandable_fields = {}
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        expand = kwargs.pop('expand', None)
+        super().__init__(*args, **kwargs)
+
+        for name in expand or ():
+            if name in self.expandable_fields:
+                serializer_class, options = self.expandable_fields[name]
+                self.fields[name] = serializer_class(read_only=True, **options)
+
+        if fields is not None:
+            keep = set(fields) | set(expand or ()) | {'id'}
+            for name in set(self.fields) - keep:
+                self.fields.pop(name)
+
+
+# Compact nested representations
+
+class CustomerSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Customer
+        fields = ('id', 'name')
+
+
+class CategorySummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Category
+        fields = ('id', 'name')
+
+
+class ProductSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Product
+        fields = ('id', 'name', 'sku', 'reorder_level')
+
+
+class WarehouseSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Warehouse
+        fields = ('id', 'name', 'city')
+
+
+class OrderSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Order
+        fields = ('id', 'order_number', 'status')
+
+
+class UserSerializer(serializers.ModelSerializer):
+    profile_picture_variants = ImageVariantsField()
+
+    class Meta:
+        model = User
+        fields = ('id', 'username', 'email', 'first_name', 'last_name',
+                  'user_type', 'phone', 'address', 'profile_picture', 'profile_picture_variants')
+        read_only_fields = ('id',)
+
+
+# Customers and suppliers
+
+class CustomerMetricsSerializer(serializers.ModelSerializer):
+    recency_days = serializers.SerializerMethodField()
+
+    class Meta:
+        model = CustomerMetrics
+        exclude = ('customer',)
+
+    def get_recency_days(self, obj):
+        if obj.last_order_at is None:
+            return None
+        return (timezone.now() - obj.last_order_at).days
+
+
+class CustomerSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    metrics = CustomerMetricsSerializer(read_only=True)
+
+    class Meta:
+        model = Customer
+        fields = '__all__'
+
+
+class CustomerListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    metrics = CustomerMetricsSerializer(read_only=True)
+
+    class Meta:
+        model = Customer
+        fields = ('id', 'name', 'email', 'phone', 'city', 'country', 'metrics')
+
+
+class SupplierSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Supplier
+        fields = '__all__'
+
+
+class SupplierListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Supplier
+        fields = ('id', 'name', 'contact_person', 'email', 'phone', 'city', 'country')
+
+
+# Products and inventory
+
+class CategorySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Category
+        fields = '__all__'
+
+
+class ProductSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    image_variants = ImageVariantsField()
+
+    expandable_fields = {
+        'category': (CategorySummarySerializer, {}),
+    }
+
+    class Meta:
+        model = Product
+        fields = '__all__'
+
+
+class ProductListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    category = CategorySummarySerializer(read_only=True)
+    image_variants = ImageVariantsField()
+
+    class Meta:
+        model = Product
+        fields = ('id', 'name', 'sku', 'category', 'price', 'weight',
+                  'dimensions', 'reorder_level', 'image_variants')
+
+
+class WarehouseSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Warehouse
+        fields = '__all__'
+        read_only_fields = ('geohash',)
+
+
+class WarehouseListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Warehouse
+        fields = ('id', 'name', 'city', 'state', 'country')
+
+
+class InventorySerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    expandable_fields = {
+        'product': (ProductSummarySerializer, {}),
+        'warehouse': (WarehouseSummarySerializer, {}),
+    }
+
+    class Meta:
+        model = Inventory
+        fields = '__all__'
+
+
+class InventoryListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    product = ProductSummarySerializer(read_only=True)
+    warehouse = WarehouseSummarySerializer(read_only=True)
+
+    class Meta:
+        model = Inventory
+        fields = ('id', 'product', 'warehouse', 'quantity', 'last_restock_date')
+
+
+# Orders
+
+class OrderItemSerializer(serializers.ModelSerializer):
+    total_price = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+
+    class Meta:
+        model = OrderItem
+        fields = ('id', 'product', 'quantity', 'unit_price', 'total_price')
+
+
+class OrderSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    items = OrderItemSerializer(many=True, required=False)
+
+    expandable_fields = {
+        'customer': (CustomerSummarySerializer, {}),
+    }
+
+    class Meta:
+        model = Order
+        fields = '__all__'
+        read_only_fields = ('shipping_geohash',)
+
+    def create(self, validated_data):
+        items = validated_data.pop('items', [])
+        order = super().create(validated_data)
+        OrderItem.objects.using(order._state.db).bulk_create([OrderItem(order=order, **item) for item in items])
+        return order
+
+    def update(self, instance, validated_data):
+        if 'items' in validated_data:
+            raise serializers.ValidationError({'items': 'Order items can only be set when the order is created.'})
+        return super().update(instance, validated_data)
+
+    def validate_status(self, value):
+        return validate_status_change(self.instance, value)
+
+
+class OrderListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    customer = CustomerSummarySerializer(read_only=True)
+
+    expandable_fields = {
+        'items': (OrderItemSerializer, {'many': True}),
+    }
+
+    class Meta:
+        model = Order
+        fields = ('id', 'order_number', 'customer', 'order_date', 'status',
+                  'total_amount')
+
+
+# Fleet and shipments
+
+class VehicleSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Vehicle
+        fields = '__all__'
+
+
+class DriverSerializer(serializers.ModelSerializer):
+    name = serializers.CharField(source='__str__', read_only=True)
+
+    class Meta:
+        model = Driver
+        fields = ('id', 'user', 'name', 'license_number', 'license_expiry_date')
+
+
+class ShipmentTrackingSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ShipmentTracking
+        fields = ('id', 'shipment', 'location', 'status', 'timestamp', 'notes')
+        read_only_fields = ('shipment', 'timestamp')
+
+
+class ShipmentItemSerializer(serializers.ModelSerializer):
+    product = serializers.UUIDField(source='order_item.product_id', read_only=True)
+
+    class Meta:
+        model = ShipmentItem
+        fields = ('id', 'order_item', 'product', 'quantity')
+
+
+class ShipmentSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    expandable_fields = {
+        'order': (OrderSummarySerializer, {}),
+        'items': (ShipmentItemSerializer, {'many': True}),
+        'tracking_updates': (ShipmentTrackingSerializer, {'many': True}),
+    }
+
+    class Meta:
+        model = Shipment
+        fields = '__all__'
+        read_only_fields = ('is_likely_late',)
+
+    def validate_status(self, value):
+        return validate_status_change(self.instance, value)
+
+
+class ShipmentListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    order = OrderSummarySerializer(read_only=True)
+
+    class Meta:
+        model = Shipment
+        fields = ('id', 'shipment_number', 'order', 'warehouse', 'driver', 'vehicle', 'status',
+                  'departure_time', 'estimated_arrival', 'actual_arrival', 'is_likely_late')
+
+
+# Driver sync
+
+class SyncOrderSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Order
+        fields = ('id', 'order_number', 'status', 'shipping_address', 'shipping_city',
+                  'shipping_state', 'shipping_zip_code', 'shipping_country')
+
+
+class SyncShipmentSerializer(serializers.ModelSerializer):
+    order = SyncOrderSerializer(read_only=True)
+
+    class Meta:
+        model = Shipment
+        fields = ('id', 'shipment_number', 'order', 'status', 'departure_time',
+                  'estimated_arrival', 'actual_arrival', 'notes', 'updated_at')
+
+
+class ShardedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Primary key of a sharded row, looked up on whichever shard holds it."""
+
+    def to_internal_value(self, data):
+        if not sharding.enabled():
+            return super().to_internal_value(data)
+        queryset = self.get_queryset()
+        try:
+            alias = sharding.locate(queryset.model, data)
+            if alias is None:
+                self.fail('does_not_exist', pk_value=data)
+            return queryset.using(alias).get(pk=data)
+        except ObjectDoesNotExist:
+            self.fail('does_not_exist', pk_value=data)
+        except (TypeError, ValueError, DjangoValidationError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+
+class TrackingBatchItemSerializer(serializers.ModelSerializer):
+    client_id = serializers.UUIDField()
+    shipment = ShardedPrimaryKeyRelatedField(queryset=Shipment.objects.all())
+
+    class Meta:
+        model = ShipmentTracking
+        fields = ('client_id', 'shipment', 'location', 'status', 'notes')
+        # Uniqueness of client_id is handled as an idempotent replay, not an error.
+        validators = []
+
+
+class NearestWarehouseQuerySerializer(serializers.Serializer):
+    product = serializers.UUIDField(required=False)
+    quantity = serializers.IntegerField(min_value=1, default=1)
+    limit = serializers.IntegerField(min_value=1, default=5)
+
+
+class BulkShipmentStatusSerializer(serializers.Serializer):
+    id = serializers.UUIDField()
+    status = serializers.ChoiceField(choices=Shipment.STATUS_CHOICES)
+    departure_time = serializers.DateTimeField(required=False)
+    actual_arrival = serializers.DateTimeField(required=False)
+    location = serializers.CharField(max_length=100, allow_blank=True, default='')
+    notes = serializers.CharField(allow_blank=True, default='')
+
+
+class BulkOrderStatusSerializer(serializers.Serializer):
+    id = serializers.UUIDField()
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES)
+    tracking_number = serializers.CharField(max_length=50, required=False, allow_blank=True, allow_null=True)
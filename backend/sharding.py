@@ -0,0 +1,344 @@
+"""
+Region-based sharding of orders and their shipments.
+
+``SHARD_REGIONS`` maps a region name to a database alias and the shipping
+addresses it owns::
+
+    SHARD_REGIONS = {
+        'eu': {'database': 'shard_eu', 'countries': ['France', 'Germany']},
+        'us': {'database': 'shard_us', 'countries': ['USA'], 'states': {'Canada': ['BC']}},
+    }
+    SHARD_DEFAULT_REGION = 'eu'
+
+An ``Order`` lives in the region of its shipping address (a ``states`` rule
+wins over a ``countries`` rule); its items, shipments, shipment items and
+tracking updates live with it. Once stored, a row stays on its database
+until ``rebalance_shards`` moves it.
+
+Every database has the full schema. Reference models (customers, products,
+warehouses, vehicles, drivers, users) are written to ``default`` and
+mirrored to every shard by signals, so sharded rows keep real foreign keys
+and joins such as ``select_related('customer')`` work inside a shard.
+
+Unhinted queries on sharded models go to the default region. Use
+``Order.objects.region('us')`` or ``queryset.using(alias)`` to target a
+shard, and ``scatter``/``gather_*`` for cross-region totals. With no
+``SHARD_REGIONS`` the router steps aside and everything uses ``default``.
+"""
+import copy
+import heapq
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+
+from django.apps import apps
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, models, transaction
+
+SHARDED_MODELS = (
+    'backend.Order', 'backend.OrderItem', 'backend.Shipment', 'backend.ShipmentItem', 'backend.ShipmentTracking',
+)
+# Child model -> foreign key to the row it is stored with.
+SHARD_PARENTS = {
+    'backend.OrderItem': 'order',
+    'backend.Shipment': 'order',
+    'backend.ShipmentItem': 'shipment',
+    'backend.ShipmentTracking': 'shipment',
+}
+# Mirrored to every shard, parents before children.
+REFERENCE_MODELS = (
+    'backend.User', 'backend.Category', 'backend.Customer', 'backend.Product',
+    'backend.Warehouse', 'backend.Vehicle', 'backend.Driver',
+)
+
+# (model label, pk) -> (alias, monotonic expiry)
+_locations = {}
+_locations_lock = threading.Lock()
+
+
+class UnknownRegion(Exception):
+    pass
+
+
+def regions():
+    return getattr(settings, 'SHARD_REGIONS', None) or {}
+
+
+def enabled():
+    return bool(regions())
+
+
+def is_sharded(model):
+    return model._meta.label in SHARDED_MODELS
+
+
+def default_region():
+    return getattr(settings, 'SHARD_DEFAULT_REGION', None) or next(iter(regions()))
+
+
+def alias_for_region(region):
+    if not enabled():
+        return DEFAULT_DB_ALIAS
+    try:
+        return regions()[region]['database']
+    except KeyError:
+        raise UnknownRegion(f"Unknown region '{region}'. Choose from: {', '.join(regions())}.")
+
+
+def shard_aliases():
+    """Distinct databases holding sharded rows, in region order."""
+    if not enabled():
+        return [DEFAULT_DB_ALIAS]
+    return list(dict.fromkeys(config['database'] for config in regions().values()))
+
+
+def region_for_address(country, state=''):
+    country, state = (country or '').strip().lower(), (state or '').strip().lower()
+    by_country = None
+    for region, config in regions().items():
+        for rule_country, states in config.get('states', {}).items():
+            if rule_country.lower() == country and state in {s.lower() for s in states}:
+                return region
+        if by_country is None and country in {c.lower() for c in config.get('countries', ())}:
+            by_country = region
+    return by_country or default_region()
+
+
+def alias_for_order(order):
+    return alias_for_region(region_for_address(order.shipping_country, order.shipping_state))
+
+
+def locate(model, pk):
+    """
+    Database alias holding the ``model`` row ``pk``, or ``None``. Hits are
+    cached for ``SHARD_LOCATION_TTL`` seconds, which bounds how long another
+    process looks for a row in the shard it was moved out of.
+    """
+    key = (model._meta.label, str(pk))
+    now = time.monotonic()
+    alias, expires = _locations.get(key, (None, 0))
+    if alias is None or expires <= now:
+        aliases = shard_aliases()
+        alias = next((a for a in aliases if model._base_manager.using(a).filter(pk=pk).exists()), None)
+        if alias is not None:
+            with _locations_lock:
+                _locations[key] = (alias, now + getattr(settings, 'SHARD_LOCATION_TTL', 60))
+    return alias
+
+
+def forget_locations():
+    with _locations_lock:
+        _locations.clear()
+
+
+def alias_for_instance(instance):
+    """Database a sharded instance is (or will be) stored in."""
+    if not instance._state.adding and instance._state.db:
+        return instance._state.db
+    label = instance._meta.label
+    if label == 'backend.Order':
+        return alias_for_order(instance)
+    field = instance._meta.get_field(SHARD_PARENTS[label])
+    if field.is_cached(instance):
+        return alias_for_instance(getattr(instance, field.name))
+    parent_id = getattr(instance, field.attname)
+    if parent_id is not None:
+        return locate(field.related_model, parent_id) or alias_for_region(default_region())
+    return alias_for_region(default_region())
+
+
+class ShardRouter:
+    """Routes sharded models by region; everything else is left to ``default``."""
+
+    def route(self, model, hints):
+        if not enabled() or not is_sharded(model):
+            return None
+        instance = hints.get('instance')
+        if instance is not None and is_sharded(type(instance)):
+            return alias_for_instance(instance)
+        return alias_for_region(default_region())
+
+    def db_for_read(self, model, **hints):
+        return self.route(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self.route(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if not enabled():
+            return None
+        if is_sharded(type(obj1)) and is_sharded(type(obj2)):
+            dbs = {obj._state.db for obj in (obj1, obj2) if obj._state.db and not obj._state.adding}
+            return len(dbs) <= 1
+        return True
+
+
+class ShardedQuerySet(models.QuerySet):
+    def create(self, **kwargs):
+        # QuerySet.create saves to self.db, which without hints is the default
+        # region; let the router place the new row from the instance instead.
+        if self._db is not None or not enabled():
+            return super().create(**kwargs)
+        obj = self.model(**kwargs)
+        self._for_write = True
+        obj.save(force_insert=True)
+        return obj
+
+    def region(self, region):
+        return self.using(alias_for_region(region))
+
+    def for_address(self, country, state=''):
+        return self.region(region_for_address(country, state))
+
+
+@contextmanager
+def atomic(*aliases, savepoint=True):
+    """
+    ``transaction.atomic`` on ``default`` and ``aliases``, or every shard
+    when none are given (no two-phase commit).
+    """
+    with ExitStack() as stack:
+        for alias in dict.fromkeys([DEFAULT_DB_ALIAS, *(aliases or shard_aliases())]):
+            stack.enter_context(transaction.atomic(using=alias, savepoint=savepoint))
+        yield
+
+
+def scatter(queryset, fn=list, parallel=None):
+    """
+    Evaluate ``fn(queryset.using(alias))`` on every shard and return the
+    results by alias. Shards are queried concurrently unless
+    ``SHARD_PARALLEL_SCATTER`` (or ``parallel``) is false.
+    """
+    aliases = shard_aliases()
+    if parallel is None:
+        parallel = getattr(settings, 'SHARD_PARALLEL_SCATTER', True)
+    if not parallel or len(aliases) == 1:
+        return {alias: fn(queryset.using(alias)) for alias in aliases}
+
+    def run(alias):
+        try:
+            return fn(queryset.using(alias))
+        finally:
+            connections[alias].close()
+
+    with ThreadPoolExecutor(max_workers=len(aliases)) as pool:
+        return dict(zip(aliases, pool.map(run, aliases)))
+
+
+def gather_count(queryset, **kwargs):
+    return sum(scatter(queryset, lambda qs: qs.count(), **kwargs).values())
+
+
+def gather_grouped(queryset, group_by, **aggregates):
+    """
+    ``values(*group_by).annotate(**aggregates)`` across shards, summing each
+    aggregate per group; only additive aggregates (Count, Sum) make sense here.
+    Returns ``{group tuple: {name: total}}``.
+    """
+    def grouped(qs):
+        return list(qs.order_by().values(*group_by).annotate(**aggregates))
+
+    totals = {}
+    for rows in scatter(queryset, grouped).values():
+        for row in rows:
+            key = tuple(row[name] for name in group_by)
+            bucket = totals.setdefault(key, {name: 0 for name in aggregates})
+            for name in aggregates:
+                bucket[name] += row[name] or 0
+    return totals
+
+
+def gather_sorted(queryset, key, limit, reverse=False):
+    """
+    Top ``limit`` rows of an ordered ``queryset`` across shards: each shard
+    returns its own top ``limit`` and the streams are merged by ``key``.
+    """
+    per_shard = scatter(queryset, lambda qs: list(qs[:limit]))
+    merged = heapq.merge(*per_shard.values(), key=key, reverse=reverse)
+    return [row for _, row in zip(range(limit), merged)]
+
+
+def replicate(instance):
+    """Copy a reference row from ``default`` to every other shard database."""
+    for alias in shard_aliases():
+        if alias != DEFAULT_DB_ALIAS:
+            replica = copy.copy(instance)
+            replica.save_base(using=alias, raw=True)
+
+
+def replicate_delete(model, pk):
+    for alias in shard_aliases():
+        if alias != DEFAULT_DB_ALIAS:
+            model._base_manager.using(alias).filter(pk=pk).delete()
+
+
+def sync_reference_data(alias, batch_size=1000):
+    """Upsert every reference row from ``default`` into ``alias``; returns rows copied."""
+    copied = 0
+    for label in REFERENCE_MODELS:
+        model = apps.get_model(label)
+        fields = [f.name for f in model._meta.concrete_fields if not f.primary_key]
+        queryset = model._base_manager.using(DEFAULT_DB_ALIAS).order_by('pk')
+        batch = []
+        for obj in queryset.iterator(chunk_size=batch_size):
+            batch.append(obj)
+            if len(batch) == batch_size:
+                copied += upsert(model, alias, batch, fields)
+                batch = []
+        if batch:
+            copied += upsert(model, alias, batch, fields)
+    return copied
+
+
+def upsert(model, alias, objs, fields):
+    model._base_manager.using(alias).bulk_create(
+        objs, update_conflicts=True, unique_fields=[model._meta.pk.name], update_fields=fields,
+    )
+    return len(objs)
+
+
+def move_order(order_id, source, target):
+    """
+    Move an order with its items, shipments, shipment items and tracking
+    updates from ``source`` to ``target``, then delete it from the source
+    without signals (this is a move, not a deletion, so no sync tombstones
+    are written). Orders and shipments keep their UUIDs; rows with integer
+    keys are only unique per database and get new ones on the target.
+    """
+    Order = apps.get_model('backend', 'Order')
+    OrderItem = apps.get_model('backend', 'OrderItem')
+    Shipment = apps.get_model('backend', 'Shipment')
+    ShipmentItem = apps.get_model('backend', 'ShipmentItem')
+    ShipmentTracking = apps.get_model('backend', 'ShipmentTracking')
+
+    orders = Order._base_manager.using(source).filter(pk=order_id)
+    items = OrderItem._base_manager.using(source).filter(order_id=order_id).order_by('pk')
+    shipments = Shipment._base_manager.using(source).filter(order_id=order_id)
+    shipment_items = ShipmentItem._base_manager.using(source).filter(shipment__order_id=order_id)
+    tracking = ShipmentTracking._base_manager.using(source).filter(shipment__order_id=order_id)
+
+    with transaction.atomic(using=source), transaction.atomic(using=target):
+        Order._base_manager.using(target).bulk_create(list(orders))
+        Shipment._base_manager.using(target).bulk_create(list(shipments))
+
+        old_items = list(items)
+        old_pks = [item.pk for item in old_items]
+        for item in old_items:
+            item.pk = None
+        new_items = OrderItem._base_manager.using(target).bulk_create(old_items)
+        item_ids = dict(zip(old_pks, (item.pk for item in new_items)))
+
+        copies = list(shipment_items)
+        for row in copies:
+            row.pk, row.order_item_id = None, item_ids[row.order_item_id]
+        ShipmentItem._base_manager.using(target).bulk_create(copies)
+        copies = list(tracking)
+        for row in copies:
+            row.pk = None
+        ShipmentTracking._base_manager.using(target).bulk_create(copies)
+
+        for queryset in (tracking, shipment_items, shipments, items, orders):
+            # Fast path the delete collector uses itself; bypasses signals and cascades.
+            queryset._raw_delete(source)
+    forget_locations()
@@ -0,0 +1,243 @@
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import customer_metrics, geo, images, numbering, outbox, sharding, stock_history, tasks, workflow
+from .models import (
+    Category, Customer, Driver, GeoLocation, Inventory, Order, OrderItem, Product, Shipment, ShipmentItem,
+    StatusTransition, ShipmentTracking, SyncTombstone, User, Vehicle, Warehouse,
+)
+from .sourcing import stock_index
+
+
+@receiver(post_init, sender=Shipment)
+def remember_shipment_driver(sender, instance, **kwargs):
+    # Read from __dict__ so deferred loads (only()) don't trigger a query.
+    instance._loaded_driver_id = instance.__dict__.get('driver_id')
+
+
+@receiver(pre_save, sender=Shipment)
+def tombstone_reassigned_shipment(sender, instance, raw=False, **kwargs):
+    previous = getattr(instance, '_loaded_driver_id', None)
+    if raw or instance._state.adding or previous is None or previous == instance.driver_id:
+        return
+    # The previous driver's device has to drop the shipment.
+    SyncTombstone.objects.create(model='shipment', object_id=instance.pk, owner_id=previous)
+
+
+@receiver(post_delete, sender=Shipment)
+def tombstone_deleted_shipment(sender, instance, **kwargs):
+    SyncTombstone.objects.create(model='shipment', object_id=instance.pk, owner_id=instance.driver_id)
+
+
+@receiver(post_delete, sender=Order)
+def tombstone_deleted_order(sender, instance, **kwargs):
+    SyncTombstone.objects.create(model='order', object_id=instance.pk)
+
+
+@receiver(pre_save, sender=Order)
+def assign_order_number(sender, instance, raw=False, **kwargs):
+    if not raw and not instance.order_number:
+        instance.order_number = numbering.order_number()
+
+
+@receiver(pre_save, sender=Shipment)
+def assign_shipment_number(sender, instance, raw=False, **kwargs):
+    if not raw and not instance.shipment_number:
+        instance.shipment_number = numbering.shipment_number()
+
+
+@receiver(post_init, sender=Warehouse)
+def remember_warehouse_address(sender, instance, **kwargs):
+    instance._loaded_address = geo.address_key(instance)
+
+
+@receiver(post_init, sender=Order)
+def remember_order_address(sender, instance, **kwargs):
+    instance._loaded_address = geo.address_key(instance, 'shipping_')
+
+
+@receiver(pre_save, sender=Warehouse)
+def locate_warehouse(sender, instance, raw=False, **kwargs):
+    if not raw:
+        geo.locate(instance)
+
+
+@receiver(pre_save, sender=Order)
+def locate_order_destination(sender, instance, raw=False, **kwargs):
+    if not raw:
+        geo.locate(instance, prefix='shipping_')
+
+
+@receiver([post_save, post_delete], sender=GeoLocation)
+def clear_geocode_cache(sender, **kwargs):
+    geo.clear_cache()
+
+
+@receiver(post_save, sender=Warehouse)
+def update_sourcing_location(sender, instance, **kwargs):
+    transaction.on_commit(
+        lambda: stock_index.set_location(instance.pk, instance.latitude, instance.longitude))
+
+
+@receiver(post_save, sender=Inventory)
+def update_sourcing_stock(sender, instance, **kwargs):
+    transaction.on_commit(
+        lambda: stock_index.set(instance.product_id, instance.warehouse_id, instance.quantity))
+
+
+@receiver(post_delete, sender=Inventory)
+def remove_sourcing_stock(sender, instance, **kwargs):
+    transaction.on_commit(
+        lambda: stock_index.set(instance.product_id, instance.warehouse_id, 0))
+
+
+@receiver(post_delete, sender=Inventory)
+def record_stock_removal(sender, instance, **kwargs):
+    stock_history.record_removal(instance)
+
+
+@receiver(post_init, sender=Order)
+@receiver(post_init, sender=Shipment)
+def remember_status(sender, instance, **kwargs):
+    instance._loaded_status = instance.__dict__.get('status')
+
+
+@receiver(pre_save, sender=Order)
+@receiver(pre_save, sender=Shipment)
+def enforce_status_transition(sender, instance, raw=False, **kwargs):
+    instance._status_transition = None
+    if raw:
+        return
+    if instance._state.adding:
+        instance._status_transition = ''
+        return
+    previous = getattr(instance, '_loaded_status', None)
+    if previous is None or previous == instance.status:
+        return
+    workflow.check_transition(workflow.entity_for(instance), previous, instance.status)
+    instance.status_changed_at = timezone.now()
+    instance._status_transition = previous
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_save, sender=Shipment)
+def record_status_transition(sender, instance, update_fields=None, **kwargs):
+    previous = getattr(instance, '_status_transition', None)
+    if previous is None:
+        return
+    if update_fields is not None and 'status_changed_at' not in update_fields:
+        sender.objects.filter(pk=instance.pk).update(status_changed_at=instance.status_changed_at)
+    StatusTransition.objects.create(
+        entity=workflow.entity_for(instance), object_id=instance.pk,
+        from_status=previous, to_status=instance.status, changed_at=instance.status_changed_at,
+    )
+    outbox.publish_status_change(instance, previous)
+    instance._loaded_status = instance.status
+    instance._status_transition = None
+
+
+@receiver(post_init, sender=Order)
+def remember_order_metrics(sender, instance, **kwargs):
+    instance._loaded_metrics = (
+        instance.__dict__.get('customer_id'),
+        instance.__dict__.get('total_amount'),
+        customer_metrics.counts(instance.__dict__.get('status')),
+    )
+
+
+@receiver(post_save, sender=Order)
+def update_customer_metrics(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    current = (instance.customer_id, instance.total_amount, customer_metrics.counts(instance.status))
+    if created:
+        if current[2]:
+            customer_metrics.record_order(instance)
+    elif current != instance._loaded_metrics:
+        for customer_id in {instance._loaded_metrics[0], instance.customer_id} - {None}:
+            customer_metrics.refresh_customer(customer_id)
+    instance._loaded_metrics = current
+
+
+@receiver(post_delete, sender=Order)
+def remove_from_customer_metrics(sender, instance, **kwargs):
+    customer_metrics.refresh_customer(instance.customer_id)
+
+
+# Child rows embedded in their parent's representation. They have no
+# updated_at of their own, so changes to them move the parent's instead, for
+# conditional GETs and the driver delta sync.
+PARENT_FIELDS = {OrderItem: 'order', ShipmentItem: 'shipment', ShipmentTracking: 'shipment'}
+
+
+@receiver(post_save, sender=OrderItem)
+@receiver(post_save, sender=ShipmentItem)
+@receiver(post_save, sender=ShipmentTracking)
+@receiver(post_delete, sender=OrderItem)
+@receiver(post_delete, sender=ShipmentItem)
+@receiver(post_delete, sender=ShipmentTracking)
+def touch_parent(sender, instance, raw=False, using=DEFAULT_DB_ALIAS, **kwargs):
+    if raw:
+        return
+    field = sender._meta.get_field(PARENT_FIELDS[sender])
+    field.related_model.objects.using(using).filter(pk=getattr(instance, field.attname)).update(
+        updated_at=timezone.now())
+
+
+@receiver(post_save, sender=ShipmentTracking)
+def publish_tracking_update(sender, instance, created, raw=False, using=DEFAULT_DB_ALIAS, **kwargs):
+    if created and not raw:
+        outbox.publish_tracking([instance], using)
+
+
+@receiver(post_init, sender=Product)
+@receiver(post_init, sender=User)
+def remember_image(sender, instance, **kwargs):
+    image_field, _ = images.IMAGE_FIELDS[sender._meta.label]
+    value = instance.__dict__.get(image_field)
+    instance._loaded_image = getattr(value, 'name', value) or None
+
+
+@receiver(pre_save, sender=Product)
+@receiver(pre_save, sender=User)
+def reset_image_variants(sender, instance, raw=False, **kwargs):
+    image_field, variants_field = images.IMAGE_FIELDS[sender._meta.label]
+    instance._image_changed = False
+    if raw or image_field not in instance.__dict__:
+        return
+    image = getattr(instance, image_field)
+    loaded = None if instance._state.adding else instance._loaded_image
+    if (image.name or None) != loaded or not image._committed:
+        # Variants of the previous image must not be served for the new one.
+        setattr(instance, variants_field, {})
+        instance._image_changed = True
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=User)
+def schedule_image_variants(sender, instance, **kwargs):
+    if not instance._image_changed:
+        return
+    image_field, _ = images.IMAGE_FIELDS[sender._meta.label]
+    instance._image_changed = False
+    instance._loaded_image = getattr(instance, image_field).name or None
+    if instance._loaded_image:
+        label, pk = sender._meta.label, instance.pk
+        transaction.on_commit(lambda: tasks.process_image_variants.delay(label, pk))
+
+
+REFERENCE_SENDERS = (User, Category, Customer, Product, Warehouse, Vehicle, Driver)
+
+
+@receiver(post_save)
+def replicate_reference_row(sender, instance, raw=False, using=DEFAULT_DB_ALIAS, **kwargs):
+    if sender in REFERENCE_SENDERS and not raw and using == DEFAULT_DB_ALIAS and sharding.enabled():
+        sharding.replicate(instance)
+
+
+@receiver(post_delete)
+def replicate_reference_delete(sender, instance, using=DEFAULT_DB_ALIAS, **kwargs):
+    if sender in REFERENCE_SENDERS and using == DEFAULT_DB_ALIAS and sharding.enabled():
+        sharding.replicate_delete(sender, instance.pk)
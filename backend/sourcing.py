@@ -0,0 +1,225 @@
+"""
+Order sourcing: decide which warehouses fulfil an order.
+
+Planning runs against ``StockIndex``, a process-local map of
+``{product_id: {warehouse_id: quantity}}`` that is loaded per product on
+first use and kept current by the Inventory signals, so a plan needs no
+queries. Committing a plan decrements stock with conditional updates
+(``quantity >= n``); if another worker got there first the update matches no
+row, the affected product is reloaded and the order is planned again.
+
+The planner minimises the number of shipments first and distance second:
+a single warehouse holding everything wins outright (nearest first);
+otherwise warehouses are picked greedily by how many order lines they can
+complete, then how many units they cover, then distance.
+"""
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import sharding
+from .geo import haversine_km
+from .models import Inventory, Shipment, ShipmentItem, Warehouse
+
+FAR_AWAY_KM = 1e6
+
+
+class InsufficientStock(Exception):
+    def __init__(self, product_ids):
+        self.product_ids = sorted(str(pk) for pk in product_ids)
+        super().__init__(f"Not enough stock for products: {', '.join(self.product_ids)}")
+
+
+class StaleStock(Exception):
+    def __init__(self, product_id):
+        self.product_id = product_id
+        super().__init__(f'Stock index out of date for product {product_id}')
+
+
+class StockIndex:
+    """In-memory per-SKU stock levels and warehouse locations."""
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl if ttl is not None else getattr(settings, 'SOURCING_INDEX_TTL', 300)
+        self._lock = threading.RLock()
+        self._stock = {}
+        self._loaded_at = {}
+        self._locations = None
+
+    def stock(self, product_id):
+        """Return ``{warehouse_id: quantity}`` for warehouses holding the product."""
+        with self._lock:
+            loaded_at = self._loaded_at.get(product_id)
+            if loaded_at is None or time.monotonic() - loaded_at > self.ttl:
+                self.refresh(product_id)
+            return self._stock[product_id]
+
+    def refresh(self, product_id):
+        rows = Inventory.objects.filter(product_id=product_id, quantity__gt=0).values_list('warehouse_id', 'quantity')
+        with self._lock:
+            self._stock[product_id] = dict(rows)
+            self._loaded_at[product_id] = time.monotonic()
+
+    def set(self, product_id, warehouse_id, quantity):
+        """Record a known stock level; products not loaded yet are left to lazy loading."""
+        with self._lock:
+            levels = self._stock.get(product_id)
+            if levels is None:
+                return
+            if quantity > 0:
+                levels[warehouse_id] = quantity
+            else:
+                levels.pop(warehouse_id, None)
+
+    def adjust(self, product_id, warehouse_id, delta):
+        with self._lock:
+            levels = self._stock.get(product_id)
+            if levels is not None:
+                self.set(product_id, warehouse_id, levels.get(warehouse_id, 0) + delta)
+
+    def location(self, warehouse_id):
+        with self._lock:
+            if self._locations is None:
+                self._locations = {
+                    pk: (lat, lon)
+                    for pk, lat, lon in Warehouse.objects.values_list('pk', 'latitude', 'longitude')
+                }
+            return self._locations.get(warehouse_id, (None, None))
+
+    def set_location(self, warehouse_id, latitude, longitude):
+        with self._lock:
+            if self._locations is not None:
+                self._locations[warehouse_id] = (latitude, longitude)
+
+    def clear(self):
+        with self._lock:
+            self._stock.clear()
+            self._loaded_at.clear()
+            self._locations = None
+
+
+stock_index = StockIndex()
+
+
+def distance_to(index, warehouse_id, latitude, longitude):
+    w_lat, w_lon = index.location(warehouse_id)
+    if None in (latitude, longitude, w_lat, w_lon):
+        return FAR_AWAY_KM
+    return haversine_km(latitude, longitude, w_lat, w_lon)
+
+
+def plan_fulfillment(demand, latitude=None, longitude=None, index=stock_index):
+    """
+    Plan an order's fulfilment.
+
+    ``demand`` maps product id to quantity. Returns ``[(warehouse_id,
+    {product_id: quantity}), ...]`` with one entry per shipment, or raises
+    ``InsufficientStock`` when the network can't cover the order.
+    """
+    stock = {product_id: index.stock(product_id) for product_id in demand}
+    short = [pk for pk, qty in demand.items() if sum(stock[pk].values()) < qty]
+    if short:
+        raise InsufficientStock(short)
+
+    holdings = defaultdict(dict)
+    for product_id, levels in stock.items():
+        for warehouse_id, quantity in levels.items():
+            holdings[warehouse_id][product_id] = quantity
+    distance = {pk: distance_to(index, pk, latitude, longitude) for pk in holdings}
+
+    complete = [
+        pk for pk, held in holdings.items()
+        if all(held.get(product_id, 0) >= qty for product_id, qty in demand.items())
+    ]
+    if complete:
+        best = min(complete, key=lambda pk: distance[pk])
+        return [(best, dict(demand))]
+
+    remaining = dict(demand)
+    plan = []
+    while remaining:
+        def score(pk):
+            held = holdings[pk]
+            lines = sum(1 for product_id, qty in remaining.items() if held.get(product_id, 0) >= qty)
+            units = sum(min(held.get(product_id, 0), qty) for product_id, qty in remaining.items())
+            return lines, units, -distance[pk]
+
+        best = max(holdings, key=score)
+        allocation = {}
+        for product_id, qty in list(remaining.items()):
+            take = min(holdings[best].get(product_id, 0), qty)
+            if take:
+                allocation[product_id] = take
+                if take == qty:
+                    del remaining[product_id]
+                else:
+                    remaining[product_id] = qty - take
+        del holdings[best]
+        plan.append((best, allocation))
+    return plan
+
+
+def commit_plan(order, plan, items_by_product):
+    """Reserve stock and create one Shipment (with ShipmentItems) per warehouse."""
+    shipments = []
+    with sharding.atomic():
+        for warehouse_id, allocation in plan:
+            for product_id, quantity in allocation.items():
+                updated = Inventory.objects.filter(
+                    product_id=product_id, warehouse_id=warehouse_id, quantity__gte=quantity,
+                ).update(quantity=F('quantity') - quantity, updated_at=timezone.now())
+                if not updated:
+                    raise StaleStock(product_id)
+
+        for warehouse_id, allocation in plan:
+            shipment = Shipment.objects.create(order=order, warehouse_id=warehouse_id)
+            shipments.append(shipment)
+            rows = []
+            for product_id, quantity in allocation.items():
+                for item in items_by_product[product_id]:
+                    take = min(item.unallocated, quantity)
+                    if take:
+                        rows.append(ShipmentItem(shipment=shipment, order_item=item, quantity=take))
+                        item.unallocated -= take
+                        quantity -= take
+            ShipmentItem.objects.using(shipment._state.db).bulk_create(rows)
+    return shipments
+
+
+def source_order(order, index=stock_index, max_attempts=3):
+    """
+    Plan and commit fulfilment for ``order``, returning the created shipments.
+
+    Raises ``InsufficientStock`` when the order can't be covered.
+    """
+    items_by_product = defaultdict(list)
+    demand = defaultdict(int)
+    for item in order.items.all():
+        items_by_product[item.product_id].append(item)
+        demand[item.product_id] += item.quantity
+
+    for attempt in range(max_attempts):
+        for items in items_by_product.values():
+            for item in items:
+                item.unallocated = item.quantity
+        plan = plan_fulfillment(dict(demand), order.shipping_latitude, order.shipping_longitude, index)
+        try:
+            shipments = commit_plan(order, plan, items_by_product)
+        except StaleStock as exc:
+            index.refresh(exc.product_id)
+            continue
+
+        def apply_to_index(plan=plan):
+            for warehouse_id, allocation in plan:
+                for product_id, quantity in allocation.items():
+                    index.adjust(product_id, warehouse_id, -quantity)
+
+        transaction.on_commit(apply_to_index)
+        return shipments
+
+    raise InsufficientStock(demand.keys())
@@ -0,0 +1,256 @@
+"""
+Point-in-time stock levels.
+
+``InventorySnapshot`` holds end-of-day quantities per product and
+warehouse, delta-encoded: ``take_snapshot`` copies the ``Inventory`` table
+with one ``INSERT ... SELECT`` that skips every pair whose quantity equals
+its latest snapshot, so an unchanged SKU costs nothing per day. The level on
+a date is the quantity of the latest row on or before it, one seek on the
+``(product, warehouse, date)`` unique index. Deleting an ``Inventory`` row
+records a zero for the day, and as-of answers keep covering the pair.
+
+History older than ``STOCK_HISTORY_DAILY_DAYS`` is thinned by ``thin`` to
+the last change per pair and month, so it only keeps month-end levels. At
+100k SKUs in 50 warehouses with a few percent changing per day, that keeps
+the table to a few hundred thousand rows a day for the recent window plus
+one row per changed pair per month, instead of 5M rows a day.
+
+``turnover_report`` works from the snapshots alone: units consumed and
+received are the falls and rises between consecutive levels, and the
+average stock is time-weighted over the window, all with vectorised pandas
+operations.
+"""
+import calendar
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .lazy import lazy_import
+from .models import Inventory, InventorySnapshot
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+LOW_COVER_LIMIT = 20
+
+
+def get_setting(name, default):
+    return getattr(settings, name, default)
+
+
+def snapshot_sql(connection):
+    """
+    Insert today's quantity of every inventory row unless the pair's latest
+    earlier snapshot already has it. Parameters: the date, twice.
+    """
+    quote = connection.ops.quote_name
+    snapshot, inventory = InventorySnapshot._meta, Inventory._meta
+    product, warehouse, day, quantity = (
+        quote(snapshot.get_field(name).column) for name in ('product', 'warehouse', 'date', 'quantity'))
+    inv_product, inv_warehouse, inv_quantity = (
+        quote(inventory.get_field(name).column) for name in ('product', 'warehouse', 'quantity'))
+    table = quote(snapshot.db_table)
+    return f"""
+        INSERT INTO {table} ({product}, {warehouse}, {day}, {quantity})
+        SELECT inv.{inv_product}, inv.{inv_warehouse}, %s, inv.{inv_quantity}
+        FROM {quote(inventory.db_table)} inv
+        WHERE NOT EXISTS (
+            SELECT 1 FROM {table} snap
+            WHERE snap.{product} = inv.{inv_product} AND snap.{warehouse} = inv.{inv_warehouse}
+              AND snap.{quantity} = inv.{inv_quantity}
+              AND snap.{day} = (
+                  SELECT MAX(prev.{day}) FROM {table} prev
+                  WHERE prev.{product} = inv.{inv_product} AND prev.{warehouse} = inv.{inv_warehouse}
+                    AND prev.{day} < %s
+              )
+        )
+    """
+
+
+def take_snapshot(date=None):
+    """
+    Record the current quantities as the levels of ``date`` (default:
+    today). Re-running it for the same date replaces that day's rows.
+    Returns ``(rows written, seconds)``.
+    """
+    started = time.perf_counter()
+    date = date or timezone.localdate()
+    connection = connections[DEFAULT_DB_ALIAS]
+    value = InventorySnapshot._meta.get_field('date').get_db_prep_value(date, connection)
+    in_inventory = Inventory.objects.filter(product=OuterRef('product'), warehouse=OuterRef('warehouse'))
+    with transaction.atomic():
+        # Zeros recorded for deleted pairs stay; everything else is taken again.
+        InventorySnapshot.objects.filter(Exists(in_inventory), date=date).delete()
+        with connection.cursor() as cursor:
+            cursor.execute(snapshot_sql(connection), [value, value])
+            written = cursor.rowcount
+    return written, time.perf_counter() - started
+
+
+def record_removal(inventory, date=None):
+    """Record a zero level for a deleted inventory row that had stock in its history."""
+    date = date or timezone.localdate()
+    pair = {'product_id': inventory.product_id, 'warehouse_id': inventory.warehouse_id}
+    latest = InventorySnapshot.objects.filter(**pair).order_by('-date').values_list('quantity', flat=True).first()
+    if latest:
+        InventorySnapshot.objects.update_or_create(date=date, defaults={'quantity': 0}, **pair)
+
+
+def level(product_id, warehouse_id, date):
+    """Quantity of a product in a warehouse at the end of ``date``; ``None`` before its first snapshot."""
+    return (
+        InventorySnapshot.objects
+        .filter(product_id=product_id, warehouse_id=warehouse_id, date__lte=date)
+        .order_by('-date')
+        .values_list('quantity', flat=True)
+        .first()
+    )
+
+
+def levels_as_of(date, product_id=None, warehouse_id=None):
+    """
+    ``(product_id, warehouse_id, quantity)`` at the end of ``date`` for every
+    pair (optionally of one product and/or warehouse) with a snapshot by
+    then: each pair's latest row on or before ``date``. Pairs come from the
+    snapshots rather than ``Inventory``, so rows deleted since still answer.
+    """
+    snapshots = InventorySnapshot.objects.filter(date__lte=date)
+    if product_id:
+        snapshots = snapshots.filter(product_id=product_id)
+    if warehouse_id:
+        snapshots = snapshots.filter(warehouse_id=warehouse_id)
+    later = InventorySnapshot.objects.filter(
+        product=OuterRef('product'), warehouse=OuterRef('warehouse'), date__gt=OuterRef('date'), date__lte=date,
+    )
+    return (
+        snapshots.filter(~Exists(later))
+        .order_by('warehouse_id', 'product_id')
+        .values_list('product_id', 'warehouse_id', 'quantity')
+    )
+
+
+def months(first, last):
+    """``(first day, first day of the next month)`` for each month from ``first`` to ``last``."""
+    start = first.replace(day=1)
+    while start <= last:
+        end = start.replace(day=calendar.monthrange(start.year, start.month)[1]) + timedelta(days=1)
+        yield start, end
+        start = end
+
+
+def thin(before=None):
+    """
+    Drop the snapshots of months ending before ``before`` (default:
+    ``STOCK_HISTORY_DAILY_DAYS`` ago) that aren't the last of their pair in
+    that month. Returns the rows deleted.
+    """
+    if before is None:
+        days = get_setting('STOCK_HISTORY_DAILY_DAYS', 400)
+        if not days:
+            return 0
+        before = timezone.localdate() - timedelta(days=days)
+    oldest = InventorySnapshot.objects.order_by('date').values_list('date', flat=True).first()
+    if oldest is None:
+        return 0
+    deleted = 0
+    for start, end in months(oldest, before):
+        if end > before:
+            break
+        later = InventorySnapshot.objects.filter(
+            product=OuterRef('product'), warehouse=OuterRef('warehouse'), date__gt=OuterRef('date'), date__lt=end,
+        )
+        deleted += InventorySnapshot.objects.filter(Exists(later), date__gte=start, date__lt=end).delete()[0]
+    return deleted
+
+
+def turnover(levels, since, until):
+    """
+    Per-pair figures from ``levels``, a DataFrame of ``product_id``,
+    ``warehouse_id``, ``date`` and ``quantity`` holding each pair's level
+    before ``since`` (dated the day before) and its changes up to ``until``.
+    """
+    days = (until - since).days + 1
+    levels = levels.sort_values(['warehouse_id', 'product_id', 'date'], kind='stable').reset_index(drop=True)
+    dates = pd.to_datetime(levels['date'])
+    since, until = pd.Timestamp(since), pd.Timestamp(until)
+    pair = levels['warehouse_id'].astype(str) + '|' + levels['product_id'].astype(str)
+    first, last = pair.ne(pair.shift()), pair.ne(pair.shift(-1))
+
+    # A pair's first row is its opening level when dated before the window,
+    # otherwise stock that arrived from nothing.
+    previous = levels['quantity'].shift().where(~first, 0)
+    delta = (levels['quantity'] - previous).where(~(first & (dates < since)), 0)
+    start = dates.where(dates >= since, since)
+    end = dates.shift(-1).where(~last, until + pd.Timedelta(days=1))
+    held = (end - start).dt.days
+
+    frame = pd.DataFrame({
+        'warehouse_id': levels['warehouse_id'], 'product_id': levels['product_id'],
+        'consumed': (-delta).clip(lower=0), 'received': delta.clip(lower=0),
+        'unit_days': levels['quantity'] * held, 'closing': levels['quantity'],
+    })
+    return frame.groupby(['warehouse_id', 'product_id'], sort=False).agg(
+        consumed=('consumed', 'sum'), received=('received', 'sum'),
+        unit_days=('unit_days', 'sum'), closing=('closing', 'last'),
+    ).assign(average=lambda f: f['unit_days'] / days)
+
+
+def with_ratios(frame, days):
+    """Add turnover (consumed / average stock) and days of cover (closing / daily consumption)."""
+    average, consumed = frame['average'], frame['consumed']
+    return frame.assign(
+        turnover=(consumed / average).where(average > 0),
+        days_of_cover=(frame['closing'] / (consumed / days)).where(consumed > 0),
+    )
+
+
+def rounded(value, digits=2):
+    return None if value is None or np.isnan(value) else round(float(value), digits)
+
+
+def turnover_report(since, until, warehouse_id=None):
+    """
+    Units consumed and received, average and closing stock, turnover and
+    days of cover for the dates ``[since, until]``, per warehouse, plus the
+    products closest to running out.
+    """
+    opening = levels_as_of(since - timedelta(days=1), warehouse_id=warehouse_id)
+    changes = InventorySnapshot.objects.filter(date__gte=since, date__lte=until)
+    if warehouse_id:
+        changes = changes.filter(warehouse_id=warehouse_id)
+    rows = [(product, warehouse, since - timedelta(days=1), quantity) for product, warehouse, quantity in opening]
+    rows += list(changes.values_list('product_id', 'warehouse_id', 'date', 'quantity'))
+    days = (until - since).days + 1
+    report = {'since': since, 'until': until, 'days': days}
+    if not rows:
+        return {**report, 'consumed': 0, 'received': 0, 'turnover': None, 'by_warehouse': [], 'low_cover': []}
+
+    pairs = with_ratios(turnover(
+        pd.DataFrame(rows, columns=['product_id', 'warehouse_id', 'date', 'quantity']), since, until), days)
+    by_warehouse = with_ratios(pairs.groupby(level='warehouse_id').agg(
+        consumed=('consumed', 'sum'), received=('received', 'sum'),
+        average=('average', 'sum'), closing=('closing', 'sum'),
+    ), days)
+    low = pairs.dropna(subset=['days_of_cover']).sort_values('days_of_cover', kind='stable').head(LOW_COVER_LIMIT)
+    average = pairs['average'].sum()
+    return {
+        **report,
+        'consumed': int(pairs['consumed'].sum()),
+        'received': int(pairs['received'].sum()),
+        'turnover': rounded(pairs['consumed'].sum() / average) if average else None,
+        'by_warehouse': [
+            {'warehouse_id': warehouse, 'consumed': int(row.consumed), 'received': int(row.received),
+             'average_units': rounded(row.average), 'closing_units': int(row.closing),
+             'turnover': rounded(row.turnover), 'days_of_cover': rounded(row.days_of_cover, 1)}
+            for warehouse, row in by_warehouse.iterrows()
+        ],
+        'low_cover': [
+            {'product_id': product, 'warehouse_id': warehouse, 'closing_units': int(row.closing),
+             'consumed': int(row.consumed), 'days_of_cover': rounded(row.days_of_cover, 1)}
+            for (warehouse, product), row in low.iterrows()
+        ],
+    }
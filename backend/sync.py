@@ -0,0 +1,153 @@
+"""
+Delta sync for offline-first driver clients.
+
+A client keeps an opaque sync token and sends it back on the next pull; the
+server answers with the rows changed since then (by ``updated_at``) plus
+tombstones for rows the client should drop. Tokens are signed so clients
+can't forge a watermark, and they overlap by ``DRIVER_SYNC_OVERLAP`` seconds
+so rows committed by transactions that started before the previous pull are
+never missed. Clients must treat rows as upserts.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+from itertools import chain
+from operator import attrgetter
+
+from django.conf import settings
+from django.core import signing
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import outbox, sharding
+from .models import Shipment, ShipmentTracking, SyncTombstone
+
+TOKEN_SALT = 'backend.sync.driver'
+ACTIVE_STATUSES = ('pending', 'in_transit')
+
+
+class InvalidSyncToken(Exception):
+    pass
+
+
+def make_token(watermark):
+    return signing.dumps({'t': watermark.isoformat()}, salt=TOKEN_SALT, compress=True)
+
+
+def read_token(token):
+    try:
+        return datetime.fromisoformat(signing.loads(token, salt=TOKEN_SALT)['t'])
+    except (signing.BadSignature, KeyError, TypeError, ValueError):
+        raise InvalidSyncToken('Invalid sync token.')
+
+
+def driver_changes(driver, token=None, now=None):
+    """
+    Return the changes visible to ``driver`` since ``token``.
+
+    The result is a dict with ``shipments`` (a list ordered by ``updated_at``,
+    gathered from every shard), ``deleted`` (shipment ids to drop), ``token``
+    (the next token) and ``full_resync``. Without a
+    token, or with one older than the tombstone retention period, the client
+    gets its full active set and must replace its local copy.
+    """
+    now = now or timezone.now()
+    since = read_token(token) if token else None
+    retention = timedelta(days=getattr(settings, 'DRIVER_SYNC_TOMBSTONE_DAYS', 30))
+    full_resync = since is None or since < now - retention
+
+    shipments = Shipment.objects.filter(driver=driver).select_related('order')
+    if full_resync:
+        shipments = shipments.filter(status__in=ACTIVE_STATUSES)
+        deleted = []
+    else:
+        shipments = shipments.filter(Q(updated_at__gt=since) | Q(order__updated_at__gt=since))
+        deleted = list(
+            SyncTombstone.objects
+            .filter(model='shipment', deleted_at__gt=since)
+            .filter(Q(owner__isnull=True) | Q(owner=driver))
+            .values_list('object_id', flat=True)
+            .distinct()
+        )
+
+    overlap = timedelta(seconds=getattr(settings, 'DRIVER_SYNC_OVERLAP', 5))
+    return {
+        'shipments': sorted(chain.from_iterable(sharding.scatter(shipments).values()),
+                            key=attrgetter('updated_at')),
+        'deleted': deleted,
+        'token': make_token(now - overlap),
+        'full_resync': full_resync,
+    }
+
+
+def apply_tracking_batch(driver, items):
+    """
+    Store queued tracking updates from an offline client, in one transaction
+    per shard holding their shipments.
+
+    ``items`` are validated dicts with a client-generated ``client_id``.
+    Replays of an already stored ``client_id`` are reported as duplicates,
+    which makes retries after a dropped connection safe. Returns one outcome
+    dict per item, in order.
+    """
+    shipment_ids = {item['shipment'].pk for item in items}
+    allowed = {
+        pk: alias
+        for alias, pks in sharding.scatter(
+            Shipment.objects.filter(pk__in=shipment_ids, driver=driver).values_list('pk', flat=True)).items()
+        for pk in pks
+    }
+    client_ids = [item['client_id'] for item in items]
+    existing = set(chain.from_iterable(sharding.scatter(
+        ShipmentTracking.objects.filter(client_id__in=client_ids).values_list('client_id', flat=True)).values()))
+
+    outcomes, new_rows, seen = [], defaultdict(list), set()
+    for item in items:
+        client_id = item['client_id']
+        if item['shipment'].pk not in allowed:
+            outcomes.append({'client_id': client_id, 'result': 'rejected',
+                             'detail': 'Shipment is not assigned to this driver.'})
+        elif client_id in existing or client_id in seen:
+            outcomes.append({'client_id': client_id, 'result': 'duplicate'})
+        else:
+            seen.add(client_id)
+            new_rows[allowed[item['shipment'].pk]].append(ShipmentTracking(**item))
+            outcomes.append({'client_id': client_id, 'result': 'created'})
+
+    stored = set()
+    for alias, rows in new_rows.items():
+        # Tracking rows, the shipments' updated_at and the events share the shard's transaction.
+        with transaction.atomic(using=alias):
+            inserted = insert_tracking(rows, alias)
+            Shipment.objects.using(alias).filter(
+                pk__in={row.shipment_id for row in inserted}).update(updated_at=timezone.now())
+            outbox.publish_tracking(inserted, alias)
+        stored.update(row.client_id for row in inserted)
+    for outcome in outcomes:
+        if outcome['result'] == 'created' and outcome['client_id'] not in stored:
+            outcome['result'] = 'duplicate'
+    return outcomes
+
+
+def insert_tracking(rows, using):
+    """
+    Insert ``rows`` on ``using`` and return the ones actually stored. A
+    concurrent replay of the same batch can commit some client ids first;
+    then the rows go in one by one and those already taken are skipped, so
+    events are only published for rows this call inserted.
+    """
+    manager = ShipmentTracking.objects.using(using)
+    try:
+        with transaction.atomic(using=using):
+            return manager.bulk_create(rows)
+    except IntegrityError:
+        pass
+    inserted = []
+    for row in rows:
+        try:
+            with transaction.atomic(using=using):
+                manager.bulk_create([row])
+        except IntegrityError:
+            continue
+        inserted.append(row)
+    return inserted
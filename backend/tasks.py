@@ -0,0 +1,46 @@
+from celery import shared_task
+
+from . import analytics, customer_metrics, eta, images, outbox, stock_history
+
+
+@shared_task(ignore_result=True, autoretry_for=(OSError,), retry_backoff=True, max_retries=3)
+def process_image_variants(model_label, pk):
+    """Render the resized variants of an uploaded image."""
+    images.process(model_label, pk)
+
+
+@shared_task(ignore_result=True)
+def train_eta_model():
+    """Relearn trip duration quantiles from delivery history."""
+    eta.train()
+
+
+@shared_task(ignore_result=True, expires=60)
+def update_etas():
+    """Re-estimate arrival times of all in-transit shipments."""
+    eta.score()
+
+
+@shared_task(ignore_result=True)
+def rebuild_customer_metrics():
+    """Recompute customer metrics and RFM scores from all orders."""
+    customer_metrics.rebuild()
+
+
+@shared_task(ignore_result=True, expires=300)
+def export_analytics():
+    """Copy changed rows into the columnar analytics store."""
+    analytics.export()
+
+
+@shared_task(ignore_result=True, expires=10)
+def dispatch_outbox():
+    """Deliver pending integration events to their webhooks."""
+    outbox.dispatch()
+
+
+@shared_task(ignore_result=True)
+def snapshot_inventory():
+    """Record today's stock levels and thin out old history."""
+    stock_history.take_snapshot()
+    stock_history.thin()
@@ -0,0 +1 @@
+# Initialize test_api package
@@ -0,0 +1,143 @@
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from django.core.management import call_command
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from backend import analytics
+from backend.models import (
+    User, Customer, Order, OrderItem, Product, Warehouse, Inventory, Shipment, AnalyticsWatermark,
+)
+from decimal import Decimal
+from io import StringIO
+
+ANALYTICS_DIR = tempfile.mkdtemp()
+
+@override_settings(ROOT_URLCONF='backend.urls', ORDER_AUTO_SOURCING=False, ANALYTICS_DIR=ANALYTICS_DIR)
+class AnalyticsStoreTest(APITestCase):
+    def setUp(self):
+        shutil.rmtree(ANALYTICS_DIR, ignore_errors=True)
+        self.user = User.objects.create_user(username='staffuser', password='securepassword123')
+        self.client.force_authenticate(self.user)
+        self.customer = Customer.objects.create(
+            name='Test Customer', email='customer@example.com', phone='1234567890',
+            address='123 Test Avenue', city='Test City', state='Test State', zip_code='12345', country='Test Country'
+        )
+        self.widget = Product.objects.create(name='Widget', sku='WID-001', weight=Decimal('1'), price=Decimal('10'))
+        self.gadget = Product.objects.create(name='Gadget', sku='GAD-001', weight=Decimal('1'), price=Decimal('25'))
+        self.warehouse = Warehouse.objects.create(
+            name='Main Warehouse', address='1 Dock Road', city='Test City', state='-', zip_code='-', country='-',
+            contact_person='John Doe', phone='1234567890', email='warehouse@example.com'
+        )
+
+    def tearDown(self):
+        shutil.rmtree(ANALYTICS_DIR, ignore_errors=True)
+
+    def create_order(self, number, lines):
+        order = Order.objects.create(
+            order_number=number, customer=self.customer, shipping_address='123 Shipping St',
+            shipping_city='Shipping City', shipping_state='Shipping State', shipping_zip_code='12345',
+            shipping_country='Shipping Country',
+            total_amount=sum(product.price * quantity for product, quantity in lines)
+        )
+        for product, quantity in lines:
+            OrderItem.objects.create(order=order, product=product, quantity=quantity, unit_price=product.price)
+        return order
+
+    def export(self):
+        call_command('export_analytics', stdout=StringIO())
+
+    def test_sales_report(self):
+        """Test that the sales report aggregates exported orders and items"""
+        self.create_order('ORD-1', [(self.widget, 2)])
+        self.create_order('ORD-2', [(self.widget, 1), (self.gadget, 2)])
+        self.export()
+        self.assertTrue(os.path.exists(os.path.join(
+            ANALYTICS_DIR, 'orders', f"month={timezone.now():%Y-%m}", 'part.parquet')))
+
+        response = self.client.get('/reports/sales/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['orders'], 2)
+        self.assertEqual(response.data['revenue'], '80.00')
+        self.assertEqual(response.data['average_order_value'], '40.00')
+        self.assertEqual(response.data['by_period'][0]['orders'], 2)
+        self.assertEqual(response.data['top_products'][0],
+                         {'product_id': str(self.gadget.pk), 'quantity': 2, 'revenue': '50.00'})
+        self.assertIsNotNone(response.data['exported_through'])
+
+    def test_reports_do_not_scan_the_database(self):
+        """Test that reports only read the watermark from the database"""
+        self.create_order('ORD-1', [(self.widget, 2)])
+        self.export()
+        now = timezone.now()
+        with self.assertNumQueries(1):
+            report = analytics.sales_report(now - timedelta(days=1), now + timedelta(days=1))
+        self.assertEqual(report['orders'], 1)
+
+    def test_incremental_export(self):
+        """Test that later exports replace changed rows and drop deleted ones"""
+        first = self.create_order('ORD-1', [(self.widget, 2)])
+        second = self.create_order('ORD-2', [(self.gadget, 1)])
+        self.export()
+        first.status = 'cancelled'
+        first.save()
+        second.delete()
+        self.create_order('ORD-3', [(self.gadget, 4)])
+        self.export()
+
+        self.assertEqual(AnalyticsWatermark.objects.get(table='orders').rows, 2)
+        orders = analytics.read('orders')
+        self.assertEqual(sorted(orders['order_number']), ['ORD-1', 'ORD-3'])
+        self.assertEqual(orders.set_index('order_number').loc['ORD-1', 'status'], 'cancelled')
+        self.assertEqual(len(analytics.read('order_items')), 2)
+        report = self.client.get('/reports/sales/').data
+        self.assertEqual((report['orders'], report['revenue']), (1, '100.00'))
+
+    def test_inventory_report(self):
+        """Test stock totals, changes from sourcing-style updates and deleted rows"""
+        widget = Inventory.objects.create(warehouse=self.warehouse, product=self.widget, quantity=10)
+        gadget = Inventory.objects.create(warehouse=self.warehouse, product=self.gadget, quantity=0)
+        self.export()
+        self.assertEqual(self.client.get('/reports/inventory/').data['units'], 10)
+
+        widget.quantity = 4
+        widget.save()
+        gadget.delete()
+        self.export()
+        report = self.client.get('/reports/inventory/', {'warehouse': str(self.warehouse.pk)}).data
+        self.assertEqual((report['products'], report['units'], report['out_of_stock']), (1, 4, 0))
+        self.assertEqual(report['by_warehouse'][0]['warehouse_id'], str(self.warehouse.pk))
+
+    def test_shipments_report(self):
+        """Test status counts and on-time rate of exported shipments"""
+        order = self.create_order('ORD-1', [(self.widget, 1)])
+        now = timezone.now()
+        Shipment.objects.create(
+            shipment_number='SHP-1', order=order, warehouse=self.warehouse, status='delivered',
+            departure_time=now - timedelta(hours=5), estimated_arrival=now - timedelta(hours=1),
+            actual_arrival=now - timedelta(hours=2)
+        )
+        Shipment.objects.create(
+            shipment_number='SHP-2', order=order, warehouse=self.warehouse, status='delivered',
+            departure_time=now - timedelta(hours=5), estimated_arrival=now - timedelta(hours=3),
+            actual_arrival=now - timedelta(hours=1)
+        )
+        Shipment.objects.create(shipment_number='SHP-3', order=order, status='in_transit', is_likely_late=True)
+        self.export()
+
+        response = self.client.get('/reports/shipments/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['by_status'], {'delivered': 2, 'in_transit': 1})
+        self.assertEqual(response.data['on_time_rate'], 0.5)
+        self.assertEqual(response.data['average_transit_hours'], 3.5)
+        self.assertEqual(response.data['likely_late_in_transit'], 1)
+
+    def test_empty_store(self):
+        """Test that reports work before the first export"""
+        response = self.client.get('/reports/sales/', {'period': 'month'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['orders'], 0)
+        self.assertIsNone(response.data['exported_through'])
+        self.assertEqual(self.client.get('/reports/sales/', {'period': 'year'}).status_code, 400)
@@ -0,0 +1,152 @@
+import uuid
+from django.test import override_settings
+from rest_framework.test import APITestCase
+from backend.models import (
+    User, Customer, CustomerMetrics, Order, OutboxEvent, Shipment, ShipmentTracking, StatusTransition,
+)
+from decimal import Decimal
+
+@override_settings(ROOT_URLCONF='backend.urls', ORDER_AUTO_SOURCING=False,
+                   OUTBOX_DESTINATIONS={'erp': {'url': 'http://erp.invalid/', 'events': ['*']}})
+class BulkStatusTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='staffuser', password='securepassword123')
+        self.client.force_authenticate(self.user)
+        self.customer = Customer.objects.create(
+            name='Test Customer',
+            email='customer@example.com',
+            phone='1234567890',
+            address='123 Test Avenue',
+            city='Test City',
+            state='Test State',
+            zip_code='12345',
+            country='Test Country'
+        )
+
+    def create_order(self, status='pending'):
+        order = Order.objects.create(
+            customer=self.customer,
+            shipping_address='123 Shipping St',
+            shipping_city='Shipping City',
+            shipping_state='Shipping State',
+            shipping_zip_code='12345',
+            shipping_country='Shipping Country',
+            total_amount=Decimal('29.99')
+        )
+        for step in ('processing', 'shipped', 'delivered'):
+            if order.status == status:
+                break
+            order.status = step
+            order.save()
+        return order
+
+    def create_shipment(self, order, status='pending'):
+        shipment = Shipment.objects.create(order=order)
+        if status != 'pending':
+            shipment.status = status
+            shipment.save()
+        return shipment
+
+    def test_shipments_delivered_in_bulk(self):
+        """Test that shipments, tracking, history and orders are updated together"""
+        orders = [self.create_order('shipped') for _ in range(3)]
+        shipments = [self.create_shipment(order, 'in_transit') for order in orders]
+        OutboxEvent.objects.all().delete()
+
+        with self.assertNumQueries(13):
+            response = self.client.post('/shipments/bulk-status/', [
+                {'id': str(shipment.pk), 'status': 'delivered', 'location': 'Depot'} for shipment in shipments
+            ], format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual({r['result'] for r in response.data['results']}, {'updated'})
+        self.assertEqual({o['status'] for o in response.data['orders']}, {'delivered'})
+
+        for shipment in Shipment.objects.filter(pk__in=[s.pk for s in shipments]):
+            self.assertEqual(shipment.status, 'delivered')
+            self.assertIsNotNone(shipment.actual_arrival)
+            self.assertEqual(shipment.status_changed_at, shipment.actual_arrival)
+            self.assertGreater(shipment.updated_at, shipments[0].updated_at)
+        self.assertEqual(set(Order.objects.values_list('status', flat=True)), {'delivered'})
+        self.assertEqual(ShipmentTracking.objects.filter(status='delivered', location='Depot').count(), 3)
+        self.assertEqual(StatusTransition.objects.filter(to_status='delivered').count(), 6)
+        self.assertEqual(
+            sorted(OutboxEvent.objects.values_list('event_type', flat=True)),
+            ['order.status_changed'] * 3 + ['shipment.status_changed'] * 3 + ['shipment.tracking_added'] * 3,
+        )
+
+    def test_per_item_outcomes(self):
+        """Test that bad items are reported without blocking the rest"""
+        order = self.create_order('processing')
+        moving = self.create_shipment(order)
+        done = self.create_shipment(order, 'in_transit')
+        done.status = 'delivered'
+        done.save()
+        arrived = self.create_shipment(order, 'in_transit')
+        arrived.status = 'delivered'
+        arrived.save()
+        missing = uuid.uuid4()
+
+        response = self.client.post('/shipments/bulk-status/', [
+            {'id': str(moving.pk), 'status': 'in_transit'},
+            {'id': str(moving.pk), 'status': 'failed'},
+            {'id': str(done.pk), 'status': 'pending'},
+            {'id': str(arrived.pk), 'status': 'delivered'},
+            {'id': str(missing), 'status': 'delivered'},
+        ], format='json')
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results']
+        self.assertEqual([r['result'] for r in results], ['updated', 'rejected', 'rejected', 'unchanged', 'not_found'])
+        self.assertIn("from 'delivered' to 'pending'", results[2]['detail'])
+        moving.refresh_from_db()
+        self.assertEqual(moving.status, 'in_transit')
+        self.assertIsNotNone(moving.departure_time)
+        # Every shipment has left, but not all are delivered, so the order stops at shipped.
+        self.assertEqual(response.data['orders'], [{'id': str(order.pk), 'from_status': 'processing', 'status': 'shipped'}])
+
+    def test_partial_delivery_keeps_order_shipped(self):
+        """Test that an order is only delivered once all of its shipments are"""
+        order = self.create_order('shipped')
+        first, second = self.create_shipment(order, 'in_transit'), self.create_shipment(order, 'in_transit')
+        response = self.client.post('/shipments/bulk-status/', [{'id': str(first.pk), 'status': 'delivered'}],
+                                    format='json')
+        self.assertEqual(response.data['orders'], [])
+        response = self.client.post('/shipments/bulk-status/', [{'id': str(second.pk), 'status': 'delivered'}],
+                                    format='json')
+        self.assertEqual(len(response.data['orders']), 1)
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'delivered')
+
+    def test_explicit_timestamps(self):
+        """Test that supplied departure and arrival times are stored"""
+        shipment = self.create_shipment(self.create_order('processing'))
+        self.client.post('/shipments/bulk-status/', [
+            {'id': str(shipment.pk), 'status': 'in_transit', 'departure_time': '2026-01-05T08:00:00Z'},
+        ], format='json')
+        shipment.refresh_from_db()
+        self.assertEqual(shipment.departure_time.isoformat(), '2026-01-05T08:00:00+00:00')
+
+    def test_validation(self):
+        """Test that malformed or oversized batches are refused"""
+        self.assertEqual(self.client.post('/shipments/bulk-status/', [], format='json').status_code, 400)
+        self.assertEqual(self.client.post('/shipments/bulk-status/', [{'id': 'x', 'status': 'lost'}],
+                                          format='json').status_code, 400)
+        with self.settings(BULK_STATUS_MAX_ITEMS=1):
+            response = self.client.post('/orders/bulk-status/', [
+                {'id': str(uuid.uuid4()), 'status': 'processing'} for _ in range(2)
+            ], format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_orders_cancelled_in_bulk(self):
+        """Test that order changes write history and refresh customer metrics"""
+        orders = [self.create_order() for _ in range(2)]
+        self.assertEqual(CustomerMetrics.objects.get(customer=self.customer).order_count, 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/orders/bulk-status/', [
+                {'id': str(orders[0].pk), 'status': 'cancelled'},
+                {'id': str(orders[1].pk), 'status': 'processing', 'tracking_number': 'TRK-1'},
+            ], format='json')
+        self.assertEqual([r['result'] for r in response.data['results']], ['updated', 'updated'])
+        self.assertEqual(Order.objects.get(pk=orders[0].pk).status, 'cancelled')
+        self.assertEqual(Order.objects.get(pk=orders[1].pk).tracking_number, 'TRK-1')
+        self.assertEqual(StatusTransition.objects.filter(entity='order', to_status='cancelled').count(), 1)
+        self.assertEqual(CustomerMetrics.objects.get(customer=self.customer).order_count, 1)
@@ -0,0 +1,121 @@
+from datetime import timedelta
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from backend.models import User, Category, Customer, Order, Product, Shipment
+from decimal import Decimal
+
+@override_settings(ROOT_URLCONF='backend.urls')
+class ConditionalGetTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='staffuser', password='securepassword123')
+        self.client.force_authenticate(self.user)
+
+        self.customer = Customer.objects.create(
+            name='Test Customer',
+            email='customer@example.com',
+            phone='1234567890',
+            address='123 Test Avenue',
+            city='Test City',
+            state='Test State',
+            zip_code='12345',
+            country='Test Country'
+        )
+
+        self.order = Order.objects.create(
+            order_number='ORD-TEST-001',
+            customer=self.customer,
+            status='pending',
+            shipping_address='123 Shipping St',
+            shipping_city='Shipping City',
+            shipping_state='Shipping State',
+            shipping_zip_code='12345',
+            shipping_country='Shipping Country',
+            total_amount=Decimal('29.99')
+        )
+
+    def test_list_returns_validators(self):
+        """Test that list responses carry ETag and Last-Modified"""
+        response = self.client.get('/orders/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.has_header('ETag'))
+        self.assertTrue(response.has_header('Last-Modified'))
+
+    def test_list_not_modified(self):
+        """Test that a matching If-None-Match gets a 304 without loading rows"""
+        etag = self.client.get('/orders/')['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/orders/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(len([q for q in queries if 'backend_order' in q['sql']]), 1)
+
+    def test_list_etag_changes_on_update_and_delete(self):
+        """Test that updates, deletions and related changes invalidate the list ETag"""
+        etag = self.client.get('/orders/')['ETag']
+
+        self.order.notes = 'Changed'
+        self.order.save()
+        self.assertEqual(self.client.get('/orders/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        etag = self.client.get('/orders/')['ETag']
+        self.customer.name = 'Renamed Customer'
+        self.customer.save()
+        self.assertEqual(self.client.get('/orders/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        etag = self.client.get('/orders/')['ETag']
+        self.order.delete()
+        self.assertEqual(self.client.get('/orders/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_etag_varies_with_query_string(self):
+        """Test that different query strings get different ETags"""
+        self.assertNotEqual(
+            self.client.get('/orders/')['ETag'],
+            self.client.get('/orders/', {'fields': 'status'})['ETag']
+        )
+
+    def test_detail_not_modified(self):
+        """Test conditional GET on a detail view"""
+        url = f'/orders/{self.order.id}/'
+        response = self.client.get(url)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        since = response['Last-Modified']
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=since).status_code, 304)
+
+        Order.objects.filter(pk=self.order.pk).update(updated_at=timezone.now() + timedelta(minutes=1))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_detail_missing_and_invalid(self):
+        """Test that unknown or malformed ids still return 404"""
+        self.assertEqual(self.client.get('/orders/00000000-0000-0000-0000-000000000000/').status_code, 404)
+        self.assertEqual(self.client.get('/orders/not-a-uuid/').status_code, 404)
+
+    def test_detail_etag_changes_with_tracking(self):
+        """Test that adding a tracking update invalidates the shipment ETag"""
+        shipment = Shipment.objects.create(shipment_number='SHP-TEST-001', order=self.order)
+        url = f'/shipments/{shipment.id}/?expand=tracking_updates'
+        etag = self.client.get(url)['ETag']
+        response = self.client.post(f'/shipments/{shipment.id}/tracking/', {'location': 'Depot', 'status': 'Arrived'})
+        self.assertEqual(response.status_code, 201)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['tracking_updates']), 1)
+
+    def test_product_etag_changes_with_category(self):
+        """Test that renaming a category invalidates the products embedding it"""
+        category = Category.objects.create(name='Tools')
+        product = Product.objects.create(name='Hammer', sku='HAM-001', category=category,
+                                         weight=Decimal('1'), price=Decimal('10'))
+        list_etag = self.client.get('/products/')['ETag']
+        detail_etag = self.client.get(f'/products/{product.pk}/', {'expand': 'category'})['ETag']
+
+        category.name = 'Hand Tools'
+        category.save()
+        self.assertEqual(self.client.get('/products/', HTTP_IF_NONE_MATCH=list_etag).status_code, 200)
+        response = self.client.get(f'/products/{product.pk}/', {'expand': 'category'},
+                                   HTTP_IF_NONE_MATCH=detail_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['category']['name'], 'Hand Tools')
@@ -0,0 +1,126 @@
+from datetime import timedelta
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from backend.customer_metrics import rebuild
+from backend.models import User, Customer, CustomerMetrics, Order
+from decimal import Decimal
+from io import StringIO
+
+class CustomerMetricsMixin:
+    def create_customer(self, name):
+        return Customer.objects.create(
+            name=name, email=f'{name.lower()}@example.com', phone='1234567890',
+            address='123 Test Avenue', city='Test City', state='Test State', zip_code='12345', country='Test Country'
+        )
+
+    def create_order(self, customer, number, amount):
+        return Order.objects.create(
+            order_number=number, customer=customer, shipping_address='123 Shipping St',
+            shipping_city='Shipping City', shipping_state='Shipping State', shipping_zip_code='12345',
+            shipping_country='Shipping Country', total_amount=Decimal(amount)
+        )
+
+@override_settings(ORDER_AUTO_SOURCING=False)
+class CustomerMetricsTest(CustomerMetricsMixin, TestCase):
+    def setUp(self):
+        self.alice = self.create_customer('Alice')
+        self.bob = self.create_customer('Bob')
+
+    def test_orders_update_metrics(self):
+        """Test that placing orders maintains count, values and dates"""
+        first = self.create_order(self.alice, 'ORD-1', '10.00')
+        second = self.create_order(self.alice, 'ORD-2', '25.50')
+        metrics = CustomerMetrics.objects.get(customer=self.alice)
+        self.assertEqual(metrics.order_count, 2)
+        self.assertEqual(metrics.lifetime_value, Decimal('35.50'))
+        self.assertEqual(metrics.monetary_value, Decimal('35.50'))
+        self.assertEqual(metrics.average_order_value, Decimal('17.75'))
+        self.assertEqual(metrics.first_order_at, first.order_date)
+        self.assertEqual(metrics.last_order_at, second.order_date)
+        self.assertFalse(CustomerMetrics.objects.filter(customer=self.bob).exists())
+
+    def test_cancellation_total_change_and_delete(self):
+        """Test that cancelled orders, edited totals and deletions are taken back out"""
+        first = self.create_order(self.alice, 'ORD-1', '10.00')
+        second = self.create_order(self.alice, 'ORD-2', '30.00')
+        first.status = 'cancelled'
+        first.save()
+        metrics = CustomerMetrics.objects.get(customer=self.alice)
+        self.assertEqual((metrics.order_count, metrics.lifetime_value), (1, Decimal('30.00')))
+
+        second.total_amount = Decimal('40.00')
+        second.save()
+        self.assertEqual(CustomerMetrics.objects.get(customer=self.alice).lifetime_value, Decimal('40.00'))
+
+        second.delete()
+        metrics = CustomerMetrics.objects.get(customer=self.alice)
+        self.assertEqual((metrics.order_count, metrics.lifetime_value, metrics.last_order_at), (0, Decimal('0'), None))
+
+    def test_status_change_within_counted_statuses_is_free(self):
+        """Test that moving an order along the workflow doesn't recompute metrics"""
+        order = self.create_order(self.alice, 'ORD-1', '10.00')
+        order.status = 'processing'
+        with self.assertNumQueries(2):  # UPDATE order, INSERT status history
+            order.save()
+
+    def test_deleting_customer(self):
+        """Test that a customer with orders can be deleted"""
+        self.create_order(self.alice, 'ORD-1', '10.00')
+        self.alice.delete()
+        self.assertFalse(CustomerMetrics.objects.exists())
+
+    def test_rebuild_matches_incremental_and_scores(self):
+        """Test that a full rebuild reproduces the incremental figures and ranks customers"""
+        self.create_order(self.alice, 'ORD-1', '10.00')
+        self.create_order(self.alice, 'ORD-2', '25.50')
+        old = self.create_order(self.bob, 'ORD-3', '5.00')
+        Order.objects.filter(pk=old.pk).update(order_date=timezone.now() - timedelta(days=400))
+        carol = self.create_customer('Carol')
+        incremental = CustomerMetrics.objects.get(customer=self.alice)
+
+        out = StringIO()
+        call_command('rebuild_customer_metrics', stdout=out)
+        self.assertIn('Rebuilt metrics for 3 customers', out.getvalue())
+
+        alice = CustomerMetrics.objects.get(customer=self.alice)
+        for name in ('order_count', 'lifetime_value', 'monetary_value', 'average_order_value', 'first_order_at', 'last_order_at'):
+            self.assertEqual(getattr(alice, name), getattr(incremental, name), name)
+        bob = CustomerMetrics.objects.get(customer=self.bob)
+        self.assertEqual((bob.lifetime_value, bob.monetary_value), (Decimal('5.00'), Decimal('0')))
+        self.assertGreater(alice.recency_score, bob.recency_score)
+        self.assertGreater(alice.frequency_score, bob.frequency_score)
+        self.assertGreater(alice.monetary_score, bob.monetary_score)
+        carol = CustomerMetrics.objects.get(customer=carol)
+        self.assertEqual((carol.order_count, carol.recency_score), (0, 0))
+
+@override_settings(ROOT_URLCONF='backend.urls', ORDER_AUTO_SOURCING=False)
+class CustomerMetricsApiTest(CustomerMetricsMixin, APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='staffuser', password='securepassword123')
+        self.client.force_authenticate(self.user)
+        self.alice = self.create_customer('Alice')
+        self.bob = self.create_customer('Bob')
+        self.create_customer('Carol')
+        self.create_order(self.alice, 'ORD-1', '10.00')
+        self.create_order(self.bob, 'ORD-2', '50.00')
+        self.create_order(self.bob, 'ORD-3', '30.00')
+        rebuild()
+
+    def test_sort_and_filter_on_metrics(self):
+        """Test that the customer list sorts and filters on metrics"""
+        response = self.client.get('/customers/', {'ordering': '-metrics__lifetime_value'})
+        self.assertEqual([c['name'] for c in response.data['results']], ['Bob', 'Alice', 'Carol'])
+        response = self.client.get('/customers/', {'metrics__order_count__gte': 2})
+        self.assertEqual([c['name'] for c in response.data['results']], ['Bob'])
+        self.assertEqual(response.data['results'][0]['metrics']['lifetime_value'], '80.00')
+        self.assertEqual(response.data['results'][0]['metrics']['recency_days'], 0)
+
+    def test_detail_includes_metrics(self):
+        """Test that the customer detail embeds its metrics"""
+        response = self.client.get(f'/customers/{self.alice.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['metrics']['order_count'], 1)
+        response = self.client.get('/customers/', {'name': 'x', 'ordering': 'name'})
+        self.assertIsNone(response.data['results'][2]['metrics']['recency_days'])
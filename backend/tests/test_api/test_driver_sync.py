@@ -0,0 +1,146 @@
+import uuid
+from datetime import timedelta
+from unittest import mock
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from backend import sync
+from backend.models import User, Driver, Customer, Order, OutboxEvent, Shipment, ShipmentTracking
+from backend.sync import driver_changes, make_token
+from decimal import Decimal
+
+@override_settings(ROOT_URLCONF='backend.urls', DRIVER_SYNC_OVERLAP=0)
+class DriverSyncTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='driveruser', password='securepassword123', user_type='driver')
+        self.driver = Driver.objects.create(
+            user=self.user,
+            license_number='DL12345678',
+            license_expiry_date=timezone.now().date() + timedelta(days=365)
+        )
+        other_user = User.objects.create_user(username='otherdriver', password='securepassword123', user_type='driver')
+        self.other_driver = Driver.objects.create(
+            user=other_user,
+            license_number='DL87654321',
+            license_expiry_date=timezone.now().date() + timedelta(days=365)
+        )
+        self.client.force_authenticate(self.user)
+
+        self.customer = Customer.objects.create(
+            name='Test Customer',
+            email='customer@example.com',
+            phone='1234567890',
+            address='123 Test Avenue',
+            city='Test City',
+            state='Test State',
+            zip_code='12345',
+            country='Test Country'
+        )
+        self.order = Order.objects.create(
+            order_number='ORD-TEST-001',
+            customer=self.customer,
+            status='processing',
+            shipping_address='123 Shipping St',
+            shipping_city='Shipping City',
+            shipping_state='Shipping State',
+            shipping_zip_code='12345',
+            shipping_country='Shipping Country',
+            total_amount=Decimal('29.99')
+        )
+        self.shipment = Shipment.objects.create(
+            shipment_number='SHP-TEST-001', order=self.order, driver=self.driver, status='in_transit'
+        )
+        self.other_shipment = Shipment.objects.create(
+            shipment_number='SHP-TEST-002', order=self.order, driver=self.other_driver, status='in_transit'
+        )
+
+    def test_initial_sync_returns_active_assigned_shipments(self):
+        """Test that a first pull returns the driver's active shipments with addresses"""
+        response = self.client.get('/sync/driver/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['full_resync'])
+        self.assertEqual([s['shipment_number'] for s in response.data['shipments']], ['SHP-TEST-001'])
+        self.assertEqual(response.data['shipments'][0]['order']['shipping_city'], 'Shipping City')
+        self.assertTrue(response.data['token'])
+
+    def test_delta_sync_returns_only_changes(self):
+        """Test that a pull with a token returns only rows changed since"""
+        token = self.client.get('/sync/driver/').data['token']
+        self.assertEqual(self.client.get('/sync/driver/', {'token': token}).data['shipments'], [])
+
+        self.order.shipping_address = '456 New Address'
+        self.order.save()
+        response = self.client.get('/sync/driver/', {'token': token})
+        self.assertFalse(response.data['full_resync'])
+        self.assertEqual(response.data['shipments'][0]['order']['shipping_address'], '456 New Address')
+
+    def test_deletions_and_reassignments_are_tombstoned(self):
+        """Test that deleted or reassigned shipments show up in deleted"""
+        second = Shipment.objects.create(
+            shipment_number='SHP-TEST-003', order=self.order, driver=self.driver, status='pending'
+        )
+        token = self.client.get('/sync/driver/').data['token']
+
+        self.shipment.driver = self.other_driver
+        self.shipment.save()
+        second_id = second.id
+        second.delete()
+        self.other_shipment.delete()
+
+        response = self.client.get('/sync/driver/', {'token': token})
+        self.assertEqual(set(response.data['deleted']), {self.shipment.id, second_id})
+        self.assertEqual(response.data['shipments'], [])
+
+    def test_old_token_forces_full_resync(self):
+        """Test that tokens older than the tombstone retention force a full resync"""
+        token = make_token(timezone.now() - timedelta(days=90))
+        self.assertTrue(driver_changes(self.driver, token)['full_resync'])
+
+    def test_invalid_token(self):
+        """Test that forged tokens are rejected"""
+        response = self.client.get('/sync/driver/', {'token': 'forged'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_non_driver_forbidden(self):
+        """Test that users without a driver profile can't sync"""
+        self.client.force_authenticate(User.objects.create_user(username='staffuser', password='securepassword123'))
+        self.assertEqual(self.client.get('/sync/driver/').status_code, 403)
+
+    def test_tracking_batch_is_idempotent(self):
+        """Test that replaying a tracking batch doesn't create duplicates"""
+        batch = [
+            {'client_id': str(uuid.uuid4()), 'shipment': str(self.shipment.id), 'location': 'Depot', 'status': 'Picked up'},
+            {'client_id': str(uuid.uuid4()), 'shipment': str(self.shipment.id), 'location': 'Main St', 'status': 'Out for delivery'},
+            {'client_id': str(uuid.uuid4()), 'shipment': str(self.other_shipment.id), 'location': 'Elsewhere', 'status': 'Nope'},
+        ]
+        response = self.client.post('/sync/driver/tracking/', batch, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['result'] for r in response.data['results']], ['created', 'created', 'rejected'])
+
+        response = self.client.post('/sync/driver/tracking/', batch, format='json')
+        self.assertEqual([r['result'] for r in response.data['results']], ['duplicate', 'duplicate', 'rejected'])
+        self.assertEqual(ShipmentTracking.objects.filter(shipment=self.shipment).count(), 2)
+
+    @override_settings(OUTBOX_DESTINATIONS={'erp': {'url': 'http://erp.invalid/', 'events': ['*']}})
+    def test_concurrent_replay_publishes_only_inserted_rows(self):
+        """Test that rows stored by a concurrent replay are neither duplicated nor published again"""
+        batch = [
+            {'client_id': str(uuid.uuid4()), 'shipment': str(self.shipment.id), 'location': 'Depot', 'status': 'Picked up'},
+            {'client_id': str(uuid.uuid4()), 'shipment': str(self.shipment.id), 'location': 'Main St', 'status': 'Out for delivery'},
+        ]
+        insert_tracking = sync.insert_tracking
+
+        def replayed_first(rows, using):
+            # The other request commits the first row between the duplicate check and the insert.
+            ShipmentTracking.objects.bulk_create([ShipmentTracking(
+                shipment=self.shipment, client_id=batch[0]['client_id'], location='Depot', status='Picked up')])
+            return insert_tracking(rows, using)
+
+        with mock.patch.object(sync, 'insert_tracking', replayed_first):
+            response = self.client.post('/sync/driver/tracking/', batch, format='json')
+        self.assertEqual([r['result'] for r in response.data['results']], ['duplicate', 'created'])
+        self.assertEqual(ShipmentTracking.objects.filter(shipment=self.shipment).count(), 2)
+        self.assertEqual(
+            [event.payload['location'] for event in OutboxEvent.objects.filter(event_type='shipment.tracking_added')],
+            ['Main St'],
+        )
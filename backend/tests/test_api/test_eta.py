@@ -0,0 +1,112 @@
+from datetime import timedelta
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from backend import eta
+from backend.models import Customer, Order, Shipment, Vehicle, Warehouse, EtaQuantile
+from decimal import Decimal
+import numpy as np
+
+@override_settings(ETA_MIN_SAMPLES=3)
+class EtaTest(TestCase):
+    def setUp(self):
+        self.now = timezone.now().replace(microsecond=0)
+        self.customer = Customer.objects.create(
+            name='Test Customer', email='customer@example.com', phone='1234567890',
+            address='123 Test Avenue', city='Test City', state='Test State', zip_code='12345', country='Test Country'
+        )
+        self.truck = Vehicle.objects.create(
+            vehicle_number='TRK-001', vehicle_type='truck', make='Volvo', model='FH16', year=2022,
+            license_plate='ABC-123', capacity=Decimal('20000')
+        )
+        self.paris = self.create_warehouse('Paris', 48.8566, 2.3522)
+        self.lyon = self.create_warehouse('Lyon', 45.7640, 4.8357)
+        self.count = 0
+        # Paris -> Orleans (~110 km) by truck took 100, 120 and 140 minutes
+        for minutes in (100, 120, 140):
+            self.create_shipment(self.paris, 47.9030, 1.9093, departed=self.now - timedelta(days=2),
+                                 minutes=minutes)
+
+    def create_warehouse(self, name, latitude, longitude):
+        return Warehouse.objects.create(
+            name=name, address='1 Dock Road', city=name, state='-', zip_code='-', country='-',
+            contact_person='John Doe', phone='1234567890', email='warehouse@example.com',
+            latitude=latitude, longitude=longitude
+        )
+
+    def create_shipment(self, warehouse, latitude, longitude, departed, minutes=None):
+        self.count += 1
+        order = Order.objects.create(
+            order_number=f'ORD-TEST-{self.count:03d}', customer=self.customer, shipping_address='-',
+            shipping_city='-', shipping_state='-', shipping_zip_code='-', shipping_country='-',
+            shipping_latitude=latitude, shipping_longitude=longitude, total_amount=Decimal('10')
+        )
+        return Shipment.objects.create(
+            shipment_number=f'SHP-TEST-{self.count:03d}', order=order, warehouse=warehouse, vehicle=self.truck,
+            departure_time=departed, status='delivered' if minutes else 'in_transit',
+            actual_arrival=departed + timedelta(minutes=minutes) if minutes else None
+        )
+
+    def test_grouped_quantiles_match_numpy(self):
+        """Test the single-sort grouped quantiles against np.quantile"""
+        rng = np.random.default_rng(1)
+        groups = rng.choice(np.array(['a', 'b', 'c']), 200)
+        values = rng.exponential(60, 200)
+        labels, counts, (p50, p90) = eta.grouped_quantiles(groups, values)
+        for label, count, low, high in zip(labels, counts, p50, p90):
+            self.assertEqual(count, (groups == label).sum())
+            self.assertAlmostEqual(low, np.quantile(values[groups == label], 0.5))
+            self.assertAlmostEqual(high, np.quantile(values[groups == label], 0.9))
+
+    def test_train_stores_route_quantiles(self):
+        """Test that training stores duration quantiles per route and vehicle type"""
+        self.assertEqual(eta.train(self.now), 3)
+        route = EtaQuantile.objects.get(warehouse=self.paris)
+        self.assertEqual((route.vehicle_type, route.samples), ('truck', 3))
+        self.assertEqual((route.p50_minutes, route.p90_minutes), (120, 136))
+
+    def test_score_updates_in_transit_shipments(self):
+        """Test estimates, late flags and that unchanged rows aren't rewritten"""
+        eta.train(self.now)
+        on_time = self.create_shipment(self.paris, 47.9030, 1.9093, departed=self.now - timedelta(minutes=10))
+        overdue = self.create_shipment(self.paris, 47.9030, 1.9093, departed=self.now - timedelta(hours=3))
+
+        self.assertEqual(eta.score(self.now)[:2], (2, 2))
+        on_time.refresh_from_db()
+        overdue.refresh_from_db()
+        self.assertEqual(on_time.estimated_arrival, on_time.departure_time + timedelta(minutes=120))
+        self.assertFalse(on_time.is_likely_late)
+        self.assertEqual(overdue.estimated_arrival, overdue.departure_time + timedelta(minutes=136))
+        self.assertTrue(overdue.is_likely_late)
+
+        self.assertEqual(eta.score(self.now)[:2], (2, 0))
+
+    def test_unknown_route_uses_vehicle_pace(self):
+        """Test that a route without history is estimated from the vehicle type's pace and distance"""
+        eta.train(self.now)
+        pace = EtaQuantile.objects.get(warehouse=None, vehicle_type='truck').p50_pace
+        # Lyon -> Grenoble, ~95 km
+        shipment = self.create_shipment(self.lyon, 45.1885, 5.7245, departed=self.now - timedelta(minutes=5))
+        eta.score(self.now)
+        shipment.refresh_from_db()
+        distance = eta.distances_km(45.7640, 4.8357, 45.1885, 5.7245)
+        expected = shipment.departure_time + timedelta(minutes=pace * distance)
+        self.assertLess(abs((shipment.estimated_arrival - expected).total_seconds()), 1)
+
+    def test_train_without_positive_trips(self):
+        """Test that history without a positive trip duration trains nothing instead of failing"""
+        Shipment.objects.update(actual_arrival=F('departure_time'))
+        self.assertEqual(eta.train(self.now), 0)
+        self.assertFalse(EtaQuantile.objects.exists())
+
+    def test_blank_route_is_kept_apart_from_global_group(self):
+        """Test that trips without origin, destination and vehicle don't replace the global group"""
+        blank = [self.create_shipment(None, None, None, departed=self.now - timedelta(days=1), minutes=30)
+                 for _ in range(3)]
+        Shipment.objects.filter(pk__in=[shipment.pk for shipment in blank]).update(vehicle=None)
+        self.assertEqual(eta.train(self.now), 4)
+        route = EtaQuantile.objects.get(warehouse=None, destination='', vehicle_type='')
+        self.assertEqual((route.samples, route.p50_minutes), (3, 30))
+        overall = EtaQuantile.objects.get(warehouse=None, destination=eta.ANY_DESTINATION, vehicle_type='')
+        self.assertEqual((overall.samples, overall.p50_minutes), (6, 65))
+        self.assertEqual(eta.load_model()[eta.GLOBAL_KEY][:2], [6, 65])
@@ -0,0 +1,115 @@
+import time
+from unittest import mock
+from django.test import TestCase, override_settings
+from rest_framework.test import APITestCase
+from backend import geo
+from backend.models import User, Customer, Order, Shipment, Warehouse, Inventory, Product, GeoLocation
+from decimal import Decimal
+
+def create_warehouse(name, latitude=None, longitude=None, **kwargs):
+    data = {
+        'name': name,
+        'address': '1 Dock Road',
+        'city': 'Warehouse City',
+        'state': 'Warehouse State',
+        'zip_code': '00000',
+        'country': 'Testland',
+        'contact_person': 'John Doe',
+        'phone': '1234567890',
+        'email': 'warehouse@example.com',
+        'latitude': latitude,
+        'longitude': longitude,
+    }
+    data.update(kwargs)
+    return Warehouse.objects.create(**data)
+
+class GeohashTest(TestCase):
+    def test_encode_geohash(self):
+        """Test geohash encoding against a known value"""
+        self.assertEqual(geo.encode_geohash(57.64911, 10.40744, 11), 'u4pruydqqvj')
+
+    def test_haversine(self):
+        """Test great-circle distance between Paris and London"""
+        self.assertAlmostEqual(geo.haversine_km(48.8566, 2.3522, 51.5074, -0.1278), 343.5, delta=1)
+
+    def test_covering_prefixes_contain_nearby_points(self):
+        """Test that points within the radius fall inside the covering cells"""
+        prefixes = geo.covering_prefixes(48.8566, 2.3522, 10)
+        nearby = geo.encode_geohash(48.91, 2.40)
+        self.assertTrue(any(nearby.startswith(prefix) for prefix in prefixes))
+
+    def test_geocode_from_table(self):
+        """Test that saving a warehouse fills coordinates from the geocoding table"""
+        GeoLocation.objects.create(country='Testland', zip_code='00000', city='Warehouse City',
+                                   latitude=48.8566, longitude=2.3522)
+        warehouse = create_warehouse('Geocoded')
+        self.assertEqual((warehouse.latitude, warehouse.longitude), (48.8566, 2.3522))
+        self.assertEqual(warehouse.geohash, geo.encode_geohash(48.8566, 2.3522))
+
+        warehouse.zip_code = '99999'
+        warehouse.city = 'Nowhere'
+        warehouse.save()
+        self.assertIsNone(warehouse.latitude)
+        self.assertEqual(warehouse.geohash, '')
+
+    def test_geocode_misses_expire(self):
+        """Test that a location added without this process's signals is found once the miss expires"""
+        self.assertIsNone(geo.geocode('Testland', '12345'))
+        GeoLocation.objects.bulk_create([GeoLocation(country='Testland', zip_code='12345', city='Late City',
+                                                     latitude=50.0, longitude=3.0)])
+        with self.assertNumQueries(0):
+            self.assertIsNone(geo.geocode('Testland', '12345'))
+        with mock.patch('backend.geo.time.monotonic', return_value=time.monotonic() + 301):
+            self.assertEqual(geo.geocode('Testland', '12345'), (50.0, 3.0))
+
+@override_settings(ROOT_URLCONF='backend.urls')
+class ProximityApiTest(APITestCase):
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_user(username='staffuser', password='securepassword123'))
+        self.product = Product.objects.create(name='Test Product', sku='TEST-SKU-001',
+                                              weight=Decimal('1.5'), price=Decimal('29.99'))
+        # Paris, Lyon and Berlin
+        self.paris = create_warehouse('Paris', 48.8566, 2.3522)
+        self.lyon = create_warehouse('Lyon', 45.7640, 4.8357)
+        self.berlin = create_warehouse('Berlin', 52.5200, 13.4050)
+        Inventory.objects.create(product=self.product, warehouse=self.paris, quantity=1)
+        Inventory.objects.create(product=self.product, warehouse=self.lyon, quantity=50)
+        Inventory.objects.create(product=self.product, warehouse=self.berlin, quantity=50)
+
+        customer = Customer.objects.create(name='Test Customer', email='customer@example.com', phone='1',
+                                           address='-', city='-', state='-', zip_code='-', country='-')
+        for number, (lat, lon) in enumerate([(48.86, 2.35), (48.90, 2.30), (45.76, 4.83)]):
+            order = Order.objects.create(
+                order_number=f'ORD-{number}', customer=customer, shipping_address='-',
+                shipping_city='-', shipping_state='-', shipping_zip_code='-', shipping_country='-',
+                shipping_latitude=lat, shipping_longitude=lon, total_amount=Decimal('1.00'))
+            Shipment.objects.create(shipment_number=f'SHP-{number}', order=order)
+
+    def test_nearest_warehouse_with_stock(self):
+        """Test that sourcing skips warehouses without enough stock"""
+        response = self.client.get('/warehouses/nearest/', {
+            'lat': 48.85, 'lon': 2.35, 'product': str(self.product.id), 'quantity': 10, 'limit': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([w['name'] for w in response.data], ['Lyon', 'Berlin'])
+        self.assertAlmostEqual(response.data[0]['distance_km'], 392, delta=5)
+
+    def test_nearest_warehouse_without_product(self):
+        """Test nearest warehouses regardless of stock"""
+        response = self.client.get('/warehouses/nearest/', {'lat': 48.85, 'lon': 2.35, 'limit': 1})
+        self.assertEqual([w['name'] for w in response.data], ['Paris'])
+
+    def test_nearest_warehouse_bad_params(self):
+        """Test that malformed query parameters are rejected"""
+        for params in ({'product': 'nope'}, {'quantity': 'many'}, {'limit': 0}):
+            response = self.client.get('/warehouses/nearest/', {'lat': 1, 'lon': 2, **params})
+            self.assertEqual(response.status_code, 400, params)
+
+    def test_shipments_within_radius(self):
+        """Test radius search over shipment destinations"""
+        response = self.client.get('/shipments/nearby/', {'lat': 48.8566, 'lon': 2.3522, 'radius_km': 10})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([s['shipment_number'] for s in response.data['results']], ['SHP-0', 'SHP-1'])
+
+    def test_missing_point(self):
+        """Test that a point is required"""
+        self.assertEqual(self.client.get('/shipments/nearby/').status_code, 400)
@@ -0,0 +1,107 @@
+import io
+import shutil
+import tempfile
+from unittest import mock
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from PIL import Image
+from rest_framework.test import APITestCase
+from backend import images
+from backend.models import User, Product
+from decimal import Decimal
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+def make_upload(name='photo.png', size=(1600, 1200), color=(200, 30, 30, 255)):
+    buffer = io.BytesIO()
+    Image.new('RGBA', size, color).save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+@override_settings(ROOT_URLCONF='backend.urls', MEDIA_ROOT=MEDIA_ROOT)
+class ImageVariantTest(APITestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='staffuser', password='securepassword123')
+        self.client.force_authenticate(self.user)
+        with mock.patch('backend.tasks.process_image_variants.delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.product = Product.objects.create(
+                    name='Test Product',
+                    sku='TEST-SKU-001',
+                    weight=Decimal('1.5'),
+                    price=Decimal('29.99'),
+                    image=make_upload()
+                )
+        self.delay = delay
+
+    def test_upload_schedules_processing(self):
+        """Test that saving a new image queues the variant task after commit"""
+        self.delay.assert_called_once_with('backend.Product', self.product.pk)
+        with mock.patch('backend.tasks.process_image_variants.delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.product.name = 'Renamed'
+                self.product.save()
+        delay.assert_not_called()
+
+    def test_variants_are_generated(self):
+        """Test that every variant is rendered at its size and format"""
+        before = Product.objects.get(pk=self.product.pk).updated_at
+        variants = images.process('backend.Product', self.product.pk)
+        self.assertEqual(set(variants), set(images.VARIANTS))
+
+        product = Product.objects.get(pk=self.product.pk)
+        self.assertEqual(product.image_variants, variants)
+        self.assertGreater(product.updated_at, before)
+        with default_storage.open(variants['thumb']) as f, Image.open(f) as thumb:
+            self.assertEqual((thumb.format, thumb.size), ('JPEG', (200, 150)))
+        with default_storage.open(variants['webp']) as f, Image.open(f) as webp:
+            self.assertEqual((webp.format, webp.size), ('WEBP', (800, 600)))
+
+    def test_identical_content_reuses_variants(self):
+        """Test that names depend only on the image content"""
+        first = images.process('backend.Product', self.product.pk)
+        with mock.patch('backend.tasks.process_image_variants.delay'):
+            other = Product.objects.create(
+                name='Other Product', sku='TEST-SKU-002', weight=Decimal('1'), price=Decimal('1'),
+                image=make_upload('copy.png')
+            )
+        with mock.patch.object(images, 'render_variant') as render:
+            self.assertEqual(images.process('backend.Product', other.pk), first)
+        render.assert_not_called()
+
+    def test_new_image_resets_variants(self):
+        """Test that replacing the image clears the old variants"""
+        images.process('backend.Product', self.product.pk)
+        product = Product.objects.get(pk=self.product.pk)
+        with mock.patch('backend.tasks.process_image_variants.delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                product.image = make_upload('new.png', color=(0, 0, 255, 255))
+                product.save()
+        self.assertEqual(Product.objects.get(pk=product.pk).image_variants, {})
+        delay.assert_called_once_with('backend.Product', product.pk)
+
+    def test_serializer_exposes_cacheable_urls(self):
+        """Test that product lists link variants served with long cache lifetimes"""
+        images.process('backend.Product', self.product.pk)
+        response = self.client.get('/products/')
+        self.assertEqual(response.status_code, 200)
+        thumb_url = response.data['results'][0]['image_variants']['thumb']
+        self.assertTrue(thumb_url.startswith('http://testserver/images/variants/'))
+
+        response = self.client.get(thumb_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('max-age=31536000', response['Cache-Control'])
+
+    def test_only_variants_are_served(self):
+        """Test that the variant view doesn't expose other media files"""
+        response = self.client.get(f'/images/{self.product.image.name}')
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get('/images/variants/../../settings.py')
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,169 @@
+import threading
+import time
+from unittest import mock
+from django.db import connections, transaction
+from django.test import TransactionTestCase, override_settings
+from rest_framework.test import APITestCase
+from backend import numbering
+from backend.models import User, Customer, NumberSequence, Order, Shipment
+from decimal import Decimal
+
+class NumberingMixin:
+    def create_customer(self):
+        return Customer.objects.create(
+            name='Test Customer', email='customer@example.com', phone='1234567890',
+            address='123 Test Avenue', city='Test City', state='Test State', zip_code='12345', country='Test Country'
+        )
+
+    def create_order(self, customer, **kwargs):
+        return Order.objects.create(
+            customer=customer, shipping_address='123 Shipping St', shipping_city='Shipping City',
+            shipping_state='Shipping State', shipping_zip_code='12345', shipping_country='Shipping Country',
+            total_amount=Decimal('29.99'), **kwargs
+        )
+
+@override_settings(ROOT_URLCONF='backend.urls', ORDER_AUTO_SOURCING=False)
+class NumberAssignmentTest(NumberingMixin, APITestCase):
+    def setUp(self):
+        numbering.discard_blocks()
+        self.customer = self.create_customer()
+
+    def test_blank_numbers_are_assigned(self):
+        """Test that orders and shipments get formatted, increasing numbers"""
+        first = self.create_order(self.customer)
+        second = self.create_order(self.customer)
+        self.assertRegex(first.order_number, r'^ORD-\d{8}$')
+        self.assertGreater(second.order_number, first.order_number)
+        shipment = Shipment.objects.create(order=first)
+        self.assertRegex(shipment.shipment_number, r'^SHP-\d{8}$')
+
+    def test_explicit_numbers_are_kept(self):
+        """Test that a supplied number is not replaced"""
+        self.assertEqual(self.create_order(self.customer, order_number='ORD-LEGACY-1').order_number, 'ORD-LEGACY-1')
+
+    def test_api_create_without_number(self):
+        """Test that the API no longer requires an order number"""
+        self.client.force_authenticate(User.objects.create_user(username='staffuser', password='securepassword123'))
+        response = self.client.post('/orders/', {
+            'customer': str(self.customer.id), 'shipping_address': '1 Main Street', 'shipping_city': 'City',
+            'shipping_state': 'State', 'shipping_zip_code': '12345', 'shipping_country': 'Country',
+            'total_amount': '10.00', 'items': [],
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertRegex(response.data['order_number'], r'^ORD-\d{8}$')
+
+    def test_invalid_prefix(self):
+        """Test that prefixes are validated"""
+        with self.assertRaises(ValueError):
+            numbering.next_number('bad-prefix')
+
+class BlockAllocationTest(NumberingMixin, TransactionTestCase):
+    def setUp(self):
+        numbering.discard_blocks()
+
+    @override_settings(NUMBER_BLOCK_SIZE=100)
+    def test_numbers_come_from_cached_blocks(self):
+        """Test that a block is reserved once and then served from memory"""
+        values = [numbering.next_value('TST') for _ in range(250)]
+        self.assertEqual(values, list(range(1, 251)))
+        self.assertEqual(NumberSequence.objects.get(prefix='TST').next_value, 301)
+        with self.assertNumQueries(0):
+            numbering.next_value('TST')
+
+    def test_other_workers_get_disjoint_blocks(self):
+        """Test that a forked or separate worker never reuses numbers"""
+        parent = [numbering.next_value('TST') for _ in range(3)]
+        with mock.patch('backend.numbering.os.getpid', return_value=-1):
+            child = [numbering.next_value('TST') for _ in range(3)]
+        numbering.discard_blocks()
+        other = [numbering.next_value('TST') for _ in range(3)]
+        self.assertEqual(len(set(parent + child + other)), 9)
+
+    @override_settings(NUMBER_BLOCK_SIZE=100)
+    def test_blocks_are_cached_inside_transactions(self):
+        """Test that a block reserved inside a transaction survives its rollback and stays cached"""
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            inside = [numbering.next_value('TST')]
+            with self.assertNumQueries(0):
+                inside += [numbering.next_value('TST') for _ in range(4)]
+            raise RuntimeError
+        self.assertEqual(NumberSequence.objects.get(prefix='TST').next_value, 101)
+        after = [numbering.next_value('TST') for _ in range(5)]
+        self.assertEqual(inside + after, list(range(1, 11)))
+
+    def test_rolled_back_reservation_is_not_reused(self):
+        """Test that numbers reserved after a write in a rolled-back transaction don't collide later"""
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            self.create_customer()
+            inside = [numbering.next_value('TST') for _ in range(2)]
+            raise RuntimeError
+        after = [numbering.next_value('TST') for _ in range(5)]
+        self.assertEqual(len(set(after)), 5)
+        self.assertEqual(len(set(inside)), 2)
+        self.assertEqual(after[0], inside[0])  # the numbers were never used, so handing them out again is fine
+
+    def test_concurrent_creation(self):
+        """Test that threads creating orders concurrently never collide"""
+        customer = self.create_customer()
+        threads, per_thread, numbers, errors = 8, 50, [], []
+
+        def work():
+            try:
+                for _ in range(per_thread):
+                    numbers.append(numbering.order_number())
+            except Exception as exc:  # pragma: no cover - reported below
+                errors.append(exc)
+            finally:
+                connections.close_all()
+
+        started = time.perf_counter()
+        workers = [threading.Thread(target=work) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+        self.assertEqual(errors, [])
+        self.assertEqual(len(set(numbers)), threads * per_thread)
+        self.assertGreater(threads * per_thread / elapsed, 1000)
+
+        orders = [self.create_order(customer, order_number=number) for number in numbers[:20]]
+        self.assertEqual(Order.objects.filter(pk__in=[o.pk for o in orders]).count(), 20)
+
+    @override_settings(NUMBER_BLOCK_SIZE=10)
+    def test_concurrent_creation_inside_transactions(self):
+        """Test that threads numbering inside transactions still get whole blocks while others write"""
+        customer = self.create_customer()
+        write_lock = threading.Lock()  # SQLite takes one writer at a time
+        numbers, errors = [], []
+
+        def create_orders():
+            try:
+                for _ in range(5):
+                    with write_lock, transaction.atomic():
+                        numbers.append(self.create_order(customer).order_number)
+            except Exception as exc:  # pragma: no cover - reported below
+                errors.append(exc)
+            finally:
+                connections.close_all()
+
+        def take_numbers():
+            try:
+                for _ in range(5):
+                    with transaction.atomic():
+                        numbers.append(numbering.order_number())
+            except Exception as exc:  # pragma: no cover - reported below
+                errors.append(exc)
+            finally:
+                connections.close_all()
+
+        workers = [threading.Thread(target=target) for target in (create_orders, take_numbers) * 4]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(len(set(numbers)), 40)
+        # Only whole blocks were reserved: no single-number fallback happened.
+        self.assertEqual(NumberSequence.objects.get(prefix='ORD').next_value, 41)
+        self.assertEqual(Order.objects.count(), 20)
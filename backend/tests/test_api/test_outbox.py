@@ -0,0 +1,148 @@
+import json
+import threading
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from backend import outbox
+from backend.models import Customer, Order, OutboxDestination, OutboxEvent, Shipment, ShipmentTracking
+from decimal import Decimal
+
+class WebhookStub:
+    """Local HTTP endpoint recording the batches it receives."""
+
+    def __init__(self):
+        self.requests = []
+        self.failures = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                if stub.failures:
+                    stub.failures -= 1
+                    self.send_response(503)
+                else:
+                    stub.requests.append((self.path, dict(self.headers), body))
+                    self.send_response(204)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def events(self, path=None):
+        return [event for p, _, body in self.requests if path in (None, p) for event in body['events']]
+
+class OutboxTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.stub = WebhookStub()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.stub.close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.stub.requests, self.stub.failures = [], 0
+        settings = override_settings(ORDER_AUTO_SOURCING=False, OUTBOX_DESTINATIONS={
+            'erp': {'url': self.stub.url + '/erp', 'events': ['order.*'], 'secret': 's3cret'},
+            'carrier': {'url': self.stub.url + '/carrier', 'events': ['order.created', 'shipment.*'], 'batch_size': 2},
+        })
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.customer = Customer.objects.create(
+            name='Test Customer', email='customer@example.com', phone='1234567890',
+            address='123 Test Avenue', city='Test City', state='Test State', zip_code='12345', country='Test Country'
+        )
+
+    def create_order(self, number='ORD-1'):
+        return Order.objects.create(
+            order_number=number, customer=self.customer, shipping_address='123 Shipping St',
+            shipping_city='Shipping City', shipping_state='Shipping State', shipping_zip_code='12345',
+            shipping_country='Shipping Country', total_amount=Decimal('29.99')
+        )
+
+    def test_events_follow_subscriptions(self):
+        """Test that changes queue one row per subscribed destination"""
+        order = self.create_order()
+        order.status = 'processing'
+        order.save()
+        rows = list(OutboxEvent.objects.order_by('pk').values_list('destination', 'event_type'))
+        self.assertEqual(rows, [('erp', 'order.created'), ('carrier', 'order.created'), ('erp', 'order.status_changed')])
+        self.assertEqual(OutboxEvent.objects.filter(event_type='order.created').values('event_id').distinct().count(), 1)
+
+    def test_events_roll_back_with_the_change(self):
+        """Test that the outbox row is written in the change's transaction"""
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            self.create_order()
+            raise RuntimeError
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    def test_dispatch_delivers_in_order(self):
+        """Test that batches arrive in order with idempotency keys and are removed once acknowledged"""
+        order = self.create_order()
+        shipment = Shipment.objects.create(shipment_number='SHP-1', order=order)
+        for location in ('Depot', 'Hub'):
+            ShipmentTracking.objects.create(shipment=shipment, location=location, status='Scanned')
+        shipment.status = 'in_transit'
+        shipment.save()
+
+        self.assertEqual(outbox.dispatch(), {'erp': 1, 'carrier': 5})
+        self.assertFalse(OutboxEvent.objects.exists())
+        carrier = self.stub.events('/carrier')
+        self.assertEqual([e['type'] for e in carrier], [
+            'order.created', 'shipment.created', 'shipment.tracking_added', 'shipment.tracking_added',
+            'shipment.status_changed',
+        ])
+        self.assertEqual([e['data'].get('location') for e in carrier[2:4]], ['Depot', 'Hub'])
+        self.assertEqual(len([p for p, _, _ in self.stub.requests if p == '/carrier']), 3)
+        self.assertEqual(self.stub.events('/erp')[0]['id'], carrier[0]['id'])
+
+        path, headers, _ = self.stub.requests[0]
+        self.assertEqual(path, '/erp')
+        self.assertTrue(headers['Idempotency-Key'])
+        self.assertTrue(headers['X-Signature'].startswith('sha256='))
+        self.assertEqual(OutboxDestination.objects.get(name='carrier').delivered, 5)
+
+    def test_failed_delivery_backs_off(self):
+        """Test that a failing endpoint keeps its events and is retried after a backoff"""
+        self.create_order()
+        self.stub.failures = 1
+        self.assertEqual(outbox.dispatch(['erp']), {'erp': 0})
+        state = OutboxDestination.objects.get(name='erp')
+        self.assertEqual(state.attempts, 1)
+        self.assertIn('HTTP 503', state.last_error)
+        self.assertIsNone(state.leased_until)
+        self.assertTrue(OutboxEvent.objects.filter(destination='erp').exists())
+
+        self.assertEqual(outbox.dispatch(['erp']), {'erp': 0})  # still backing off
+        OutboxDestination.objects.filter(name='erp').update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(outbox.dispatch(['erp']), {'erp': 1})
+        state.refresh_from_db()
+        self.assertEqual((state.attempts, state.last_error), (0, ''))
+        self.assertEqual(outbox.backoff(3), 8)
+
+    def test_unreachable_destination(self):
+        """Test that connection errors count as failed deliveries"""
+        self.create_order()
+        with override_settings(OUTBOX_DESTINATIONS={'erp': {'url': 'http://127.0.0.1:9/', 'timeout': 1}}):
+            self.assertEqual(outbox.dispatch(), {'erp': 0})
+        self.assertEqual(OutboxDestination.objects.get(name='erp').attempts, 1)
+
+    def test_leased_destination_is_skipped(self):
+        """Test that only one dispatcher works on a destination at a time"""
+        self.create_order()
+        OutboxDestination.objects.create(name='erp', leased_until=timezone.now() + timedelta(minutes=1))
+        self.assertEqual(outbox.dispatch(['erp']), {'erp': 0})
+        self.assertEqual(self.stub.requests, [])
@@ -0,0 +1,86 @@
+import gzip
+import io
+import json
+import uuid
+from datetime import datetime, timezone
+from decimal import Decimal
+from unittest import mock
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from backend import renderers
+from backend.middleware import CompressionMiddleware, accepted_encodings
+from backend.renderers import FastJSONRenderer, FastJSONParser
+
+class FastJSONRendererTest(SimpleTestCase):
+    def setUp(self):
+        self.data = {
+            'id': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+            'total_amount': Decimal('59.98'),
+            'order_date': datetime(2024, 1, 2, 3, 4, 5, tzinfo=timezone.utc),
+            'items': [{'quantity': 2, 'name': 'Café'}],
+        }
+
+    def test_matches_stdlib_renderer(self):
+        """Test that the fast renderer produces the same document as DRF's"""
+        fast = json.loads(FastJSONRenderer().render(self.data))
+        stdlib = json.loads(JSONRenderer().render(self.data))
+        self.assertEqual(fast, stdlib)
+        self.assertEqual(fast['order_date'], '2024-01-02T03:04:05Z')
+        self.assertEqual(fast['id'], '12345678-1234-5678-1234-567812345678')
+
+    def test_falls_back_without_orjson(self):
+        """Test that the renderer and parser work when orjson is missing"""
+        with mock.patch.object(renderers, 'orjson', None):
+            body = FastJSONRenderer().render(self.data)
+            self.assertEqual(json.loads(body)['total_amount'], 59.98)
+            self.assertEqual(FastJSONParser().parse(io.BytesIO(b'{"a": 1}')), {'a': 1})
+
+    def test_parser(self):
+        """Test parsing valid and invalid JSON"""
+        self.assertEqual(FastJSONParser().parse(io.BytesIO(b'{"quantity": 3}')), {'quantity': 3})
+        with self.assertRaises(ParseError):
+            FastJSONParser().parse(io.BytesIO(b'{"quantity": '))
+
+@override_settings(COMPRESSION_MIN_SIZE=100)
+class CompressionMiddlewareTest(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def get_response(self, body, accept_encoding='gzip'):
+        request = self.factory.get('/', HTTP_ACCEPT_ENCODING=accept_encoding)
+        middleware = CompressionMiddleware(lambda request: HttpResponse(body))
+        return middleware(request)
+
+    def test_compresses_large_responses(self):
+        """Test that responses over the threshold are gzipped"""
+        body = b'{"status": "pending"}' * 50
+        response = self.get_response(body)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), body)
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_skips_small_responses(self):
+        """Test that responses under the threshold are left alone"""
+        response = self.get_response(b'{}')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_skips_when_not_accepted(self):
+        """Test that clients without gzip support get identity responses"""
+        response = self.get_response(b'x' * 500, accept_encoding='gzip;q=0, identity')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_prefers_brotli(self):
+        """Test that brotli is used when available and accepted"""
+        fake_brotli = mock.Mock()
+        fake_brotli.compress.return_value = b'br-body'
+        with mock.patch('backend.middleware.brotli', fake_brotli):
+            response = self.get_response(b'x' * 500, accept_encoding='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(response.content, b'br-body')
+
+    def test_accepted_encodings(self):
+        """Test Accept-Encoding parsing"""
+        self.assertEqual(accepted_encodings('gzip, deflate, br;q=0.5'), {'gzip', 'deflate', 'br'})
+        self.assertEqual(accepted_encodings('br;q=0, gzip'), {'gzip'})
@@ -0,0 +1,254 @@
+import time
+import uuid
+from datetime import date
+from unittest import mock
+from django.core.management import call_command
+from django.db import connections
+from django.test import TestCase, override_settings
+from rest_framework.test import APITestCase
+from backend import sharding
+from backend.models import (
+    User, Customer, Driver, Order, OutboxEvent, OrderItem, Product, Shipment, ShipmentItem, ShipmentTracking,
+    StatusTransition,
+)
+from backend.workflow import aging
+from decimal import Decimal
+from io import StringIO
+
+SHARD_DATABASES = ('shard_eu', 'shard_us')
+SHARDS = {
+    'eu': {'database': 'shard_eu', 'countries': ['France', 'Germany']},
+    'us': {'database': 'shard_us', 'countries': ['USA'], 'states': {'Canada': ['BC']}},
+}
+
+class ShardingTestMixin:
+    @classmethod
+    def setUpClass(cls):
+        # The shard databases exist only for these tests, so they are registered and
+        # created here rather than declared up front, where the runner would look for them.
+        cls.databases = {'default', *SHARD_DATABASES}
+        for alias in SHARD_DATABASES:
+            connections.settings[alias] = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}
+        connections.configure_settings(connections.settings)
+        for alias in SHARD_DATABASES:
+            connections[alias].creation.create_test_db(verbosity=0, autoclobber=True)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        for alias in SHARD_DATABASES:
+            connections[alias].creation.destroy_test_db(':memory:', verbosity=0)
+            del connections[alias]
+            del connections.settings[alias]
+
+    def create_fixtures(self):
+        sharding.forget_locations()
+        self.customer = Customer.objects.create(
+            name='Test Customer', email='customer@example.com', phone='1234567890',
+            address='123 Test Avenue', city='Paris', state='IDF', zip_code='75001', country='France'
+        )
+        self.product = Product.objects.create(name='Widget', sku='WID-001', weight=Decimal('1'), price=Decimal('10'))
+
+    def create_order(self, order_number, country, state='-', **kwargs):
+        order = Order.objects.create(
+            order_number=order_number, customer=self.customer, shipping_address='1 Main Street',
+            shipping_city='City', shipping_state=state, shipping_zip_code='12345', shipping_country=country,
+            total_amount=Decimal('10'), **kwargs
+        )
+        item = OrderItem.objects.create(order=order, product=self.product, quantity=1, unit_price=Decimal('10'))
+        shipment = Shipment.objects.create(shipment_number=f'SHP-{order_number}', order=order)
+        ShipmentItem.objects.create(shipment=shipment, order_item=item, quantity=1)
+        ShipmentTracking.objects.create(shipment=shipment, location='Depot', status='Received')
+        return order
+
+SHARDED = override_settings(
+    ROOT_URLCONF='backend.urls', ORDER_AUTO_SOURCING=False, DATABASE_ROUTERS=['backend.sharding.ShardRouter'],
+    SHARD_REGIONS=SHARDS, SHARD_DEFAULT_REGION='eu', SHARD_PARALLEL_SCATTER=False,
+)
+
+@SHARDED
+class ShardRoutingTest(ShardingTestMixin, TestCase):
+    def setUp(self):
+        self.create_fixtures()
+
+    def test_region_for_address(self):
+        """Test that state rules win over country rules and unknown addresses use the default region"""
+        self.assertEqual(sharding.region_for_address('usa'), 'us')
+        self.assertEqual(sharding.region_for_address('Canada', 'BC'), 'us')
+        self.assertEqual(sharding.region_for_address('Canada', 'ON'), 'eu')
+        self.assertEqual(sharding.region_for_address('Germany'), 'eu')
+
+    def test_order_tree_is_colocated(self):
+        """Test that an order and everything hanging off it are stored on its region's shard"""
+        order = self.create_order('ORD-US-001', 'USA')
+        self.assertEqual(order._state.db, 'shard_us')
+        for model, lookup in ((OrderItem, 'order'), (Shipment, 'order'),
+                              (ShipmentItem, 'shipment__order'), (ShipmentTracking, 'shipment__order')):
+            self.assertTrue(model.objects.using('shard_us').filter(**{lookup: order}).exists())
+            self.assertFalse(model.objects.using('shard_eu').filter(**{lookup: order}).exists())
+        self.assertFalse(Order.objects.using('default').filter(pk=order.pk).exists())
+
+    def test_children_created_by_id_follow_parent(self):
+        """Test that a child created with only its parent's id is stored next to the parent"""
+        order = self.create_order('ORD-US-001', 'USA')
+        shipment = Shipment.objects.create(shipment_number='SHP-EXTRA', order_id=order.pk)
+        self.assertEqual(shipment._state.db, 'shard_us')
+
+    def test_reference_rows_are_mirrored(self):
+        """Test that reference rows reach every shard and deletes follow"""
+        for alias in ('shard_eu', 'shard_us'):
+            self.assertEqual(Customer.objects.using(alias).get(pk=self.customer.pk).name, 'Test Customer')
+        self.customer.name = 'Renamed'
+        self.customer.save()
+        self.assertEqual(Customer.objects.using('shard_us').get(pk=self.customer.pk).name, 'Renamed')
+        other = Product.objects.create(name='Gadget', sku='GAD-001', weight=Decimal('1'), price=Decimal('5'))
+        other.delete()
+        self.assertFalse(Product.objects.using('shard_us').filter(pk=other.pk).exists())
+
+    def test_joins_work_inside_a_shard(self):
+        """Test that sharded rows can join their mirrored reference rows"""
+        self.create_order('ORD-US-001', 'USA')
+        order = Order.objects.region('us').select_related('customer').get()
+        self.assertEqual(order.customer.name, 'Test Customer')
+
+    def test_gather_across_shards(self):
+        """Test that counts and aging buckets include every shard"""
+        self.create_order('ORD-US-001', 'USA')
+        self.create_order('ORD-EU-001', 'France')
+        self.create_order('ORD-EU-002', 'Germany')
+        self.assertEqual(Order.objects.count(), 2)
+        self.assertEqual(sharding.gather_count(Order.objects.all()), 3)
+        self.assertEqual(sum(aging('order')['pending'].values()), 3)
+
+    def test_locate(self):
+        """Test that rows are found on their shard"""
+        order = self.create_order('ORD-US-001', 'USA')
+        self.assertEqual(sharding.locate(Order, order.pk), 'shard_us')
+        self.assertIsNone(sharding.locate(Order, '00000000-0000-0000-0000-000000000000'))
+
+    def test_located_shard_expires(self):
+        """Test that a cached location is looked up again after SHARD_LOCATION_TTL"""
+        order = self.create_order('ORD-CA-001', 'Canada', 'ON')
+        self.assertEqual(sharding.locate(Order, order.pk), 'shard_eu')
+        # Another process moves the order; this one's cache isn't told.
+        with mock.patch.object(sharding, 'forget_locations'):
+            sharding.move_order(order.pk, 'shard_eu', 'shard_us')
+        with self.assertNumQueries(0, using='shard_eu'), self.assertNumQueries(0, using='shard_us'):
+            self.assertEqual(sharding.locate(Order, order.pk), 'shard_eu')
+        with mock.patch('backend.sharding.time.monotonic', return_value=time.monotonic() + 61):
+            self.assertEqual(sharding.locate(Order, order.pk), 'shard_us')
+
+    def test_rebalance_moves_order_tree(self):
+        """Test that rebalancing moves an order with its children to the region of its address"""
+        order = self.create_order('ORD-CA-001', 'Canada', 'ON')
+        self.assertEqual(order._state.db, 'shard_eu')
+        Order.objects.using('shard_eu').filter(pk=order.pk).update(shipping_state='BC')
+
+        out = StringIO()
+        call_command('rebalance_shards', '--dry-run', stdout=out)
+        self.assertIn('shard_eu -> shard_us: 1 orders', out.getvalue())
+        self.assertTrue(Order.objects.using('shard_eu').filter(pk=order.pk).exists())
+
+        call_command('rebalance_shards', stdout=StringIO())
+        self.assertFalse(Order.objects.using('shard_eu').filter(pk=order.pk).exists())
+        self.assertFalse(ShipmentTracking.objects.using('shard_eu').exists())
+        self.assertFalse(OrderItem.objects.using('shard_eu').exists())
+        moved = Shipment.objects.using('shard_us').get(order_id=order.pk)
+        self.assertEqual(moved.items.get().order_item.order_id, order.pk)
+        self.assertEqual(moved.tracking_updates.count(), 1)
+        self.assertEqual(sharding.locate(Order, order.pk), 'shard_us')
+
+@SHARDED
+class ShardedApiTest(ShardingTestMixin, APITestCase):
+    def setUp(self):
+        self.create_fixtures()
+        self.user = User.objects.create_user(username='staffuser', password='securepassword123')
+        self.client.force_authenticate(self.user)
+
+    def test_list_by_region(self):
+        """Test that ?region= lists one region's orders"""
+        self.create_order('ORD-US-001', 'USA')
+        self.create_order('ORD-EU-001', 'France')
+        response = self.client.get('/orders/', {'region': 'us'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([o['order_number'] for o in response.data['results']], ['ORD-US-001'])
+        response = self.client.get('/orders/', {'region': 'mars'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_detail_finds_shard(self):
+        """Test that detail lookups work for rows outside the default region"""
+        order = self.create_order('ORD-US-001', 'USA')
+        response = self.client.get(f'/orders/{order.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['order_number'], 'ORD-US-001')
+        shipment = order.shipments.get()
+        response = self.client.patch(f'/shipments/{shipment.pk}/', {'notes': 'Fragile'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Shipment.objects.using('shard_us').get(pk=shipment.pk).notes, 'Fragile')
+
+    @override_settings(OUTBOX_DESTINATIONS={'erp': {'url': 'http://erp.invalid/', 'events': ['*']}})
+    def test_driver_sync_across_shards(self):
+        """Test that drivers pull and push tracking for shipments in every region"""
+        driver_user = User.objects.create_user(username='driveruser', password='securepassword123', user_type='driver')
+        driver = Driver.objects.create(user=driver_user, license_number='DL12345678',
+                                       license_expiry_date=date(2030, 1, 1))
+        shipments = {}
+        for alias, (number, country) in (('shard_us', ('ORD-US-001', 'USA')), ('shard_eu', ('ORD-EU-001', 'France'))):
+            shipment = self.create_order(number, country).shipments.get()
+            shipment.driver = driver
+            shipment.save()
+            shipments[alias] = shipment
+        self.client.force_authenticate(driver_user)
+
+        response = self.client.get('/sync/driver/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(s['shipment_number'] for s in response.data['shipments']),
+                         ['SHP-ORD-EU-001', 'SHP-ORD-US-001'])
+
+        batch = [
+            {'client_id': str(uuid.uuid4()), 'shipment': str(shipment.pk), 'location': 'Depot', 'status': 'Picked up'}
+            for shipment in shipments.values()
+        ]
+        response = self.client.post('/sync/driver/tracking/', batch, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual([r['result'] for r in response.data['results']], ['created', 'created'])
+        for (alias, shipment), item in zip(shipments.items(), batch):
+            self.assertEqual(ShipmentTracking.objects.using(alias).get(client_id=item['client_id']).shipment_id,
+                             shipment.pk)
+            self.assertEqual(
+                OutboxEvent.objects.using(alias).filter(event_type='shipment.tracking_added',
+                                                        payload__status='Picked up').count(), 1)
+            self.assertGreater(Shipment.objects.using(alias).get(pk=shipment.pk).updated_at, shipment.updated_at)
+        self.assertFalse(ShipmentTracking.objects.using('default').exists())
+
+        response = self.client.post('/sync/driver/tracking/', batch, format='json')
+        self.assertEqual([r['result'] for r in response.data['results']], ['duplicate', 'duplicate'])
+
+    def test_nearby_across_shards(self):
+        """Test that radius search covers every region unless one is requested"""
+        for number, country in (('ORD-US-001', 'USA'), ('ORD-EU-001', 'France')):
+            self.create_order(number, country, shipping_latitude=48.8566, shipping_longitude=2.3522)
+        params = {'lat': 48.8566, 'lon': 2.3522, 'radius_km': 10}
+        response = self.client.get('/shipments/nearby/', params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(s['shipment_number'] for s in response.data['results']),
+                         ['SHP-ORD-EU-001', 'SHP-ORD-US-001'])
+        response = self.client.get('/shipments/nearby/', {**params, 'region': 'us'})
+        self.assertEqual([s['shipment_number'] for s in response.data['results']], ['SHP-ORD-US-001'])
+
+    @override_settings(OUTBOX_DESTINATIONS={'erp': {'url': 'http://erp.invalid/', 'events': ['*']}})
+    def test_bulk_status_across_shards(self):
+        """Test that bulk changes keep history on default and events with the shard's rows"""
+        shipment = self.create_order('ORD-US-001', 'USA').shipments.get()
+        response = self.client.post('/shipments/bulk-status/', [
+            {'id': str(shipment.pk), 'status': 'in_transit', 'location': 'Depot'}
+        ], format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(Shipment.objects.using('shard_us').get(pk=shipment.pk).status, 'in_transit')
+        transitions = StatusTransition.objects.filter(entity='shipment', object_id=shipment.pk, to_status='in_transit')
+        self.assertEqual(transitions.using('default').count(), 1)
+        self.assertFalse(transitions.using('shard_us').exists())
+        events = OutboxEvent.objects.filter(event_type='shipment.status_changed')
+        self.assertEqual(events.using('shard_us').count(), 1)
+        self.assertFalse(events.using('default').exists())
@@ -0,0 +1,130 @@
+from django.test import TestCase, override_settings
+from rest_framework.test import APITestCase
+from backend.models import (
+    User, Customer, Order, OrderItem, Product, Warehouse, Inventory, Shipment, ShipmentItem,
+)
+from backend.sourcing import InsufficientStock, plan_fulfillment, source_order, stock_index
+from decimal import Decimal
+
+class SourcingTestMixin:
+    def create_fixtures(self):
+        stock_index.clear()
+        self.customer = Customer.objects.create(
+            name='Test Customer', email='customer@example.com', phone='1234567890',
+            address='123 Test Avenue', city='Paris', state='IDF', zip_code='75001', country='France'
+        )
+        self.widget = Product.objects.create(name='Widget', sku='WID-001', weight=Decimal('1'), price=Decimal('10'))
+        self.gadget = Product.objects.create(name='Gadget', sku='GAD-001', weight=Decimal('1'), price=Decimal('20'))
+        self.paris = self.create_warehouse('Paris', 48.8566, 2.3522)
+        self.lyon = self.create_warehouse('Lyon', 45.7640, 4.8357)
+        self.berlin = self.create_warehouse('Berlin', 52.5200, 13.4050)
+
+    def create_warehouse(self, name, latitude, longitude):
+        return Warehouse.objects.create(
+            name=name, address='1 Dock Road', city=name, state='-', zip_code='-', country='-',
+            contact_person='John Doe', phone='1234567890', email='warehouse@example.com',
+            latitude=latitude, longitude=longitude
+        )
+
+    def stock(self, warehouse, product, quantity):
+        return Inventory.objects.create(warehouse=warehouse, product=product, quantity=quantity)
+
+    def create_order(self, lines):
+        order = Order.objects.create(
+            order_number='ORD-TEST-001', customer=self.customer, shipping_address='1 Rue de Rivoli',
+            shipping_city='Paris', shipping_state='IDF', shipping_zip_code='75001', shipping_country='France',
+            shipping_latitude=48.86, shipping_longitude=2.35, total_amount=Decimal('100')
+        )
+        for product, quantity in lines:
+            OrderItem.objects.create(order=order, product=product, quantity=quantity, unit_price=product.price)
+        return order
+
+class PlanFulfillmentTest(SourcingTestMixin, TestCase):
+    def setUp(self):
+        self.create_fixtures()
+
+    def test_prefers_nearest_single_warehouse(self):
+        """Test that one nearby warehouse holding everything wins"""
+        for warehouse in (self.paris, self.berlin):
+            self.stock(warehouse, self.widget, 10)
+            self.stock(warehouse, self.gadget, 10)
+        plan = plan_fulfillment({self.widget.pk: 2, self.gadget.pk: 1}, 48.86, 2.35)
+        self.assertEqual(plan, [(self.paris.pk, {self.widget.pk: 2, self.gadget.pk: 1})])
+
+    def test_single_warehouse_beats_distance(self):
+        """Test that avoiding a split is preferred over a closer warehouse"""
+        self.stock(self.paris, self.widget, 10)
+        self.stock(self.berlin, self.widget, 10)
+        self.stock(self.berlin, self.gadget, 10)
+        plan = plan_fulfillment({self.widget.pk: 2, self.gadget.pk: 1}, 48.86, 2.35)
+        self.assertEqual(plan, [(self.berlin.pk, {self.widget.pk: 2, self.gadget.pk: 1})])
+
+    def test_splits_when_needed(self):
+        """Test splitting lines and quantities across warehouses"""
+        self.stock(self.paris, self.widget, 3)
+        self.stock(self.lyon, self.widget, 5)
+        self.stock(self.lyon, self.gadget, 1)
+        plan = dict(plan_fulfillment({self.widget.pk: 6, self.gadget.pk: 1}, 48.86, 2.35))
+        self.assertEqual(plan, {
+            self.lyon.pk: {self.widget.pk: 5, self.gadget.pk: 1},
+            self.paris.pk: {self.widget.pk: 1},
+        })
+
+    def test_insufficient_stock(self):
+        """Test that uncoverable demand is rejected"""
+        self.stock(self.paris, self.widget, 1)
+        with self.assertRaises(InsufficientStock):
+            plan_fulfillment({self.widget.pk: 2})
+
+    def test_source_order_reserves_stock_and_creates_shipments(self):
+        """Test that sourcing decrements inventory and creates one shipment per warehouse"""
+        self.stock(self.paris, self.widget, 3)
+        self.stock(self.lyon, self.widget, 5)
+        order = self.create_order([(self.widget, 6)])
+
+        shipments = source_order(order)
+
+        self.assertEqual({s.warehouse_id for s in shipments}, {self.paris.pk, self.lyon.pk})
+        self.assertEqual(Inventory.objects.get(warehouse=self.lyon).quantity, 0)
+        self.assertEqual(Inventory.objects.get(warehouse=self.paris).quantity, 2)
+        self.assertEqual(sum(ShipmentItem.objects.filter(shipment__order=order).values_list('quantity', flat=True)), 6)
+
+    def test_stale_index_is_refreshed(self):
+        """Test that a plan built on stale stock is retried against fresh numbers"""
+        self.stock(self.paris, self.widget, 5)
+        self.stock(self.lyon, self.widget, 5)
+        stock_index.stock(self.widget.pk)
+        # Another worker drains Paris without this process noticing
+        Inventory.objects.filter(warehouse=self.paris).update(quantity=0)
+
+        shipments = source_order(self.create_order([(self.widget, 2)]))
+
+        self.assertEqual([s.warehouse_id for s in shipments], [self.lyon.pk])
+        self.assertEqual(Inventory.objects.get(warehouse=self.lyon).quantity, 3)
+
+@override_settings(ROOT_URLCONF='backend.urls')
+class OrderSourcingApiTest(SourcingTestMixin, APITestCase):
+    def setUp(self):
+        self.create_fixtures()
+        self.client.force_authenticate(User.objects.create_user(username='staffuser', password='securepassword123'))
+        self.payload = {
+            'order_number': 'ORD-API-001', 'customer': str(self.customer.id), 'shipping_address': '1 Rue de Rivoli',
+            'shipping_city': 'Paris', 'shipping_state': 'IDF', 'shipping_zip_code': '75001',
+            'shipping_country': 'France', 'shipping_latitude': 48.86, 'shipping_longitude': 2.35,
+            'total_amount': '20.00',
+            'items': [{'product': str(self.widget.id), 'quantity': 2, 'unit_price': '10.00'}],
+        }
+
+    def test_create_order_sources_fulfillment(self):
+        """Test that creating an order plans its shipments"""
+        self.stock(self.lyon, self.widget, 10)
+        response = self.client.post('/orders/', self.payload, format='json')
+        self.assertEqual(response.status_code, 201)
+        shipment = Shipment.objects.get(order_id=response.data['id'])
+        self.assertEqual(shipment.warehouse, self.lyon)
+
+    def test_create_order_without_stock_fails(self):
+        """Test that an order that can't be fulfilled is rejected and not saved"""
+        response = self.client.post('/orders/', self.payload, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.filter(order_number='ORD-API-001').exists())
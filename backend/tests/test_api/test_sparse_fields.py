@@ -0,0 +1,88 @@
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+from backend.models import User, Customer, Order, OrderItem, Product, Category
+from decimal import Decimal
+
+@override_settings(ROOT_URLCONF='backend.urls')
+class SparseFieldsetTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='staffuser', password='securepassword123')
+        self.client.force_authenticate(self.user)
+
+        self.customer = Customer.objects.create(
+            name='Test Customer',
+            email='customer@example.com',
+            phone='1234567890',
+            address='123 Test Avenue',
+            city='Test City',
+            state='Test State',
+            zip_code='12345',
+            country='Test Country'
+        )
+
+        self.product = Product.objects.create(
+            name='Test Product',
+            sku='TEST-SKU-001',
+            category=Category.objects.create(name='Test Category'),
+            weight=Decimal('1.5'),
+            price=Decimal('29.99')
+        )
+
+        self.order = Order.objects.create(
+            order_number='ORD-TEST-001',
+            customer=self.customer,
+            status='pending',
+            shipping_address='123 Shipping St',
+            shipping_city='Shipping City',
+            shipping_state='Shipping State',
+            shipping_zip_code='12345',
+            shipping_country='Shipping Country',
+            total_amount=Decimal('59.98'),
+            notes='A long note that the list view should never load'
+        )
+        OrderItem.objects.create(order=self.order, product=self.product, quantity=2, unit_price=Decimal('29.99'))
+
+    def test_default_list_is_compact(self):
+        """Test that order lists use the compact representation"""
+        response = self.client.get('/orders/')
+        self.assertEqual(response.status_code, 200)
+        row = response.data['results'][0]
+        self.assertEqual(set(row), {'id', 'order_number', 'customer', 'order_date', 'status', 'total_amount'})
+        self.assertEqual(row['customer']['name'], 'Test Customer')
+
+    def test_detail_is_full(self):
+        """Test that detail views still return the full representation"""
+        response = self.client.get(f'/orders/{self.order.id}/')
+        self.assertEqual(response.data['notes'], 'A long note that the list view should never load')
+        self.assertEqual(len(response.data['items']), 1)
+
+    def test_fields_parameter_trims_output(self):
+        """Test that ?fields= returns only the requested fields plus id"""
+        response = self.client.get('/orders/', {'fields': 'order_number,status'})
+        row = response.data['results'][0]
+        self.assertEqual(set(row), {'id', 'order_number', 'status'})
+
+    def test_fields_parameter_trims_sql(self):
+        """Test that ?fields= keeps unrequested columns out of the query"""
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/orders/', {'fields': 'order_number,status'})
+        select = [q['sql'] for q in queries if 'backend_order' in q['sql'] and 'COUNT' not in q['sql']][-1]
+        self.assertIn('order_number', select)
+        self.assertNotIn('notes', select)
+        self.assertNotIn('shipping_address', select)
+
+    def test_expand_parameter(self):
+        """Test that ?expand= nests related objects"""
+        response = self.client.get('/orders/', {'expand': 'items'})
+        row = response.data['results'][0]
+        self.assertEqual(row['items'][0]['quantity'], 2)
+
+        response = self.client.get(f'/orders/{self.order.id}/', {'fields': 'customer', 'expand': 'customer'})
+        self.assertEqual(response.data, {'id': str(self.order.id), 'customer': {'id': str(self.customer.id), 'name': 'Test Customer'}})
+
+    def test_customer_list_omits_address(self):
+        """Test that customer lists leave out the address text"""
+        response = self.client.get('/customers/')
+        self.assertNotIn('address', response.data['results'][0])
@@ -0,0 +1,79 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from unittest import mock
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from backend.lazy import LazyModule, lazy_import
+
+SCHEMA_DIR = tempfile.mkdtemp()
+
+class LazyImportTest(TestCase):
+    def test_import_is_deferred_until_first_use(self):
+        """Test that a lazy module is only imported when an attribute is read"""
+        with mock.patch.dict(sys.modules):
+            sys.modules.pop('json.tool', None)
+            tool = lazy_import('json.tool')
+            self.assertIsInstance(tool, LazyModule)
+            self.assertNotIn('json.tool', sys.modules)
+            self.assertTrue(callable(tool.main))
+            self.assertIn('json.tool', sys.modules)
+
+    def test_startup_does_not_import_heavy_modules(self):
+        """Test that loading Django and the URLconf leaves analytics libraries unimported"""
+        probe = ('import django; django.setup(); import backend.urls; '
+                 'from backend.lazy import loaded_heavy_modules; print(",".join(loaded_heavy_modules()))')
+        result = subprocess.run([sys.executable, '-c', probe], env=os.environ.copy(),
+                                capture_output=True, text=True, check=True)
+        self.assertEqual(result.stdout.strip(), '')
+
+@override_settings(ROOT_URLCONF='backend.urls', OPENAPI_SCHEMA_DIR=SCHEMA_DIR)
+class OpenAPISchemaTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        call_command('generate_openapi_schema', api_version='1.2.0', stdout=open(os.devnull, 'w'))
+        with open(os.path.join(SCHEMA_DIR, 'manifest.json')) as f:
+            cls.manifest = json.load(f)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(SCHEMA_DIR, ignore_errors=True)
+
+    def test_schema_is_versioned(self):
+        """Test that the generated file is named after its version and content"""
+        self.assertTrue(self.manifest['file'].startswith('openapi-1.2.0-'))
+        with open(os.path.join(SCHEMA_DIR, self.manifest['file'])) as f:
+            document = json.load(f)
+        self.assertEqual(document['info']['version'], '1.2.0')
+        self.assertIn('/orders/', document['paths'])
+
+    def test_current_schema_is_revalidated(self):
+        """Test that /schema/ serves the current file with an ETag"""
+        response = self.client.get('/schema/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(b''.join(response.streaming_content))['info']['version'], '1.2.0')
+        self.assertIn('no-cache', response['Cache-Control'])
+
+        etag = response['ETag']
+        for header in (etag, f'"stale", W/{etag}', '*'):
+            self.assertEqual(self.client.get('/schema/', HTTP_IF_NONE_MATCH=header).status_code, 304, header)
+        for header in (f'"x{etag[1:-1]}x"', etag[1:-1], '"stale"'):
+            self.assertEqual(self.client.get('/schema/', HTTP_IF_NONE_MATCH=header).status_code, 200, header)
+
+    def test_versioned_schema_is_immutable(self):
+        """Test that versioned files are cached indefinitely"""
+        response = self.client.get(f'/schema/{self.manifest["file"]}')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(self.client.get('/schema/manifest.json').status_code, 404)
+
+    def test_check_detects_stale_schema(self):
+        """Test that --check passes for an up-to-date schema and fails otherwise"""
+        call_command('generate_openapi_schema', api_version='1.2.0', check=True, stdout=open(os.devnull, 'w'))
+        with self.assertRaises(Exception):
+            call_command('generate_openapi_schema', api_version='1.3.0', check=True, stdout=open(os.devnull, 'w'))
@@ -0,0 +1,136 @@
+from datetime import timedelta
+from unittest import mock
+from django.core.cache import cache
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from backend.models import User, Customer, Order, Shipment, StatusTransition
+from backend.workflow import InvalidTransition, aging, sla, stuck
+from decimal import Decimal
+
+@override_settings(ROOT_URLCONF='backend.urls', ORDER_AUTO_SOURCING=False)
+class StatusWorkflowTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='staffuser', password='securepassword123')
+        self.client.force_authenticate(self.user)
+        self.customer = Customer.objects.create(
+            name='Test Customer',
+            email='customer@example.com',
+            phone='1234567890',
+            address='123 Test Avenue',
+            city='Test City',
+            state='Test State',
+            zip_code='12345',
+            country='Test Country'
+        )
+        self.order = self.create_order('ORD-TEST-001')
+
+    def create_order(self, order_number):
+        return Order.objects.create(
+            order_number=order_number,
+            customer=self.customer,
+            shipping_address='123 Shipping St',
+            shipping_city='Shipping City',
+            shipping_state='Shipping State',
+            shipping_zip_code='12345',
+            shipping_country='Shipping Country',
+            total_amount=Decimal('29.99')
+        )
+
+    def move(self, instance, status, at):
+        with mock.patch('backend.signals.timezone.now', return_value=at):
+            instance.status = status
+            instance.save()
+
+    def test_transitions_are_recorded(self):
+        """Test that creation and every status change write a history row"""
+        self.order.status = 'processing'
+        self.order.save()
+        history = list(
+            StatusTransition.objects.filter(entity='order', object_id=self.order.pk)
+            .order_by('changed_at', 'pk').values_list('from_status', 'to_status')
+        )
+        self.assertEqual(history, [('', 'pending'), ('pending', 'processing')])
+        self.assertEqual(StatusTransition.objects.get(to_status='processing').changed_at,
+                         Order.objects.get(pk=self.order.pk).status_changed_at)
+
+    def test_saving_without_status_change_records_nothing(self):
+        """Test that unrelated edits don't write history"""
+        self.order.notes = 'Leave at the door'
+        self.order.save()
+        self.assertEqual(StatusTransition.objects.filter(object_id=self.order.pk).count(), 1)
+
+    def test_invalid_transition_is_rejected(self):
+        """Test that the model refuses transitions outside the workflow"""
+        self.order.status = 'delivered'
+        with self.assertRaises(InvalidTransition):
+            self.order.save()
+        shipment = Shipment.objects.create(shipment_number='SHP-TEST-001', order=self.order, status='delivered')
+        shipment.status = 'pending'
+        with self.assertRaises(InvalidTransition):
+            shipment.save()
+
+    def test_update_fields_keeps_status_changed_at(self):
+        """Test that saving only the status still stamps the change time"""
+        before = self.order.status_changed_at
+        self.order.status = 'processing'
+        self.order.save(update_fields=['status'])
+        self.assertGreater(Order.objects.get(pk=self.order.pk).status_changed_at, before)
+
+    def test_api_rejects_invalid_transition(self):
+        """Test that the API reports an invalid status change as a validation error"""
+        response = self.client.patch(f'/orders/{self.order.pk}/', {'status': 'delivered'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('status', response.data)
+
+        response = self.client.patch(f'/orders/{self.order.pk}/', {'status': 'processing'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Order.objects.get(pk=self.order.pk).status, 'processing')
+
+    def test_sla_average(self):
+        """Test the average time between two statuses within a window"""
+        now = timezone.now()
+        start = now - timedelta(days=2)
+        slow = self.create_order('ORD-TEST-002')
+        for order, hours in ((self.order, 2), (slow, 6)):
+            self.move(order, 'processing', start)
+            self.move(order, 'shipped', start + timedelta(hours=hours))
+
+        summary = sla('order', 'processing', 'shipped', now - timedelta(days=7), now)
+        self.assertEqual(summary['count'], 2)
+        self.assertEqual(summary['average'], timedelta(hours=4))
+        self.assertEqual(summary['maximum'], timedelta(hours=6))
+
+        response = self.client.get('/dashboard/status-sla/', {'entity': 'order', 'from': 'processing', 'to': 'shipped'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(response.data['average_seconds'], 4 * 3600)
+
+    def test_sla_rejects_unknown_status(self):
+        """Test that the SLA endpoint validates its parameters"""
+        response = self.client.get('/dashboard/status-sla/', {'entity': 'order', 'from': 'pending', 'to': 'lost'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_aging_and_stuck(self):
+        """Test aging buckets and the stuck-orders query"""
+        now = timezone.now()
+        old = self.create_order('ORD-TEST-002')
+        Order.objects.filter(pk=old.pk).update(status_changed_at=now - timedelta(hours=30))
+
+        buckets = aging('order', now)
+        self.assertEqual(buckets['pending']['lt_1h'], 1)
+        self.assertEqual(buckets['pending']['1d_3d'], 1)
+        self.assertEqual(buckets['processing']['lt_1h'], 0)
+        self.assertNotIn('cancelled', buckets)
+        self.assertEqual(list(stuck('order', 'pending', timedelta(hours=24), now)), [old])
+
+    def test_aging_endpoint_is_cached(self):
+        """Test that the dashboard aging view serves a cached snapshot"""
+        response = self.client.get('/dashboard/status-aging/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['orders']['pending']['lt_1h'], 1)
+
+        self.create_order('ORD-TEST-002')
+        response = self.client.get('/dashboard/status-aging/')
+        self.assertEqual(response.data['orders']['pending']['lt_1h'], 1)
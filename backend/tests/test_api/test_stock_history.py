@@ -0,0 +1,149 @@
+from datetime import date, timedelta
+from django.core.management import call_command
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from backend import stock_history
+from backend.models import User, Product, Warehouse, Inventory, InventorySnapshot
+from decimal import Decimal
+from io import StringIO
+
+@override_settings(ROOT_URLCONF='backend.urls', ORDER_AUTO_SOURCING=False)
+class StockHistoryTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='staffuser', password='securepassword123')
+        self.client.force_authenticate(self.user)
+        self.widget = Product.objects.create(name='Widget', sku='WID-001', weight=Decimal('1'), price=Decimal('10'))
+        self.gadget = Product.objects.create(name='Gadget', sku='GAD-001', weight=Decimal('1'), price=Decimal('25'))
+        self.warehouse = Warehouse.objects.create(
+            name='Main Warehouse', address='1 Dock Road', city='Test City', state='-', zip_code='-', country='-',
+            contact_person='John Doe', phone='1234567890', email='warehouse@example.com'
+        )
+        self.widgets = Inventory.objects.create(product=self.widget, warehouse=self.warehouse, quantity=100)
+        self.gadgets = Inventory.objects.create(product=self.gadget, warehouse=self.warehouse, quantity=50)
+
+    def set_stock(self, inventory, quantity):
+        inventory.quantity = quantity
+        inventory.save()
+
+    def history(self, inventory):
+        return list(
+            InventorySnapshot.objects.filter(product=inventory.product, warehouse=inventory.warehouse)
+            .order_by('date').values_list('date', 'quantity')
+        )
+
+    def test_only_changes_are_stored(self):
+        """Test that a snapshot writes rows only for changed quantities"""
+        day = date(2026, 3, 1)
+        self.assertEqual(stock_history.take_snapshot(day)[0], 2)
+        self.assertEqual(stock_history.take_snapshot(day + timedelta(days=1))[0], 0)
+        self.set_stock(self.widgets, 80)
+        self.assertEqual(stock_history.take_snapshot(day + timedelta(days=2))[0], 1)
+        self.assertEqual(self.history(self.widgets), [(day, 100), (day + timedelta(days=2), 80)])
+        self.assertEqual(self.history(self.gadgets), [(day, 50)])
+
+    def test_rerun_replaces_the_day(self):
+        """Test that taking the same day's snapshot again is idempotent"""
+        day = date(2026, 3, 1)
+        stock_history.take_snapshot(day)
+        self.set_stock(self.widgets, 90)
+        stock_history.take_snapshot(day + timedelta(days=1))
+        self.set_stock(self.widgets, 70)
+        stock_history.take_snapshot(day + timedelta(days=1))
+        self.set_stock(self.widgets, 100)
+        stock_history.take_snapshot(day + timedelta(days=1))
+        self.assertEqual(self.history(self.widgets), [(day, 100)])
+
+    def test_as_of_queries(self):
+        """Test that levels are answered as of any date"""
+        day = date(2026, 3, 1)
+        stock_history.take_snapshot(day)
+        self.set_stock(self.widgets, 60)
+        stock_history.take_snapshot(day + timedelta(days=5))
+
+        self.assertIsNone(stock_history.level(self.widget.pk, self.warehouse.pk, day - timedelta(days=1)))
+        self.assertEqual(stock_history.level(self.widget.pk, self.warehouse.pk, day + timedelta(days=4)), 100)
+        self.assertEqual(stock_history.level(self.widget.pk, self.warehouse.pk, day + timedelta(days=30)), 60)
+        self.assertEqual(
+            sorted(quantity for _, _, quantity in stock_history.levels_as_of(day + timedelta(days=5),
+                                                                             warehouse_id=self.warehouse.pk)),
+            [50, 60],
+        )
+
+        response = self.client.get('/reports/inventory-history/', {'product': str(self.widget.pk), 'date': '2026-03-03'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([level['quantity'] for level in response.data['levels']], [100])
+        self.assertEqual(self.client.get('/reports/inventory-history/').status_code, 400)
+        self.assertEqual(self.client.get('/reports/inventory-history/', {'product': str(self.widget.pk),
+                                                                         'date': 'soon'}).status_code, 400)
+
+    def test_deleted_inventory_drops_to_zero(self):
+        """Test that removing an inventory row records a zero level"""
+        stock_history.take_snapshot(date(2026, 3, 1))
+        self.gadgets.delete()
+        today = InventorySnapshot.objects.get(product=self.gadget, quantity=0).date
+        self.assertEqual(stock_history.level(self.gadget.pk, self.warehouse.pk, today), 0)
+        stock_history.take_snapshot(today)
+        self.assertEqual(stock_history.level(self.gadget.pk, self.warehouse.pk, today), 0)
+
+    def test_deleted_inventory_keeps_its_history(self):
+        """Test that as-of levels and turnover still cover a pair whose inventory row was deleted"""
+        today = timezone.localdate()
+        day = today - timedelta(days=10)
+        stock_history.take_snapshot(day)
+        self.gadgets.delete()
+
+        levels = stock_history.levels_as_of(day + timedelta(days=1), warehouse_id=self.warehouse.pk)
+        self.assertIn((self.gadget.pk, self.warehouse.pk, 50), list(levels))
+        response = self.client.get('/reports/inventory-history/', {'product': str(self.gadget.pk),
+                                                                   'date': str(day)})
+        self.assertEqual([level['quantity'] for level in response.data['levels']], [50])
+        report = stock_history.turnover_report(day + timedelta(days=1), today)
+        self.assertEqual(report['consumed'], 50)
+
+    def test_thin_keeps_month_end_levels(self):
+        """Test that old history is reduced to the last change per month"""
+        for day, quantity in ((date(2025, 1, 3), 90), (date(2025, 1, 20), 80), (date(2025, 2, 2), 70),
+                              (date(2025, 3, 5), 60), (date(2025, 3, 9), 55)):
+            self.set_stock(self.widgets, quantity)
+            stock_history.take_snapshot(day)
+        self.assertEqual(stock_history.thin(before=date(2025, 3, 10)), 1)
+        self.assertEqual(
+            [quantity for _, quantity in self.history(self.widgets)], [80, 70, 60, 55],
+        )
+        self.assertEqual(stock_history.level(self.widget.pk, self.warehouse.pk, date(2025, 1, 31)), 80)
+
+    def test_turnover_report(self):
+        """Test consumption, average stock, turnover and days of cover"""
+        start = date(2026, 3, 1)
+        stock_history.take_snapshot(start - timedelta(days=1))  # widgets 100, gadgets 50 going in
+        self.set_stock(self.widgets, 40)
+        stock_history.take_snapshot(start + timedelta(days=4))  # 60 consumed on day 5
+        self.set_stock(self.widgets, 70)
+        stock_history.take_snapshot(start + timedelta(days=9))  # 30 received on day 10
+
+        report = stock_history.turnover_report(start, start + timedelta(days=9))
+        self.assertEqual(report['days'], 10)
+        self.assertEqual((report['consumed'], report['received']), (60, 30))
+        warehouse = report['by_warehouse'][0]
+        # Widgets: 100 x 4 days, 40 x 5 days, 70 x 1 day = 670 unit-days; gadgets 50 x 10 days.
+        self.assertEqual(warehouse['average_units'], 117.0)
+        self.assertEqual(warehouse['closing_units'], 120)
+        self.assertEqual(warehouse['turnover'], round(60 / 117, 2))
+        self.assertEqual(warehouse['days_of_cover'], 20.0)
+        self.assertEqual([row['product_id'] for row in report['low_cover']], [self.widget.pk])
+        self.assertEqual(report['low_cover'][0]['days_of_cover'], round(70 / 6, 1))
+
+        response = self.client.get('/reports/inventory-turnover/', {'since': '2026-03-01', 'until': '2026-03-10'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['consumed'], 60)
+        self.assertEqual(self.client.get('/reports/inventory-turnover/', {'since': '2026-03-10',
+                                                                          'until': '2026-03-01'}).status_code, 400)
+        self.assertEqual(self.client.get('/reports/inventory-turnover/', {'warehouse': 'abc'}).status_code, 400)
+
+    def test_command(self):
+        """Test that the management command records a snapshot"""
+        out = StringIO()
+        call_command('snapshot_inventory', '--date', '2026-03-01', stdout=out)
+        self.assertIn('Recorded 2 changed stock levels', out.getvalue())
+        self.assertEqual(InventorySnapshot.objects.count(), 2)
@@ -0,0 +1,162 @@
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from backend.models import User
+from backend.throttling import (
+    AdmissionControlMiddleware, RoleTokenBucketThrottle, TokenBucket,
+    cache_key, classify, get_config, rejection_metrics,
+)
+from unittest import mock
+
+ADMISSION_CONTROL = {
+    'USER_RATES': {
+        'staff': {'capacity': 3, 'refill_rate': 1},
+        'customer': {'capacity': 2, 'refill_rate': 0.1},
+    },
+    'ROLE_RATES': {
+        'customer': {'capacity': 3, 'refill_rate': 0.1},
+    },
+    'POOLS': {
+        'heavy': {'prefixes': ['/api/reports/'], 'max_concurrent': 1, 'token_cost': 2,
+                  'retry_after': 7, 'shed_when': {'transactional': 0.5}},
+        'transactional': {'prefixes': [], 'max_concurrent': 2, 'retry_after': 1},
+    },
+}
+
+class PingView(APIView):
+    throttle_classes = [RoleTokenBucketThrottle]
+
+    def get(self, request):
+        return Response({'ok': True})
+
+@override_settings(ADMISSION_CONTROL=ADMISSION_CONTROL)
+class TokenBucketThrottleTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = APIRequestFactory()
+        self.staff = User.objects.create_user(username='staffuser', password='securepassword123', user_type='staff')
+
+    def get(self, user, path='/api/orders/'):
+        request = self.factory.get(path)
+        force_authenticate(request, user=user)
+        return PingView.as_view()(request)
+
+    def test_bucket_refills_over_time(self):
+        """Test token bucket consumption and refill"""
+        bucket = TokenBucket('test-bucket', capacity=2, refill_rate=1)
+        self.assertTrue(bucket.consume(now=100)[0])
+        self.assertTrue(bucket.consume(now=100)[0])
+        allowed, wait = bucket.consume(now=100)
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(wait, 1.0)
+        self.assertTrue(bucket.consume(now=101)[0])
+
+    def test_user_bucket_rejects_with_retry_after(self):
+        """Test that exceeding the per-user rate gives 429 with Retry-After"""
+        for _ in range(3):
+            self.assertEqual(self.get(self.staff).status_code, 200)
+        response = self.get(self.staff)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(rejection_metrics()['rate_limited']['staff'], 1)
+
+    def test_users_have_separate_buckets(self):
+        """Test that one user exhausting their bucket doesn't affect another"""
+        other = User.objects.create_user(username='otherstaff', password='securepassword123', user_type='staff')
+        for _ in range(4):
+            self.get(self.staff)
+        self.assertEqual(self.get(other).status_code, 200)
+
+    def test_role_bucket_is_shared(self):
+        """Test that the role bucket caps all users of the role together"""
+        customers = [
+            User.objects.create_user(username=f'customer{i}', password='securepassword123', user_type='customer')
+            for i in range(3)
+        ]
+        self.assertEqual(self.get(customers[0]).status_code, 200)
+        self.assertEqual(self.get(customers[1]).status_code, 200)
+        self.assertEqual(self.get(customers[2]).status_code, 200)
+        self.assertEqual(self.get(customers[2]).status_code, 429)
+
+    def test_heavy_endpoints_cost_more(self):
+        """Test that heavy pool requests consume more tokens"""
+        self.assertEqual(self.get(self.staff, '/api/reports/sales/').status_code, 200)
+        self.assertEqual(self.get(self.staff, '/api/reports/sales/').status_code, 429)
+
+@override_settings(ADMISSION_CONTROL=ADMISSION_CONTROL)
+class AdmissionControlMiddlewareTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+
+    def test_classify(self):
+        """Test that paths map onto endpoint pools"""
+        self.assertEqual(classify('/api/reports/sales/'), 'heavy')
+        self.assertEqual(classify('/api/orders/'), 'transactional')
+
+    def test_pool_limit(self):
+        """Test that requests beyond the pool's concurrency get 503"""
+        inner = {}
+
+        def view(request):
+            inner['response'] = middleware(self.factory.get('/api/reports/inventory/'))
+            return HttpResponse('ok')
+
+        middleware = AdmissionControlMiddleware(view)
+        response = middleware(self.factory.get('/api/reports/sales/'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(inner['response'].status_code, 503)
+        self.assertEqual(inner['response']['Retry-After'], '7')
+        self.assertEqual(cache.get(cache_key('inflight', 'heavy')), 0)
+        self.assertEqual(rejection_metrics()['overloaded']['heavy'], 1)
+
+    def test_sheds_heavy_when_transactional_busy(self):
+        """Test that heavy requests are shed while order entry is busy"""
+        cache.set(cache_key('inflight', 'transactional'), 1)
+        middleware = AdmissionControlMiddleware(lambda request: HttpResponse('ok'))
+        self.assertEqual(middleware(self.factory.get('/api/reports/sales/')).status_code, 503)
+        self.assertEqual(middleware(self.factory.get('/api/orders/')).status_code, 200)
+        self.assertEqual(rejection_metrics()['shed']['heavy'], 1)
+
+    @override_settings(ADMISSION_CONTROL={**ADMISSION_CONTROL, 'ENABLED': False})
+    def test_disabled(self):
+        """Test that admission control can be switched off"""
+        cache.set(cache_key('inflight', 'heavy'), 10)
+        middleware = AdmissionControlMiddleware(lambda request: HttpResponse('ok'))
+        self.assertEqual(middleware(self.factory.get('/api/reports/sales/')).status_code, 200)
+
+    def test_inflight_expiry_is_refreshed(self):
+        """Test that every admission pushes the in-flight counter's expiry out"""
+        key = cache_key('inflight', 'transactional')
+        cache.set(key, 0, timeout=5)
+        with mock.patch.object(cache, 'touch', wraps=cache.touch) as touch:
+            middleware = AdmissionControlMiddleware(lambda request: HttpResponse('ok'))
+            middleware(self.factory.get('/api/orders/'))
+            middleware(self.factory.get('/api/orders/'))
+        self.assertEqual([call.args for call in touch.call_args_list], [(key, 60), (key, 60)])
+
+    def test_inflight_never_negative(self):
+        """Test that releasing a counter that was recreated doesn't go below zero"""
+        key = cache_key('inflight', 'transactional')
+
+        def view(request):
+            cache.delete(key)  # the counter lapsed while the request ran
+            return HttpResponse('ok')
+
+        AdmissionControlMiddleware(view)(self.factory.get('/api/orders/'))
+        cache.set(key, 0)
+        AdmissionControlMiddleware.decr(key)
+        self.assertEqual(cache.get(key), 0)
+
+@override_settings(ADMISSION_CONTROL={'POOLS': {'heavy': {'max_concurrent': 8}}})
+class AdmissionConfigTest(TestCase):
+    def test_overrides_are_merged_into_defaults(self):
+        """Test that settings only need the values that differ from the defaults"""
+        config = get_config()
+        self.assertEqual(config['POOLS']['heavy']['max_concurrent'], 8)
+        self.assertEqual(config['POOLS']['heavy']['token_cost'], 5)
+        self.assertIn('transactional', config['POOLS'])
+        self.assertIn('admin', config['USER_RATES'])
@@ -0,0 +1,271 @@
+"""
+Rate limiting and admission control.
+
+Two layers, both configured through ``settings.ADMISSION_CONTROL``:
+
+* ``RoleTokenBucketThrottle`` (a DRF throttle) keeps a token bucket per user
+  and one per ``User.user_type`` in the cache, so a single client and a whole
+  role are both capped. Heavy endpoint classes can cost more than one token.
+* ``AdmissionControlMiddleware`` limits how many requests of each endpoint
+  class (e.g. heavy reports vs. transactional order entry) are in flight at
+  once, and sheds heavy work first when the transactional pool is busy.
+
+Rejections carry ``Retry-After`` and are counted per reason and scope; see
+``rejection_metrics()``.
+
+The cache must be shared between workers (Redis, Memcached) for the limits
+to hold across the whole deployment; with the local-memory cache they apply
+per process.
+"""
+import logging
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import JsonResponse
+from rest_framework.throttling import BaseThrottle
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': True,
+    # Per-user buckets: capacity is the burst size, refill_rate is tokens per second.
+    'USER_RATES': {
+        'admin': {'capacity': 300, 'refill_rate': 10},
+        'manager': {'capacity': 200, 'refill_rate': 5},
+        'staff': {'capacity': 120, 'refill_rate': 3},
+        'driver': {'capacity': 60, 'refill_rate': 1},
+        'customer': {'capacity': 30, 'refill_rate': 0.5},
+        'anonymous': {'capacity': 20, 'refill_rate': 0.2},
+    },
+    # Buckets shared by every user of a role; roles left out are not capped.
+    'ROLE_RATES': {
+        'customer': {'capacity': 2000, 'refill_rate': 50},
+        'anonymous': {'capacity': 200, 'refill_rate': 5},
+    },
+    'POOLS': {
+        'heavy': {
+            'prefixes': ['/api/reports/', '/api/dashboard/'],
+            'max_concurrent': 4,
+            'token_cost': 5,
+            'retry_after': 5,
+            # Shed this pool while the named pool is at least this busy.
+            'shed_when': {'transactional': 0.8},
+        },
+        'transactional': {
+            'prefixes': [],
+            'max_concurrent': 32,
+            'token_cost': 1,
+            'retry_after': 1,
+        },
+    },
+    'DEFAULT_POOL': 'transactional',
+    'CACHE_PREFIX': 'admission',
+    # Safety net for in-flight counters left behind by a killed worker.
+    'INFLIGHT_TIMEOUT': 60,
+}
+
+
+def merge(base, overrides):
+    """``base`` updated with ``overrides``, merging nested dicts instead of replacing them."""
+    merged = dict(base)
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            value = merge(merged[key], value)
+        merged[key] = value
+    return merged
+
+
+def get_config():
+    return merge(DEFAULTS, getattr(settings, 'ADMISSION_CONTROL', None) or {})
+
+
+def cache_key(*parts):
+    return ':'.join([get_config()['CACHE_PREFIX'], *[str(part) for part in parts]])
+
+
+def classify(path, config=None):
+    """Return the name of the endpoint pool serving ``path``."""
+    config = config or get_config()
+    for name, pool in config['POOLS'].items():
+        if any(path.startswith(prefix) for prefix in pool.get('prefixes', ())):
+            return name
+    return config['DEFAULT_POOL']
+
+
+# Metrics
+
+def record_rejection(reason, scope):
+    key = cache_key('rejections', reason, scope)
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+    logger.warning('Request rejected: %s (%s)', reason, scope)
+
+
+def rejection_metrics():
+    """Return rejection counts as ``{reason: {scope: count}}``."""
+    config = get_config()
+    scopes = {
+        'rate_limited': sorted(set(config['USER_RATES']) | set(config['ROLE_RATES'])),
+        'overloaded': sorted(config['POOLS']),
+        'shed': sorted(config['POOLS']),
+    }
+    keys = {
+        cache_key('rejections', reason, scope): (reason, scope)
+        for reason, names in scopes.items() for scope in names
+    }
+    counts = cache.get_many(keys)
+    metrics = {reason: {scope: 0 for scope in names} for reason, names in scopes.items()}
+    for key, count in counts.items():
+        reason, scope = keys[key]
+        metrics[reason][scope] = count
+    return metrics
+
+
+# Token buckets
+
+class TokenBucket:
+    """
+    A token bucket persisted in the cache as ``(tokens, updated_at)``.
+
+    The read-modify-write isn't atomic, so concurrent requests can overspend
+    by a few tokens; that is an acceptable error for rate limiting and keeps
+    it to a single cache round trip each way.
+    """
+
+    def __init__(self, key, capacity, refill_rate):
+        self.key = key
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+
+    def consume(self, cost=1, now=None):
+        """Take ``cost`` tokens. Returns ``(allowed, seconds_until_allowed)``."""
+        now = time.time() if now is None else now
+        tokens, updated_at = cache.get(self.key) or (self.capacity, now)
+        tokens = min(self.capacity, tokens + max(now - updated_at, 0) * self.refill_rate)
+        timeout = math.ceil(self.capacity / self.refill_rate) + 1 if self.refill_rate else None
+
+        if tokens >= cost:
+            cache.set(self.key, (tokens - cost, now), timeout)
+            return True, 0.0
+
+        cache.set(self.key, (tokens, now), timeout)
+        if not self.refill_rate:
+            return False, None
+        return False, (cost - tokens) / self.refill_rate
+
+
+def user_role(user):
+    if user is None or not user.is_authenticated:
+        return 'anonymous'
+    return getattr(user, 'user_type', None) or 'staff'
+
+
+class RoleTokenBucketThrottle(BaseThrottle):
+    """DRF throttle enforcing the per-user and per-role token buckets."""
+
+    def allow_request(self, request, view):
+        config = get_config()
+        self.wait_seconds = None
+        if not config['ENABLED']:
+            return True
+
+        role = user_role(request.user)
+        pool = config['POOLS'].get(classify(request.path, config), {})
+        cost = pool.get('token_cost', 1)
+
+        buckets = []
+        user_rate = config['USER_RATES'].get(role)
+        if user_rate:
+            ident = request.user.pk if request.user.is_authenticated else self.get_ident(request)
+            buckets.append(TokenBucket(cache_key('bucket', 'user', role, ident), **user_rate))
+        role_rate = config['ROLE_RATES'].get(role)
+        if role_rate:
+            buckets.append(TokenBucket(cache_key('bucket', 'role', role), **role_rate))
+
+        for bucket in buckets:
+            allowed, wait = bucket.consume(cost)
+            if not allowed:
+                self.wait_seconds = wait
+                record_rejection('rate_limited', role)
+                return False
+        return True
+
+    def wait(self):
+        return self.wait_seconds
+
+
+# Concurrency pools
+
+class AdmissionControlMiddleware:
+    """
+    Cap in-flight requests per endpoint pool and shed load with 503s.
+
+    In-flight counts live in the cache so every worker shares them. Each
+    increment pushes the key's expiry ``INFLIGHT_TIMEOUT`` seconds out, so a
+    busy pool's counter never lapses while requests are in flight, and the
+    counts left behind by a worker that died mid-request still expire once
+    the pool goes quiet.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        config = get_config()
+        if not config['ENABLED']:
+            return self.get_response(request)
+
+        name = classify(request.path, config)
+        pool = config['POOLS'][name]
+
+        for other, threshold in pool.get('shed_when', {}).items():
+            other_pool = config['POOLS'][other]
+            if self.in_flight(other) >= threshold * other_pool['max_concurrent']:
+                record_rejection('shed', name)
+                return self.reject(name, pool, 'Server is busy, try again later.')
+
+        key = cache_key('inflight', name)
+        if self.incr(key, config['INFLIGHT_TIMEOUT']) > pool['max_concurrent']:
+            self.decr(key)
+            record_rejection('overloaded', name)
+            return self.reject(name, pool, 'Too many concurrent requests, try again later.')
+
+        try:
+            return self.get_response(request)
+        finally:
+            self.decr(key)
+
+    def in_flight(self, name):
+        return cache.get(cache_key('inflight', name)) or 0
+
+    @staticmethod
+    def incr(key, timeout):
+        try:
+            count = cache.incr(key)
+        except ValueError:
+            if cache.add(key, 1, timeout=timeout):
+                return 1
+            count = cache.incr(key)
+        cache.touch(key, timeout)
+        return count
+
+    @staticmethod
+    def decr(key):
+        try:
+            count = cache.decr(key)
+        except ValueError:
+            # Expired while the request ran; nothing left to release.
+            return
+        if count < 0:
+            cache.set(key, 0, timeout=get_config()['INFLIGHT_TIMEOUT'])
+
+    @staticmethod
+    def reject(name, pool, message):
+        response = JsonResponse({'detail': message, 'pool': name}, status=503)
+        response['Retry-After'] = str(pool.get('retry_after', 1))
+        return response
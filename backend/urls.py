@@ -0,0 +1,33 @@
+from django.urls import include, path
+from rest_framework.routers import DefaultRouter
+
+from . import views
+
+router = DefaultRouter()
+router.register(r'customers', views.CustomerViewSet)
+router.register(r'suppliers', views.SupplierViewSet)
+router.register(r'categories', views.CategoryViewSet)
+router.register(r'products', views.ProductViewSet)
+router.register(r'warehouses', views.WarehouseViewSet)
+router.register(r'inventory', views.InventoryViewSet)
+router.register(r'orders', views.OrderViewSet)
+router.register(r'vehicles', views.VehicleViewSet)
+router.register(r'drivers', views.DriverViewSet)
+router.register(r'shipments', views.ShipmentViewSet)
+
+urlpatterns = [
+    path('', include(router.urls)),
+    path('sync/driver/', views.DriverSyncView.as_view(), name='driver-sync'),
+    path('sync/driver/tracking/', views.DriverTrackingBatchView.as_view(), name='driver-sync-tracking'),
+    path('admission/metrics/', views.admission_metrics, name='admission-metrics'),
+    path('dashboard/status-aging/', views.status_aging, name='dashboard-status-aging'),
+    path('dashboard/status-sla/', views.status_sla, name='dashboard-status-sla'),
+    path('reports/sales/', views.sales_report, name='report-sales'),
+    path('reports/inventory/', views.inventory_report, name='report-inventory'),
+    path('reports/shipments/', views.shipments_report, name='report-shipments'),
+    path('reports/inventory-history/', views.inventory_history, name='report-inventory-history'),
+    path('reports/inventory-turnover/', views.inventory_turnover, name='report-inventory-turnover'),
+    path('images/<path:name>', views.image_variant, name='image-variant'),
+    path('schema/', views.openapi_schema, name='openapi-schema'),
+    path('schema/<str:filename>', views.openapi_schema, name='openapi-schema-file'),
+]
@@ -0,0 +1,646 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, SuspiciousFileOperation, ValidationError as DjangoValidationError
+from django.core.files.storage import default_storage
+from django.db.models import Prefetch
+from django.http import FileResponse, Http404, HttpResponseNotModified, JsonResponse
+from django.utils.cache import patch_cache_control
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.http import parse_etags
+from django.views.decorators.http import require_GET
+from django_filters.rest_framework import DjangoFilterBackend
+from rest_framework import filters, permissions, serializers, status, viewsets
+from rest_framework.exceptions import ValidationError
+from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from . import analytics, bulk_status, geo, images, schema, sharding, stock_history, workflow
+from .conditional import ConditionalGetMixin
+from .models import (
+    Customer, Supplier, Category, Product, Warehouse, Inventory,
+    Order, Vehicle, Driver, Shipment,
+)
+from .serializers import (
+    parse_field_list,
+    CustomerSerializer, CustomerListSerializer,
+    SupplierSerializer, SupplierListSerializer,
+    CategorySerializer,
+    ProductSerializer, ProductListSerializer,
+    WarehouseSerializer, WarehouseListSerializer, NearestWarehouseQuerySerializer,
+    InventorySerializer, InventoryListSerializer,
+    OrderSerializer, OrderListSerializer,
+    VehicleSerializer, DriverSerializer,
+    ShipmentSerializer, ShipmentListSerializer,
+    ShipmentTrackingSerializer,
+    SyncShipmentSerializer, TrackingBatchItemSerializer,
+    BulkShipmentStatusSerializer, BulkOrderStatusSerializer,
+)
+from .sourcing import InsufficientStock, source_order
+from .sync import InvalidSyncToken, apply_tracking_batch, driver_changes
+from .throttling import rejection_metrics
+
+
+class QueryPlan:
+    """Columns and relations a serializer needs from one model."""
+
+    def __init__(self):
+        self.only = set()
+        self.select_related = set()
+        self.prefetch = []
+
+
+def build_query_plan(model, serializer_fields, prefix=''):
+    """
+    Work out which columns and relations ``serializer_fields`` read from
+    ``model``. Fields that don't map onto a model field (properties, methods,
+    ``source='*'``) make the whole level fall back to all concrete columns.
+    """
+    plan = QueryPlan()
+    plan.only.add(prefix + model._meta.pk.name)
+    load_all = False
+
+    for field in serializer_fields:
+        bits = field.source.split('.') if field.source != '*' else ['*']
+        try:
+            model_field = model._meta.get_field(bits[0])
+        except FieldDoesNotExist:
+            load_all = True
+            continue
+
+        name = prefix + bits[0]
+        child = getattr(field, 'child', field)
+
+        if model_field.one_to_many or model_field.many_to_many:
+            if isinstance(child, serializers.BaseSerializer):
+                related = build_query_plan(model_field.related_model, child.fields.values())
+                if model_field.one_to_many:
+                    related.only.add(model_field.field.name)
+                queryset = model_field.related_model._default_manager.only(*related.only)
+                queryset = queryset.select_related(*related.select_related)
+                queryset = queryset.prefetch_related(*related.prefetch)
+                plan.prefetch.append(Prefetch(name, queryset=queryset))
+            else:
+                plan.prefetch.append(name)
+        elif model_field.is_relation:
+            plan.only.add(name)
+            if isinstance(child, serializers.BaseSerializer):
+                related = build_query_plan(model_field.related_model, child.fields.values(), name + '__')
+            elif len(bits) > 1:
+                related = build_query_plan(model_field.related_model, [], name + '__')
+                related.only.update(name + '__' + f.name for f in model_field.related_model._meta.concrete_fields)
+            else:
+                continue
+            plan.select_related.add(name)
+            plan.only |= related.only
+            plan.select_related |= related.select_related
+            plan.prefetch += related.prefetch
+        else:
+            plan.only.add(name)
+
+    if load_all:
+        plan.only.update(prefix + f.name for f in model._meta.concrete_fields)
+    return plan
+
+
+def optimize_queryset(queryset, serializer):
+    """Restrict ``queryset`` to what ``serializer`` will actually read."""
+    plan = build_query_plan(queryset.model, serializer.fields.values())
+    return (
+        queryset.select_related(*plan.select_related)
+        .prefetch_related(*plan.prefetch)
+        .only(*plan.only)
+    )
+
+
+def validate_bulk_items(serializer_class, data):
+    serializer = serializer_class(
+        data=data, many=True, allow_empty=False, max_length=getattr(settings, 'BULK_STATUS_MAX_ITEMS', 1000),
+    )
+    serializer.is_valid(raise_exception=True)
+    return serializer.validated_data
+
+
+def parse_point(params):
+    """
+    Read a point from ``lat``/``lon`` query parameters, or geocode it from
+    ``zip_code``/``city`` and ``country``.
+    """
+    try:
+        if 'lat' in params and 'lon' in params:
+            return float(params['lat']), float(params['lon'])
+    except ValueError:
+        raise ValidationError({'lat': 'lat and lon must be numbers.'})
+    if 'country' in params:
+        point = geo.geocode(params['country'], params.get('zip_code', ''), params.get('city', ''))
+        if point is not None:
+            return point
+        raise ValidationError({'country': 'Unknown location.'})
+    raise ValidationError({'lat': 'Provide lat and lon, or country with zip_code or city.'})
+
+
+class SparseFieldsetMixin:
+    """
+    Viewset mixin for ``?fields=`` / ``?expand=`` support.
+
+    List requests use the compact ``list_serializer_class`` unless the client
+    asks for specific fields, in which case fields are picked from the full
+    serializer. Either way the queryset only loads the columns needed.
+    """
+
+    list_serializer_class = None
+    sparse_actions = ('list', 'retrieve')
+
+    def get_sparse_fieldset(self):
+        if self.request is None or getattr(self, 'action', None) not in self.sparse_actions:
+            return None, None
+        params = self.request.query_params
+        return parse_field_list(params.get('fields')), parse_field_list(params.get('expand'))
+
+    def get_serializer_class(self):
+        if (self.action == 'list' and self.list_serializer_class is not None
+                and (self.request is None or 'fields' not in self.request.query_params)):
+            return self.list_serializer_class
+        return super().get_serializer_class()
+
+    def get_serializer(self, *args, **kwargs):
+        fields, expand = self.get_sparse_fieldset()
+        if fields is not None:
+            kwargs.setdefault('fields', fields)
+        if expand is not None:
+            kwargs.setdefault('expand', expand)
+        return super().get_serializer(*args, **kwargs)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if getattr(self, 'action', None) in self.sparse_actions:
+            queryset = optimize_queryset(queryset, self.get_serializer())
+        return queryset
+
+
+class ShardedViewMixin:
+    """
+    Route queries on sharded models: ``?region=`` selects a region's shard,
+    detail lookups find the shard holding the row, and anything else reads
+    the default region.
+    """
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if not sharding.enabled():
+            return queryset
+        region = self.request.query_params.get('region') if self.request is not None else None
+        if region:
+            try:
+                return queryset.using(sharding.alias_for_region(region))
+            except sharding.UnknownRegion as exc:
+                raise ValidationError({'region': str(exc)})
+        lookup = self.kwargs.get(self.lookup_url_kwarg or self.lookup_field)
+        if lookup:
+            try:
+                alias = sharding.locate(queryset.model, lookup)
+            except (ValueError, DjangoValidationError):
+                alias = None
+            if alias is not None:
+                return queryset.using(alias)
+        return queryset
+
+
+class CustomerViewSet(ConditionalGetMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
+    queryset = Customer.objects.order_by('name')
+    serializer_class = CustomerSerializer
+    list_serializer_class = CustomerListSerializer
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filterset_fields = {
+        'city': ['exact'],
+        'state': ['exact'],
+        'country': ['exact'],
+        'metrics__order_count': ['gte', 'lte'],
+        'metrics__lifetime_value': ['gte', 'lte'],
+        'metrics__monetary_value': ['gte', 'lte'],
+        'metrics__average_order_value': ['gte', 'lte'],
+        'metrics__last_order_at': ['gte', 'lte'],
+        'metrics__recency_score': ['exact', 'gte'],
+        'metrics__frequency_score': ['exact', 'gte'],
+        'metrics__monetary_score': ['exact', 'gte'],
+    }
+    search_fields = ['name', 'email', 'phone']
+    ordering_fields = [
+        'name', 'created_at', 'metrics__order_count', 'metrics__lifetime_value', 'metrics__monetary_value',
+        'metrics__average_order_value', 'metrics__last_order_at',
+    ]
+    conditional_fields = ('updated_at', 'metrics__updated_at')
+
+    @action(detail=True, methods=['get'])
+    def orders(self, request, pk=None):
+        customer = self.get_object()
+        queryset = optimize_queryset(
+            customer.orders.order_by('-order_date'),
+            OrderListSerializer(),
+        )
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = OrderListSerializer(page, many=True, context=self.get_serializer_context())
+            return self.get_paginated_response(serializer.data)
+        serializer = OrderListSerializer(queryset, many=True, context=self.get_serializer_context())
+        return Response(serializer.data)
+
+
+class SupplierViewSet(ConditionalGetMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
+    queryset = Supplier.objects.order_by('name')
+    serializer_class = SupplierSerializer
+    list_serializer_class = SupplierListSerializer
+    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    search_fields = ['name', 'contact_person', 'email']
+    ordering_fields = ['name', 'created_at']
+
+
+class CategoryViewSet(viewsets.ModelViewSet):
+    queryset = Category.objects.order_by('name')
+    serializer_class = CategorySerializer
+    pagination_class = None
+
+
+class ProductViewSet(ConditionalGetMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
+    queryset = Product.objects.order_by('name')
+    serializer_class = ProductSerializer
+    list_serializer_class = ProductListSerializer
+    conditional_fields = ('updated_at', 'category__updated_at')
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filterset_fields = ['category']
+    search_fields = ['name', 'sku']
+    ordering_fields = ['name', 'price', 'created_at']
+
+
+class WarehouseViewSet(ConditionalGetMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
+    queryset = Warehouse.objects.order_by('name')
+    serializer_class = WarehouseSerializer
+    list_serializer_class = WarehouseListSerializer
+
+    @action(detail=False, methods=['get'])
+    def nearest(self, request):
+        """Nearest warehouses to a point, optionally only those stocking ``product``."""
+        latitude, longitude = parse_point(request.query_params)
+        query = NearestWarehouseQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+
+        results = geo.nearest_warehouses(latitude, longitude, product=params.get('product'),
+                                         quantity=params['quantity'], limit=min(params['limit'], 50))
+        return Response([
+            {**WarehouseListSerializer(warehouse).data, 'distance_km': round(distance, 2)}
+            for warehouse, distance in results
+        ])
+
+
+class InventoryViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
+    queryset = Inventory.objects.order_by('product__name', 'warehouse__name')
+    serializer_class = InventorySerializer
+    list_serializer_class = InventoryListSerializer
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
+    filterset_fields = ['product', 'warehouse']
+    search_fields = ['product__name', 'product__sku']
+
+
+class OrderViewSet(ShardedViewMixin, ConditionalGetMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
+    queryset = Order.objects.order_by('-order_date')
+    serializer_class = OrderSerializer
+    list_serializer_class = OrderListSerializer
+    conditional_fields = ('updated_at', 'customer__updated_at')
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filterset_fields = ['status', 'customer']
+    search_fields = ['order_number', 'customer__name', 'tracking_number']
+    ordering_fields = ['order_date', 'total_amount', 'status']
+
+    def perform_create(self, serializer):
+        with sharding.atomic():
+            order = serializer.save()
+            if getattr(settings, 'ORDER_AUTO_SOURCING', True) and order.items.exists():
+                self.source(order)
+
+    @staticmethod
+    def source(order):
+        try:
+            return source_order(order)
+        except InsufficientStock as exc:
+            raise ValidationError({'items': str(exc), 'products': exc.product_ids})
+
+    @action(detail=True, methods=['post'], url_path='source')
+    def source_fulfillment(self, request, pk=None):
+        """Plan fulfilment for an order that has no shipments yet."""
+        order = self.get_object()
+        if order.shipments.exists():
+            return Response({'detail': 'Order already has shipments.'}, status=status.HTTP_409_CONFLICT)
+        with sharding.atomic():
+            shipments = self.source(order)
+        return Response(ShipmentListSerializer(shipments, many=True).data, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['post'], url_path='bulk-status')
+    def bulk_status(self, request):
+        """Change the status of many orders at once; returns one outcome per item."""
+        items = validate_bulk_items(BulkOrderStatusSerializer, request.data)
+        return Response(bulk_status.update_orders(items))
+
+
+class VehicleViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
+    queryset = Vehicle.objects.order_by('vehicle_number')
+    serializer_class = VehicleSerializer
+
+
+class DriverViewSet(viewsets.ModelViewSet):
+    queryset = Driver.objects.select_related('user').order_by('user__username')
+    serializer_class = DriverSerializer
+
+
+class ShipmentViewSet(ShardedViewMixin, ConditionalGetMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
+    queryset = Shipment.objects.order_by('-created_at')
+    serializer_class = ShipmentSerializer
+    list_serializer_class = ShipmentListSerializer
+    conditional_fields = ('updated_at', 'order__updated_at')
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filterset_fields = ['status', 'driver', 'vehicle', 'order', 'is_likely_late']
+    search_fields = ['shipment_number', 'order__order_number']
+    ordering_fields = ['created_at', 'departure_time', 'estimated_arrival']
+
+    @action(detail=False, methods=['get'])
+    def nearby(self, request):
+        """Shipments whose destination lies within ``radius_km`` of a point."""
+        latitude, longitude = parse_point(request.query_params)
+        try:
+            radius = float(request.query_params.get('radius_km', 10))
+        except ValueError:
+            raise ValidationError({'radius_km': 'radius_km must be a number.'})
+
+        queryset = self.filter_queryset(self.get_queryset())
+        # Every region is searched unless ?region= pinned the queryset to one shard.
+        aliases = [queryset.db] if request.query_params.get('region') else None
+        results = geo.shipments_within(latitude, longitude, radius, queryset=queryset, aliases=aliases)
+        page = self.paginate_queryset(results)
+        data = [
+            {**ShipmentListSerializer(shipment).data, 'distance_km': round(distance, 2)}
+            for shipment, distance in (page if page is not None else results)
+        ]
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+    @action(detail=True, methods=['get', 'post'])
+    def tracking(self, request, pk=None):
+        shipment = self.get_object()
+        if request.method == 'POST':
+            serializer = ShipmentTrackingSerializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            serializer.save(shipment=shipment)
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+        updates = shipment.tracking_updates.order_by('timestamp')
+        return Response(ShipmentTrackingSerializer(updates, many=True).data)
+
+    @action(detail=False, methods=['post'], url_path='bulk-status')
+    def bulk_status(self, request):
+        """
+        Change the status of many shipments at once, with a tracking update
+        per change and the orders advanced to match. Returns one outcome per
+        item plus the order changes.
+        """
+        items = validate_bulk_items(BulkShipmentStatusSerializer, request.data)
+        return Response(bulk_status.update_shipments(items))
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def admission_metrics(request):
+    """Rejection counters from the rate limiter and admission control."""
+    return Response(rejection_metrics())
+
+
+@api_view(['GET'])
+def status_aging(request):
+    """Open orders and shipments per status, bucketed by time spent in it."""
+    return Response(workflow.dashboard_aging())
+
+
+def parse_window_bound(params, name, default):
+    value = params.get(name)
+    if not value:
+        return default
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValidationError({name: f'{name} must be an ISO 8601 datetime.'})
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+@api_view(['GET'])
+def status_sla(request):
+    """
+    Time from ``from`` to ``to`` status for an ``entity`` (order/shipment),
+    over objects that reached ``to`` between ``since`` and ``until``
+    (default: the last 30 days).
+    """
+    params = request.query_params
+    entity = params.get('entity', 'order')
+    if entity not in workflow.TRANSITIONS:
+        raise ValidationError({'entity': f"entity must be one of: {', '.join(workflow.TRANSITIONS)}."})
+    statuses = workflow.TRANSITIONS[entity]
+    from_status, to_status = params.get('from'), params.get('to')
+    for name, value in (('from', from_status), ('to', to_status)):
+        if value not in statuses:
+            raise ValidationError({name: f"{name} must be one of: {', '.join(statuses)}."})
+
+    until = parse_window_bound(params, 'until', timezone.now())
+    since = parse_window_bound(params, 'since', until - timedelta(days=30))
+    summary = workflow.sla(entity, from_status, to_status, since, until)
+    return Response({
+        'entity': entity,
+        'from': from_status,
+        'to': to_status,
+        'since': since,
+        'until': until,
+        'count': summary['count'],
+        'average_seconds': summary['average'].total_seconds() if summary['average'] is not None else None,
+        'maximum_seconds': summary['maximum'].total_seconds() if summary['maximum'] is not None else None,
+    })
+
+
+def report_window(params, days=30):
+    until = parse_window_bound(params, 'until', timezone.now())
+    since = parse_window_bound(params, 'since', until - timedelta(days=days))
+    return since, until
+
+
+@api_view(['GET'])
+def sales_report(request):
+    """
+    Orders, revenue and top products for orders placed between ``since`` and
+    ``until`` (default: the last 30 days), by ``period`` (day/month). Read
+    from the analytics store, so it trails the database by the export interval.
+    """
+    since, until = report_window(request.query_params)
+    period = request.query_params.get('period', 'day')
+    if period not in ('day', 'month'):
+        raise ValidationError({'period': 'period must be one of: day, month.'})
+    return Response(analytics.sales_report(since, until, period))
+
+
+@api_view(['GET'])
+def inventory_report(request):
+    """Stock per warehouse (optionally one ``warehouse``) from the analytics store."""
+    return Response(analytics.inventory_report(request.query_params.get('warehouse')))
+
+
+def parse_date_param(params, name, default):
+    value = params.get(name)
+    if not value:
+        return default
+    try:
+        parsed = parse_date(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValidationError({name: f'{name} must be an ISO 8601 date.'})
+    return parsed
+
+
+@api_view(['GET'])
+def inventory_history(request):
+    """
+    Stock levels at the end of ``date`` (default: today) of one ``product``
+    and/or ``warehouse``, from the inventory snapshots.
+    """
+    params = request.query_params
+    product, warehouse = params.get('product'), params.get('warehouse')
+    if not product and not warehouse:
+        raise ValidationError({'detail': 'Pass product and/or warehouse.'})
+    date = parse_date_param(params, 'date', timezone.localdate())
+    try:
+        levels = list(stock_history.levels_as_of(date, product_id=product, warehouse_id=warehouse))
+    except DjangoValidationError:
+        raise ValidationError({'detail': 'product and warehouse must be ids.'})
+    return Response({
+        'date': date,
+        'levels': [
+            {'product_id': product_id, 'warehouse_id': warehouse_id, 'quantity': quantity}
+            for product_id, warehouse_id, quantity in levels
+        ],
+    })
+
+
+@api_view(['GET'])
+def inventory_turnover(request):
+    """
+    Consumption, turnover and days of cover per warehouse (optionally one
+    ``warehouse``) for the dates ``since`` to ``until`` (default: the last
+    30 days), from the inventory snapshots.
+    """
+    params = request.query_params
+    until = parse_date_param(params, 'until', timezone.localdate())
+    since = parse_date_param(params, 'since', until - timedelta(days=29))
+    if since > until:
+        raise ValidationError({'since': 'since must not be after until.'})
+    try:
+        report = stock_history.turnover_report(since, until, params.get('warehouse'))
+    except DjangoValidationError:
+        raise ValidationError({'warehouse': 'warehouse must be an id.'})
+    return Response(report)
+
+
+@api_view(['GET'])
+def shipments_report(request):
+    """
+    Shipment status counts, on-time rate and transit times for shipments
+    created between ``since`` and ``until`` (default: the last 30 days),
+    optionally for one ``warehouse``, from the analytics store.
+    """
+    since, until = report_window(request.query_params)
+    return Response(analytics.shipments_report(since, until, request.query_params.get('warehouse')))
+
+
+@require_GET
+def image_variant(request, name):
+    """Serve a resized image. Names are content-hashed, so responses never go stale."""
+    if not name.startswith(images.VARIANT_ROOT + '/'):
+        raise Http404
+    try:
+        file = default_storage.open(name, 'rb')
+    except (FileNotFoundError, SuspiciousFileOperation):
+        raise Http404
+    response = FileResponse(file, content_type=images.content_type(name))
+    patch_cache_control(response, public=True, max_age=images.cache_seconds(), immutable=True)
+    return response
+
+
+def matches_etag(request, etag):
+    """Whether ``If-None-Match`` lists ``etag`` (weak comparison) or is ``*``."""
+    tags = parse_etags(request.headers.get('If-None-Match', ''))
+    return '*' in tags or etag in (tag.removeprefix('W/') for tag in tags)
+
+
+@require_GET
+def openapi_schema(request, filename=None):
+    """
+    Serve the OpenAPI schema prebuilt by ``generate_openapi_schema``.
+    ``/schema/`` is the current version (revalidated via ETag); versioned
+    file names never change content and are cached indefinitely.
+    """
+    if filename is None:
+        try:
+            manifest = schema.read_manifest()
+        except schema.SchemaNotBuilt as exc:
+            return JsonResponse({'detail': str(exc)}, status=503)
+        etag = f'"{manifest["hash"]}"'
+        if matches_etag(request, etag):
+            response = HttpResponseNotModified()
+        else:
+            response = FileResponse(open(schema.schema_path(manifest['file']), 'rb'),
+                                    content_type='application/json')
+        response['ETag'] = etag
+        patch_cache_control(response, public=True, no_cache=True)
+        return response
+
+    path = schema.schema_path(filename)
+    if path is None:
+        raise Http404
+    response = FileResponse(open(path, 'rb'), content_type='application/json')
+    patch_cache_control(response, public=True, max_age=schema.VERSIONED_MAX_AGE, immutable=True)
+    return response
+
+
+class IsDriver(permissions.BasePermission):
+    message = 'Only drivers can use the sync API.'
+
+    def has_permission(self, request, view):
+        return hasattr(request.user, 'driver_profile')
+
+
+class DriverSyncView(APIView):
+    """Delta pull of the requesting driver's shipments (``?token=``)."""
+
+    permission_classes = [permissions.IsAuthenticated, IsDriver]
+
+    def get(self, request):
+        try:
+            changes = driver_changes(request.user.driver_profile, request.query_params.get('token'))
+        except InvalidSyncToken as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'token': changes['token'],
+            'full_resync': changes['full_resync'],
+            'shipments': SyncShipmentSerializer(changes['shipments'], many=True).data,
+            'deleted': changes['deleted'],
+        })
+
+
+class DriverTrackingBatchView(APIView):
+    """Idempotent upload of tracking updates queued while offline."""
+
+    permission_classes = [permissions.IsAuthenticated, IsDriver]
+
+    def post(self, request):
+        serializer = TrackingBatchItemSerializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        outcomes = apply_tracking_batch(request.user.driver_profile, serializer.validated_data)
+        return Response({'results': outcomes})
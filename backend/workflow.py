@@ -0,0 +1,157 @@
+"""
+Order and shipment status workflow.
+
+Statuses may only move along ``TRANSITIONS``. Every change, and the initial
+status on creation, is written to ``StatusTransition``, and the model keeps
+``status_changed_at`` next to ``status`` so "how long has it been pending"
+is a range scan on the ``(status, status_changed_at)`` index.
+
+SLA questions ("time from processing to shipped last month") range-scan the
+transitions into the end status on ``(entity, to_status, changed_at)`` and
+pair each with the latest earlier transition of the same object into the
+start status via ``(entity, object_id, changed_at)``.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, Max, OuterRef, Q, Subquery
+from django.utils import timezone
+
+from . import sharding
+from .models import Order, Shipment, StatusTransition
+
+ORDER_TRANSITIONS = {
+    'pending': {'processing', 'cancelled'},
+    'processing': {'shipped', 'cancelled'},
+    'shipped': {'delivered', 'returned'},
+    'delivered': {'returned'},
+    'cancelled': set(),
+    'returned': set(),
+}
+
+SHIPMENT_TRANSITIONS = {
+    'pending': {'in_transit', 'failed'},
+    'in_transit': {'delivered', 'failed'},
+    'failed': {'pending'},  # re-queued for another attempt
+    'delivered': set(),
+}
+
+TRANSITIONS = {
+    'order': ORDER_TRANSITIONS,
+    'shipment': SHIPMENT_TRANSITIONS,
+}
+
+MODELS = {
+    'order': Order,
+    'shipment': Shipment,
+}
+
+# (label, upper bound) of the dashboard aging buckets; the last one is open-ended.
+AGING_BUCKETS = (
+    ('lt_1h', timedelta(hours=1)),
+    ('1h_4h', timedelta(hours=4)),
+    ('4h_24h', timedelta(hours=24)),
+    ('1d_3d', timedelta(days=3)),
+    ('gt_3d', None),
+)
+AGING_CACHE_KEY = 'workflow:aging'
+
+
+class InvalidTransition(Exception):
+    def __init__(self, entity, from_status, to_status):
+        self.entity = entity
+        self.from_status = from_status
+        self.to_status = to_status
+        allowed = ', '.join(sorted(allowed_transitions(entity, from_status))) or 'none'
+        super().__init__(
+            f"Cannot change {entity} status from '{from_status}' to '{to_status}' (allowed: {allowed})."
+        )
+
+
+def entity_for(instance):
+    return instance._meta.model_name
+
+
+def allowed_transitions(entity, status):
+    return TRANSITIONS[entity].get(status, set())
+
+
+def open_statuses(entity):
+    """Statuses an object can still leave; terminal ones are left out of aging."""
+    return [status for status, targets in TRANSITIONS[entity].items() if targets]
+
+
+def check_transition(entity, from_status, to_status):
+    if from_status != to_status and to_status not in allowed_transitions(entity, from_status):
+        raise InvalidTransition(entity, from_status, to_status)
+
+
+def aging(entity, now=None):
+    """
+    Count open objects per status by time spent in that status.
+
+    Returns ``{status: {bucket: count}}`` for every open status, computed in
+    one grouped query over the ``(status, status_changed_at)`` index per
+    shard.
+    """
+    now = now or timezone.now()
+    counts, lower = {}, timedelta(0)
+    for label, upper in AGING_BUCKETS:
+        condition = Q(status_changed_at__lte=now - lower)
+        if upper is not None:
+            condition &= Q(status_changed_at__gt=now - upper)
+        counts[label] = Count('pk', filter=condition)
+        lower = upper
+
+    statuses = open_statuses(entity)
+    result = {status: {label: 0 for label, _ in AGING_BUCKETS} for status in statuses}
+    queryset = MODELS[entity].objects.filter(status__in=statuses)
+    for (status,), row in sharding.gather_grouped(queryset, ('status',), **counts).items():
+        result[status] = row
+    return result
+
+
+def dashboard_aging():
+    """Aging buckets for orders and shipments, cached for ``STATUS_AGING_CACHE_TTL`` seconds."""
+    def build():
+        now = timezone.now()
+        return {
+            'generated_at': now.isoformat(),
+            'orders': aging('order', now),
+            'shipments': aging('shipment', now),
+        }
+
+    return cache.get_or_set(AGING_CACHE_KEY, build, getattr(settings, 'STATUS_AGING_CACHE_TTL', 60))
+
+
+def stuck(entity, status, older_than, now=None):
+    """Objects that have been in ``status`` for longer than ``older_than``."""
+    now = now or timezone.now()
+    return MODELS[entity].objects.filter(status=status, status_changed_at__lt=now - older_than)
+
+
+def sla(entity, from_status, to_status, since, until):
+    """
+    Time taken to go from ``from_status`` to ``to_status`` for objects that
+    reached ``to_status`` in ``[since, until)``.
+
+    Returns ``{'count', 'average', 'maximum'}`` with durations as timedeltas
+    (``None`` when nothing matched).
+    """
+    started = (
+        StatusTransition.objects
+        .filter(entity=entity, object_id=OuterRef('object_id'), to_status=from_status,
+                changed_at__lte=OuterRef('changed_at'))
+        .order_by('-changed_at')
+        .values('changed_at')[:1]
+    )
+    summary = (
+        StatusTransition.objects
+        .filter(entity=entity, to_status=to_status, changed_at__gte=since, changed_at__lt=until)
+        .annotate(started_at=Subquery(started))
+        .filter(started_at__isnull=False)
+        .annotate(duration=ExpressionWrapper(F('changed_at') - F('started_at'), output_field=DurationField()))
+        .aggregate(count=Count('pk'), average=Avg('duration'), maximum=Max('duration'))
+    )
+    return summary
@@ -10,6 +10,32 @@ const api = axios.create({
   },
 });
 
+// Conditional GET cache: remembers the ETag/Last-Modified validators and body
+// of recent GET responses so unchanged resources come back as 304s.
+const VALIDATOR_CACHE_SIZE = 200;
+const validatorCache = new Map();
+
+const getCacheKey = (config) => api.getUri(config);
+
+const rememberResponse = (response) => {
+  const etag = response.headers?.etag;
+  const lastModified = response.headers?.['last-modified'];
+  if (!etag && !lastModified) {
+    return;
+  }
+
+  const key = getCacheKey(response.config);
+  validatorCache.delete(key);
+  validatorCache.set(key, { etag, lastModified, data: response.data });
+
+  // Evict the least recently stored entry
+  if (validatorCache.size > VALIDATOR_CACHE_SIZE) {
+    validatorCache.delete(validatorCache.keys().next().value);
+  }
+};
+
+export const clearValidatorCache = () => validatorCache.clear();
+
 // Request interceptor for adding auth token
 api.interceptors.request.use(
   (config) => {
@@ -17,6 +43,20 @@ api.interceptors.request.use(
     if (token) {
       config.headers['Authorization'] = `Bearer ${token}`;
     }
+
+    // Send validators for GET requests we have a cached body for
+    const cached = (config.method || 'get').toLowerCase() === 'get'
+      && config.responseType !== 'blob'
+      && validatorCache.get(getCacheKey(config));
+    if (cached) {
+      if (cached.etag) {
+        config.headers['If-None-Match'] = cached.etag;
+      }
+      if (cached.lastModified) {
+        config.headers['If-Modified-Since'] = cached.lastModified;
+      }
+      config.validateStatus = (status) => (status >= 200 && status < 300) || status === 304;
+    }
     return config;
   },
   (error) => {
@@ -27,6 +67,14 @@ api.interceptors.request.use(
 // Response interceptor for handling errors and token refresh
 api.interceptors.response.use(
   (response) => {
+    if (response.status === 304) {
+      // Not modified: serve the body we cached for this URL
+      const cached = validatorCache.get(getCacheKey(response.config));
+      return { ...response, status: 200, data: cached ? cached.data : response.data };
+    }
+    if ((response.config.method || 'get').toLowerCase() === 'get') {
+      rememberResponse(response);
+    }
     return response;
   },
   async (error) => {
@@ -72,6 +120,7 @@ api.interceptors.response.use(
 
 // Handle logout
 const handleLogout = () => {
+  clearValidatorCache();
   localStorage.removeItem('authToken');
   localStorage.removeItem('refreshToken');
   localStorage.removeItem('user');
@@ -334,6 +383,23 @@ export const shipmentService = {
   },
 };
 
+// Driver offline sync services
+export const driverSyncService = {
+  // Pass the token from the previous pull; omit it for a full resync
+  pull: async (token) => {
+    const response = await api.get('/sync/driver/', {
+      params: token ? { token } : {},
+    });
+    return response.data;
+  },
+
+  // Each update needs a client-generated client_id so retries are idempotent
+  pushTrackingUpdates: async (updates) => {
+    const response = await api.post('/sync/driver/tracking/', updates);
+    return response.data;
+  },
+};
+
 // Customer services
 export const customerService = {
   getCustomers: async (params) => {
@@ -496,6 +562,18 @@ export const dashboardService = {
     });
     return response.data;
   },
+  
+  getStatusAging: async () => {
+    const response = await api.get('/dashboard/status-aging/');
+    return response.data;
+  },
+  
+  getStatusSla: async (entity, from, to, params = {}) => {
+    const response = await api.get('/dashboard/status-sla/', {
+      params: { entity, from, to, ...params },
+    });
+    return response.data;
+  },
 };
 
 export default api;
\ No newline at end of file